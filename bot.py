@@ -1,6 +1,10 @@
+import aiohttp
 import discord
+from discord import app_commands
 from discord.ext import commands
 import os
+import functools
+import threading
 import traceback
 import asyncio
 import logging
@@ -9,18 +13,35 @@ import signal
 import sys
 from concurrent.futures import ThreadPoolExecutor
 
+from utils.db import init_pool, close_pool, acquire
+from utils.migrations import apply_migrations
+from utils.member_directory import MemberDirectory
+from utils.user_cache import UserProfileCache
+from utils.lookup_cache import LookupCache
+from utils.cache_sync import CacheInvalidationListener
+from utils.guild_settings import GuildSettings
+from utils.union_ops import backfill_union_guilds
+from utils.role_queue import RoleQueue
+from utils.role_drift import UnionRoleCache
+from utils.command_sync import CommandSyncer
+from utils.cluster import ClusterConfig
+from utils.gateway_profile import build_profile
+from utils.metrics import Metrics, LoopLagSampler, LoopWatchdog, rss_bytes
+from utils.metrics_server import MetricsServer
+from utils.profiler import profile_thread, MAX_SECONDS as PROFILE_MAX_SECONDS
+from utils.logging_setup import setup_logging, set_log_context
+
 # ============================================================
 # ENHANCED LOGGING & PERFORMANCE MONITORING
 # ============================================================
 
-# Setup comprehensive logging with reduced discord.py verbosity
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
+# Shard range of this process when run by the cluster launcher
+cluster = ClusterConfig.from_env()
+
+# Queued logging: the loop only enqueues records, a background thread writes the
+# console and the size-rotated JSON log file. Reduced discord.py verbosity below
+log_listener = setup_logging(
+    os.getenv("LOG_FILE") or (f'bot-cluster{cluster.cluster_id}.log' if cluster.cluster_id else 'bot.log')
 )
 
 # Reduce discord.py logging noise
@@ -35,16 +56,111 @@ logger = logging.getLogger(__name__)
 # ============================================================
 
 TOKEN = os.getenv("DISCORD_TOKEN")
-intents = discord.Intents.all()
 
-# Create bot with optimized settings
-bot = commands.Bot(
+# Only the intents the cogs read; member data comes from the member directory
+gateway = build_profile()
+
+# Observes Discord REST responses (command sync rate limits)
+http_trace = aiohttp.TraceConfig()
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that starts timing every app command (see utils/metrics)"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type is discord.InteractionType.application_command:
+            interaction.extras["timing"] = self.client.metrics.start()
+            set_log_context(
+                command=f"/{interaction.command.qualified_name}" if interaction.command else None,
+                guild=interaction.guild_id,
+                user=interaction.user.id
+            )
+        return True
+
+# Create bot with optimized settings; AutoShardedBot when sharding is configured
+bot_class = commands.AutoShardedBot if cluster.sharded else commands.Bot
+bot = bot_class(
     command_prefix="!",
-    intents=intents,
     heartbeat_timeout=60.0,  # Increase heartbeat timeout
     chunk_guilds_at_startup=False,  # Reduce startup load
-    member_cache_flags=discord.MemberCacheFlags.none()  # Reduce memory usage
+    http_trace=http_trace,
+    tree_cls=InstrumentedCommandTree,
+    **gateway.bot_options(),
+    **cluster.bot_options()
 )
+bot.cluster = cluster
+
+# Per-command latency histograms (total / DB / REST / render) and error counts
+bot.metrics = Metrics()
+bot.metrics.watch(http_trace)
+
+# How late the event loop runs scheduled callbacks, and who is blocking it
+bot.loop_lag = LoopLagSampler()
+bot.loop_watchdog = LoopWatchdog(bot.loop_lag)
+
+# Prometheus endpoint, only when METRICS_PORT is set
+bot.metrics_server = MetricsServer(bot)
+
+# Lightweight member directory (id / name / display name) in place of the member cache
+bot.member_directory = MemberDirectory(bot)
+bot.member_directory.attach()
+
+# Cached Discord user profiles in place of per-row bot.fetch_user() REST calls
+bot.user_cache = UserProfileCache(bot)
+
+# Write-through IGN / leadership cache for the command hot paths
+bot.lookup_cache = LookupCache()
+
+# Discord role changes, persisted and applied in the background
+bot.role_queue = RoleQueue(bot)
+
+# Per-guild settings (cleanup report channel), read once per guild
+bot.guild_settings = GuildSettings()
+
+# Union role ids per guild, so role changes outside unions skip the drift check
+bot.union_roles = UnionRoleCache()
+
+# Syncs application commands only to guilds whose command tree changed
+bot.command_syncer = CommandSyncer(bot)
+bot.command_syncer.watch(http_trace)
+
+# Keeps the caches above in step with writes made by other processes
+bot.cache_listener = CacheInvalidationListener()
+
+async def _refresh_lookup_users(keys):
+    user_ids = keys.get("discord_id", set()) | keys.get("user_id", set())
+    async with acquire() as conn:
+        await bot.lookup_cache.refresh_users(conn, user_ids)
+
+async def _reload_lookup_cache():
+    async with acquire() as conn:
+        await bot.lookup_cache.load(conn)
+
+for table in ("users", "user_igns", "union_leaders"):
+    bot.cache_listener.subscribe(table, _refresh_lookup_users)
+bot.cache_listener.on_resync(_reload_lookup_cache)
+
+async def _invalidate_guild_settings(keys):
+    for guild_id in keys.get("guild_id", set()):
+        bot.guild_settings.invalidate(guild_id)
+
+async def _reset_guild_settings():
+    bot.guild_settings.invalidate()
+
+bot.cache_listener.subscribe("guild_settings", _invalidate_guild_settings)
+bot.cache_listener.on_resync(_reset_guild_settings)
+
+async def _reset_union_roles(keys=None):
+    bot.union_roles.invalidate()
+
+bot.cache_listener.subscribe("union_roles", _reset_union_roles)
+bot.cache_listener.on_resync(_reset_union_roles)
+
+async def _wake_role_queue(keys=None):
+    bot.role_queue.wake()
+
+# Sent on commit, so the worker never claims before the queued rows are visible
+bot.cache_listener.subscribe("role_ops", _wake_role_queue)
+bot.cache_listener.on_resync(_wake_role_queue)
 
 # Thread pool for blocking operations
 executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="BotWorker")
@@ -61,6 +177,9 @@ class BotStatus:
 
 bot_status = BotStatus()
 
+# Commands whose absence means the bot is effectively broken
+CRITICAL_COMMANDS = ["show_union_leader", "show_union_detail"]
+
 # ============================================================
 # PERFORMANCE UTILITIES
 # ============================================================
@@ -70,9 +189,16 @@ async def safe_blocking_operation(blocking_func, *args, **kwargs):
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(executor, blocking_func, *args, **kwargs)
 
+def shard_latencies():
+    """[(shard id, heartbeat latency in seconds)] for the shards this process runs"""
+    if isinstance(bot, commands.AutoShardedBot):
+        return sorted(bot.latencies)
+    return [(bot.shard_id or 0, bot.latency)]
+
 def performance_monitor(func_name):
     """Decorator to monitor function execution time"""
     def decorator(func):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             start_time = asyncio.get_event_loop().time()
             try:
@@ -80,10 +206,10 @@ def performance_monitor(func_name):
                 end_time = asyncio.get_event_loop().time()
                 execution_time = end_time - start_time
                 
-                if execution_time > 1.0:  # Log operations taking > 1 second
-                    logger.warning(f"Slow operation '{func_name}' took {execution_time:.2f} seconds")
-                elif execution_time > 5.0:  # Critical threshold
+                if execution_time > 5.0:  # Critical threshold
                     logger.error(f"CRITICAL: '{func_name}' blocked for {execution_time:.2f} seconds")
+                elif execution_time > 1.0:  # Log operations taking > 1 second
+                    logger.warning(f"Slow operation '{func_name}' took {execution_time:.2f} seconds")
                     
                 return result
             except Exception as e:
@@ -94,151 +220,204 @@ def performance_monitor(func_name):
         return wrapper
     return decorator
 
+# ============================================================
+# COMMAND INSTRUMENTATION
+# ============================================================
+
+def log_command_finished(name, total_ms, failed=False):
+    """Slow commands are logged as warnings, the rest only at debug level"""
+    if total_ms is None:
+        return
+    level = logging.WARNING if total_ms > 1000 else logging.DEBUG
+    logger.log(level, f"Command {name} {'failed' if failed else 'completed'} in {total_ms:.0f}ms",
+               extra={"latency_ms": round(total_ms, 1)})
+
+@bot.before_invoke
+async def start_command_timing(ctx):
+    ctx.timing = bot.metrics.start()
+    set_log_context(command=f"!{ctx.command.qualified_name}", guild=ctx.guild.id if ctx.guild else None, user=ctx.author.id)
+
+@bot.after_invoke
+async def finish_command_timing(ctx):
+    # Runs after failed invocations too
+    name = f"!{ctx.command.qualified_name}"
+    timing = getattr(ctx, "timing", None)
+    failed = ctx.command_failed or (timing is not None and timing.failed)
+    log_command_finished(name, bot.metrics.finish(name, timing, failed), failed)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    # Commands that caught their own error and replied with it still complete
+    name = f"/{command.qualified_name}"
+    timing = interaction.extras.get("timing")
+    failed = timing is not None and timing.failed
+    log_command_finished(name, bot.metrics.finish(name, timing, failed), failed)
+
 # ============================================================
 # BOT EVENT HANDLERS WITH PERFORMANCE MONITORING
 # ============================================================
 
+EXTENSIONS = [
+    "cogs.basic_commands",
+    "cogs.union_management",
+    "cogs.union_membership",
+    "cogs.union_info"
+]
+
+@bot.event
+async def setup_hook():
+    """Load command modules once per process, before the gateway connects"""
+    logger.info("Loading command modules...")
+    loaded_modules = 0
+
+    for module in EXTENSIONS:
+        try:
+            logger.info(f"Loading {module}...")
+            await bot.load_extension(module)
+            loaded_modules += 1
+        except Exception as e:
+            logger.error(f"Failed to load {module}: {str(e)}")
+            logger.error(traceback.format_exc())
+
+    bot_status.modules_loaded = loaded_modules
+    total_commands = len(bot.tree.get_commands())
+
+    logger.info("========================================")
+    logger.info("Module Loading Summary:")
+    logger.info(f"  Successful: {loaded_modules}/{len(EXTENSIONS)}")
+    logger.info(f"  Failed: {len(EXTENSIONS) - loaded_modules}")
+    logger.info(f"  Total Commands: {total_commands}")
+
+    # Critical command verification
+    commands_in_tree = bot.tree.get_commands()
+    logger.info("Critical command check:")
+    for critical_cmd in CRITICAL_COMMANDS:
+        if any(cmd.name == critical_cmd for cmd in commands_in_tree):
+            logger.info(f"  ✅ {critical_cmd} loaded successfully")
+        else:
+            logger.warning(f"  ⚠️ {critical_cmd} missing from tree")
+
+def record_sync_results(results):
+    """Log sync results and update the bot status; returns the number of failures"""
+    failures = 0
+    for result in results:
+        guild = result.guild
+        if result.status == "failed":
+            logger.error(f"Sync failed for {guild.name}: {result.error}")
+            bot_status.sync_errors += 1
+            failures += 1
+            continue
+
+        bot_status.commands_synced = len(result.commands)
+        if result.status == "unchanged":
+            logger.info(f"⏭️ {guild.name}: command tree unchanged, sync skipped")
+            continue
+
+        bot_status.last_sync_time = datetime.datetime.now(datetime.timezone.utc)
+        rate_limited = f", {result.rate_limited} rate limits" if result.rate_limited else ""
+        logger.info(f"✅ Synced {len(result.commands)} commands to {guild.name} in {result.duration:.2f}s{rate_limited}")
+
+        # Verify critical commands in sync result
+        synced_names = [cmd.name for cmd in result.commands]
+        for critical_cmd in CRITICAL_COMMANDS:
+            if critical_cmd not in synced_names:
+                logger.warning(f"  ⚠️ {critical_cmd} missing in {guild.name}")
+    return failures
+
+async def record_union_guilds(guilds):
+    """Fill in union_roles.guild_id for unions registered before it existed"""
+    try:
+        async with acquire() as conn:
+            updated = await backfill_union_guilds(conn, guilds)
+        if updated:
+            logger.info(f"✅ Recorded the guild of {updated} older unions")
+    except Exception as e:
+        logger.error(f"❌ Union guild backfill failed: {str(e)}")
+
 @bot.event
 async def on_ready():
-    """Optimized bot initialization with heartbeat protection"""
+    """Runs after the first connection and again after every reconnect"""
     try:
-        # Set startup time
-        bot_status.startup_time = datetime.datetime.now(datetime.timezone.utc)
-        
+        first_ready = bot_status.startup_time is None
+        if first_ready:
+            bot_status.startup_time = datetime.datetime.now(datetime.timezone.utc)
+
         logger.info("============================================================")
-        logger.info("DISCORD UNION BOT INITIALIZATION (PERFORMANCE OPTIMIZED)")
+        logger.info("DISCORD UNION BOT READY" if first_ready else "DISCORD UNION BOT RECONNECTED")
         logger.info("============================================================")
         logger.info(f"Bot: {bot.user.name}#{bot.user.discriminator} (ID: {bot.user.id})")
         logger.info(f"Connected to {len(bot.guilds)} guilds")
-        
+
         # Log guild information efficiently
         for guild in bot.guilds:
             logger.info(f"  - {guild.name} (ID: {guild.id}, Members: {guild.member_count})")
-        
-        # Clear existing commands to prevent duplicates
-        logger.info("Clearing existing commands...")
-        bot.tree.clear_commands(guild=None)
-        for guild in bot.guilds:
-            bot.tree.clear_commands(guild=guild)
-        
-        # Short delay to prevent API rate limiting
-        await asyncio.sleep(0.5)
-        
-        # Load command modules with error handling
-        logger.info("Loading command modules...")
-        modules = [
-            "cogs.basic_commands",
-            "cogs.union_management", 
-            "cogs.union_membership",
-            "cogs.union_info"
-        ]
-        
-        loaded_modules = 0
-        
-        for module in modules:
-            try:
-                logger.info(f"Loading {module}...")
-                await bot.load_extension(module)
-                loaded_modules += 1
-                # Small delay between module loads to prevent blocking
-                await asyncio.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"Failed to load {module}: {str(e)}")
-                logger.error(traceback.format_exc())
-        
-        bot_status.modules_loaded = loaded_modules
-        total_commands = len(bot.tree.get_commands())
-        
-        logger.info("========================================")
-        logger.info("Module Loading Summary:")
-        logger.info(f"  Successful: {loaded_modules}/{len(modules)}")
-        logger.info(f"  Failed: {len(modules) - loaded_modules}")
-        logger.info(f"  Total Commands: {total_commands}")
-        
-        if total_commands == 0:
+
+        # Cleanup and drift checks only match unions without a recorded guild
+        # through guild.get_role() until this has run
+        if first_ready:
+            await record_union_guilds(bot.guilds)
+
+        if not bot.tree.get_commands():
             logger.error("❌ NO COMMANDS IN TREE - Critical Issue!")
             return
-        
-        # Critical command verification
-        commands_in_tree = bot.tree.get_commands()
-        critical_commands = ["show_union_leader", "show_union_detail"]
-        
-        logger.info("Critical command check:")
-        for critical_cmd in critical_commands:
-            if any(cmd.name == critical_cmd for cmd in commands_in_tree):
-                logger.info(f"  ✅ {critical_cmd} loaded successfully")
-            else:
-                logger.warning(f"  ⚠️ {critical_cmd} missing from tree")
-        
-        # Optimized guild-specific synchronization
-        logger.info("Starting optimized command synchronization...")
-        sync_success_count = 0
-        
-        for guild in bot.guilds:
-            try:
-                logger.info(f"Syncing to guild: {guild.name}")
-                
-                # Copy commands to guild tree (no global commands)
-                bot.tree.clear_commands(guild=guild)
-                for cmd in commands_in_tree:
-                    bot.tree.add_command(cmd, guild=guild)
-                
-                # Sync with timeout protection
-                synced = await asyncio.wait_for(
-                    bot.tree.sync(guild=guild), 
-                    timeout=30.0
-                )
-                
-                sync_success_count += 1
-                bot_status.commands_synced = len(synced)
-                bot_status.last_sync_time = datetime.datetime.now(datetime.timezone.utc)
-                
-                logger.info(f"✅ Synced {len(synced)} commands to {guild.name}")
-                
-                # Verify critical commands in sync result
-                synced_names = [cmd.name for cmd in synced]
-                for critical_cmd in critical_commands:
-                    if critical_cmd in synced_names:
-                        logger.info(f"  ✅ {critical_cmd} available in {guild.name}")
-                    else:
-                        logger.warning(f"  ⚠️ {critical_cmd} missing in {guild.name}")
-                
-                # Small delay between guild syncs to prevent rate limiting
-                await asyncio.sleep(1.0)
-                
-            except asyncio.TimeoutError:
-                logger.error(f"Sync timeout for guild: {guild.name}")
-                bot_status.sync_errors += 1
-            except Exception as e:
-                logger.error(f"Sync failed for {guild.name}: {str(e)}")
-                bot_status.sync_errors += 1
-        
+
+        # Only guilds whose command tree changed since their last sync are synced
+        logger.info("Checking command trees...")
+        results = await bot.command_syncer.sync_guilds(bot.guilds)
+        failures = record_sync_results(results)
+        synced = sum(1 for result in results if result.status == "synced")
+        unchanged = sum(1 for result in results if result.status == "unchanged")
+
         # Final status report
         logger.info("========================================")
-        if sync_success_count > 0:
-            logger.info("🎉 BOT INITIALIZATION COMPLETE")
-            logger.info(f"✅ {loaded_modules} modules loaded")
-            logger.info(f"✅ {bot_status.commands_synced} commands per guild")
-            logger.info(f"✅ Synced to {sync_success_count}/{len(bot.guilds)} guilds")
-            logger.info("✅ Heartbeat optimization enabled")
-            
-            if bot_status.sync_errors > 0:
-                logger.warning(f"⚠️ {bot_status.sync_errors} sync errors occurred")
-            
+        logger.info(f"✅ {bot_status.modules_loaded} modules loaded")
+        logger.info(f"✅ Commands synced to {synced} guilds, {unchanged} unchanged")
+        if bot.command_syncer.last_run and bot.command_syncer.last_run[0]:
+            logger.info(f"✅ Sync round took {bot.command_syncer.last_run[1]:.2f}s")
+        if failures:
+            logger.warning(f"⚠️ {failures} sync errors occurred")
+        if synced:
             logger.info("Commands will be available in Discord within 1-2 minutes")
-        else:
-            logger.error("❌ CRITICAL: No successful synchronizations")
-        
         logger.info("============================================================")
-        
-        # Start background tasks
-        asyncio.create_task(heartbeat_monitor())
-        
+
+        # Start background tasks once per process
+        if first_ready:
+            asyncio.create_task(heartbeat_monitor())
+
     except Exception as e:
         logger.error(f"Critical error during bot initialization: {str(e)}")
         logger.error(traceback.format_exc())
 
+@bot.event
+async def on_guild_join(guild):
+    """Give a newly joined guild its commands straight away
+
+    Forced: a guild the bot left and rejoined (perhaps while offline, so
+    on_guild_remove never ran) still has the hash of commands Discord dropped.
+    """
+    await record_union_guilds([guild])
+    record_sync_results([await bot.command_syncer.sync_guild(guild, force=True)])
+
+@bot.event
+async def on_guild_remove(guild):
+    try:
+        await bot.command_syncer.forget(guild.id)
+    except Exception as e:
+        logger.error(f"Could not forget command sync state for {guild.name}: {str(e)}")
+
+@bot.event
+async def on_guild_channel_create(channel):
+    bot.guild_settings.channel_changed(channel)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    bot.guild_settings.channel_changed(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if before.name != after.name:
+        bot.guild_settings.channel_changed(after)
+
 @bot.event
 async def on_disconnect():
     """Enhanced disconnect handling"""
@@ -271,6 +450,8 @@ async def on_command_error(ctx, error):
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error):
     """Global error handler for slash commands with performance monitoring"""
+    command_name = f"/{interaction.command.qualified_name}" if interaction.command else "/unknown"
+    log_command_finished(command_name, bot.metrics.finish(command_name, interaction.extras.get("timing"), failed=True), failed=True)
     if isinstance(error, discord.app_commands.CommandNotFound):
         logger.error(f"Command not found: {error}")
         if not interaction.response.is_done():
@@ -309,8 +490,9 @@ async def heartbeat_monitor():
     
     while not bot.is_closed():
         try:
-            # Check heartbeat latency
-            latency = bot.latency * 1000  # Convert to milliseconds
+            # Check heartbeat latency of the slowest shard
+            shard_id, latency = max(shard_latencies(), key=lambda item: item[1])
+            latency *= 1000  # Convert to milliseconds
             
             if latency > 1000:  # More than 1 second
                 bot_status.heartbeat_warnings += 1
@@ -318,18 +500,9 @@ async def heartbeat_monitor():
                 
                 # Rate limit heartbeat warnings (max 1 per minute)
                 if current_time - last_heartbeat_warning > 60:
-                    logger.warning(f"High latency detected: {latency:.1f}ms")
+                    logger.warning(f"High latency detected on shard {shard_id}: {latency:.1f}ms")
                     last_heartbeat_warning = current_time
             
-            # Memory cleanup every hour
-            if bot_status.startup_time:
-                uptime = datetime.datetime.now(datetime.timezone.utc) - bot_status.startup_time
-                if uptime.total_seconds() % 3600 < 30:  # Every hour (with 30s window)
-                    logger.debug("Performing periodic cleanup")
-                    # Force garbage collection
-                    import gc
-                    gc.collect()
-            
             await asyncio.sleep(30)  # Check every 30 seconds
             
         except Exception as e:
@@ -341,7 +514,6 @@ async def heartbeat_monitor():
 # ============================================================
 
 @bot.command(name='force_sync')
-@performance_monitor('force_sync')
 async def force_sync(ctx):
     """Force guild registration and sync (Admin only) - Optimized"""
     if not any(role.name.lower() in ["admin", "administrator"] for role in ctx.author.roles):
@@ -353,35 +525,31 @@ async def force_sync(ctx):
         
         guild = ctx.guild
         
-        # Step 1: Clear and rebuild command tree
+        # Step 1: Rebuild the guild command tree from the global one
         await ctx.send("📍 **Step 1: Rebuilding command tree...**")
-        bot.tree.clear_commands(guild=guild)
-        
-        # Get global commands and copy to guild
-        global_commands = bot.tree.get_commands()
-        for cmd in global_commands:
-            bot.tree.add_command(cmd, guild=guild)
+        bot.command_syncer.prepare(guild)
         
         guild_commands = len(bot.tree.get_commands(guild=guild))
         await ctx.send(f"📊 **Commands ready:** {guild_commands}")
         
-        # Step 2: Sync with timeout protection
+        # Step 2: Sync even if the stored fingerprint matches
         await ctx.send("📍 **Step 2: Syncing to Discord...**")
         
-        try:
-            synced = await asyncio.wait_for(
-                bot.tree.sync(guild=guild), 
-                timeout=30.0
-            )
-        except asyncio.TimeoutError:
-            await ctx.send("❌ **Sync timeout.** Discord may be experiencing delays. Try again in a few minutes.")
+        result = await bot.command_syncer.sync_guild(guild, force=True)
+        if result.status == "failed":
+            bot_status.sync_errors += 1
+            if result.error == "timeout":
+                await ctx.send("❌ **Sync timeout.** Discord may be experiencing delays. Try again in a few minutes.")
+            else:
+                await ctx.send(f"❌ **Force sync failed:** {result.error}")
             return
+        synced = result.commands
         
         success_msg = f"""✅ **OPTIMIZED SYNC COMPLETE!**
 
 🎯 **Guild:** {guild.name}
 ✅ **Commands Synced:** {len(synced)}
-🚀 **Performance:** Optimized for reduced blocking
+⏱️ **Sync Time:** {result.duration:.2f}s{f' ({result.rate_limited} rate limits)' if result.rate_limited else ''}
 
 **Available commands:**
 {', '.join([f'`/{cmd.name}`' for cmd in synced[:10]])}
@@ -398,6 +566,7 @@ async def force_sync(ctx):
         logger.info(f"✅ Force sync successful: {len(synced)} commands to {guild.name}")
         
     except Exception as e:
+        bot.metrics.mark_failed()
         error_msg = f"❌ **Force sync failed:** {str(e)}"
         await ctx.send(error_msg)
         logger.error(f"Force sync error: {str(e)}")
@@ -432,14 +601,102 @@ async def bot_health(ctx):
         embed.add_field(name="⚙️ Commands", value=f"Synced: {bot_status.commands_synced}\nModules: {bot_status.modules_loaded}", inline=True)
         embed.add_field(name="⚠️ Warnings", value=f"Heartbeat: {bot_status.heartbeat_warnings}\nSync Errors: {bot_status.sync_errors}", inline=True)
         embed.add_field(name="🏠 Guilds", value=str(len(bot.guilds)), inline=True)
-        embed.add_field(name="📈 Memory", value=f"Threads: {executor._threads if hasattr(executor, '_threads') else 'N/A'}", inline=True)
-        embed.add_field(name="🔄 Last Sync", value=f"{bot_status.last_sync_time.strftime('%H:%M:%S UTC') if bot_status.last_sync_time else 'Never'}", inline=True)
+        shard_lines = [f"#{shard_id}: {latency * 1000:.0f}ms" for shard_id, latency in shard_latencies()]
+        if len(shard_lines) > 10:
+            shard_lines = shard_lines[:10] + [f"... and {len(shard_lines) - 10} more"]
+        embed.add_field(name="🧩 Shards", value=f"{cluster.describe()}\n" + "\n".join(shard_lines), inline=True)
+        embed.add_field(name="📈 Memory", value=f"RSS: {rss_bytes() / 2**20:.0f} MB", inline=True)
+        lag = bot.loop_lag.lag
+        embed.add_field(name="⏳ Loop Lag", value=f"p50: {lag.percentile(50):.0f}ms | p95: {lag.percentile(95):.0f}ms | p99: {lag.percentile(99):.0f}ms\nStalls: {bot.loop_watchdog.stalls}", inline=True)
+        cache_stats = bot.user_cache.stats()
+        embed.add_field(name="🗂️ User Cache", value=f"Hit rate: {cache_stats['hit_rate']:.0%}\nHits: {cache_stats['gateway_hits'] + cache_stats['hits']} | Misses: {cache_stats['misses']}\nEntries: {cache_stats['size']}", inline=True)
+        queue_stats = bot.role_queue.stats()
+        embed.add_field(name="🎭 Role Queue", value=f"Pending: {await bot.role_queue.pending()}\nApplied: {queue_stats['applied']} | Retried: {queue_stats['retried']} | Dropped: {queue_stats['dropped']}", inline=True)
+        sync_stats = bot.command_syncer.stats()
+        sync_lines = [f"{bot_status.last_sync_time.strftime('%H:%M:%S UTC') if bot_status.last_sync_time else 'Never'}"]
+        if sync_stats['slowest']:
+            sync_lines.append(f"Avg: {sync_stats['average']:.2f}s | Slowest: {sync_stats['slowest'].duration:.2f}s ({sync_stats['slowest'].guild.name})")
+        sync_lines.append(f"429s: {sync_stats['rate_limited']} | Concurrency: {sync_stats['concurrency']}/{sync_stats['max_concurrency']}")
+        embed.add_field(name="🔄 Last Sync", value="\n".join(sync_lines), inline=True)
         
         await ctx.send(embed=embed)
         
     except Exception as e:
+        bot.metrics.mark_failed()
         await ctx.send(f"❌ Health check failed: {str(e)}")
 
+@bot.command(name='cache_check')
+async def cache_check(ctx):
+    """Compare the IGN / leadership cache with the database (Admin only)"""
+    if not any(role.name.lower() in ["admin", "administrator"] for role in ctx.author.roles):
+        await ctx.send("❌ This command requires administrator permissions.")
+        return
+
+    try:
+        async with acquire() as conn:
+            problems = await bot.lookup_cache.verify(conn)
+
+        if not problems:
+            await ctx.send("✅ **Lookup cache is consistent with the database**")
+            return
+
+        details = "\n".join(problems[:15])
+        if len(problems) > 15:
+            details += f"\n... and {len(problems) - 15} more"
+        await ctx.send(f"⚠️ **{len(problems)} cache inconsistencies found - reloading**\n```{details}```")
+
+        async with acquire() as conn:
+            await bot.lookup_cache.load(conn)
+
+    except Exception as e:
+        bot.metrics.mark_failed()
+        await ctx.send(f"❌ Cache check failed: {str(e)}")
+
+# Only one profile runs at a time
+profile_lock = asyncio.Lock()
+
+@bot.command(name='profile')
+async def profile(ctx, seconds: int = 10):
+    """Sample the event loop for N seconds and post the hotspots (Admin only)"""
+    if not any(role.name.lower() in ["admin", "administrator"] for role in ctx.author.roles):
+        await ctx.send("❌ This command requires administrator permissions.")
+        return
+    if profile_lock.locked():
+        await ctx.send("⏳ A profile is already running.")
+        return
+
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    try:
+        async with profile_lock:
+            await ctx.send(f"🔬 **Profiling the event loop for {seconds}s...**")
+            # Sampling, aggregation and the file write all happen on a worker thread
+            result = await safe_blocking_operation(profile_thread, threading.get_ident(), seconds)
+
+        if not result.samples:
+            await ctx.send("❌ No samples were collected.")
+            return
+
+        lines = [f"{'cog / command':<44}{'share':>7}"]
+        for owner, count in result.owners.most_common(10):
+            lines.append(f"{owner[:43]:<44}{result.share(count):>7.1%}")
+        leaves = [f"{'function (self time)':<44}{'share':>7}"]
+        for leaf, count in result.leaves.most_common(8):
+            leaves.append(f"{leaf[-43:]:<44}{result.share(count):>7.1%}")
+
+        await ctx.send(
+            f"📊 **Profile: {result.samples} samples over {result.seconds}s** - "
+            f"loop busy {result.share(result.busy):.0%}, idle {result.share(result.idle):.0%}\n"
+            f"```{chr(10).join(lines)}```"
+            f"```{chr(10).join(leaves)}```"
+            f"📁 Collapsed stacks: `{result.path}`",
+            file=discord.File(result.path) if os.path.getsize(result.path) < 8 * 2**20 else None
+        )
+
+    except Exception as e:
+        bot.metrics.mark_failed()
+        await ctx.send(f"❌ Profile failed: {str(e)}")
+        logger.error(f"Profile error: {str(e)}")
+
 # ============================================================
 # BASIC SLASH COMMANDS (Performance Optimized)
 # ============================================================
@@ -474,6 +731,7 @@ async def ping(interaction: discord.Interaction):
         )
         
     except Exception as e:
+        bot.metrics.mark_failed()
         await interaction.response.send_message(f"❌ Ping failed: {str(e)}", ephemeral=True)
 
 @bot.tree.command(name="bot_info", description="Display optimized bot information")
@@ -502,8 +760,65 @@ async def bot_info(interaction: discord.Interaction):
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
+        bot.metrics.mark_failed()
         await interaction.response.send_message(f"❌ Info display failed: {str(e)}", ephemeral=True)
 
+@bot.tree.command(name="perf_stats", description="Show per-command latency percentiles (Admin only)")
+@app_commands.describe(command="Show the DB / REST / render breakdown for one command", reset="Clear the collected statistics")
+async def perf_stats(interaction: discord.Interaction, command: str = None, reset: bool = False):
+    """p50 / p95 / p99 latency per command since startup (or the last reset)"""
+    if not any(role.name.lower() in ["admin", "administrator"] for role in interaction.user.roles):
+        await interaction.response.send_message("❌ This command requires administrator permissions.", ephemeral=True)
+        return
+
+    try:
+        if reset:
+            bot.metrics.reset()
+            await interaction.response.send_message("🧹 **Performance statistics cleared**", ephemeral=True)
+            return
+
+        if command:
+            name = command if command[0] in "/!" else f"/{command}"
+            stats = bot.metrics.commands.get(name)
+            if stats is None:
+                await interaction.response.send_message(f"❌ No timings recorded for `{name}`", ephemeral=True)
+                return
+            lines = [f"{'part':<8}{'p50':>9}{'p95':>9}{'p99':>9}"]
+            for part in ("total", "db", "rest", "render"):
+                histogram = getattr(stats, part)
+                lines.append(f"{part:<8}" + "".join(f"{histogram.percentile(q):>7.0f}ms" for q in (50, 95, 99)))
+            await interaction.response.send_message(
+                f"📈 **{name}** - {stats.calls} calls, {stats.errors} errors\n```{chr(10).join(lines)}```",
+                ephemeral=True
+            )
+            return
+
+        rows = bot.metrics.rows()
+        if not rows:
+            await interaction.response.send_message("📭 No commands timed yet", ephemeral=True)
+            return
+
+        lines = [f"{'command':<28}{'calls':>6}{'err':>5}{'p50':>8}{'p95':>8}{'p99':>8}"]
+        for name, stats in rows[:20]:
+            total = stats.total
+            lines.append(
+                f"{name[:27]:<28}{stats.calls:>6}{stats.errors:>5}"
+                f"{total.percentile(50):>6.0f}ms{total.percentile(95):>6.0f}ms{total.percentile(99):>6.0f}ms"
+            )
+        footer = f"\n... and {len(rows) - 20} more" if len(rows) > 20 else ""
+        lag = bot.loop_lag.lag
+        await interaction.response.send_message(
+            f"📈 **Command latency since startup**\n```{chr(10).join(lines)}```{footer}\n"
+            f"⏳ **Event loop lag:** p50 {lag.percentile(50):.0f}ms | p95 {lag.percentile(95):.0f}ms | "
+            f"p99 {lag.percentile(99):.0f}ms | {bot.loop_watchdog.stalls} stalls over {bot.loop_watchdog.threshold * 1000:.0f}ms\n"
+            f"Use `command:` for the DB / REST / render breakdown of one command.",
+            ephemeral=True
+        )
+
+    except Exception as e:
+        bot.metrics.mark_failed()
+        await interaction.response.send_message(f"❌ Performance stats failed: {str(e)}", ephemeral=True)
+
 # ============================================================
 # GRACEFUL SHUTDOWN HANDLING
 # ============================================================
@@ -536,8 +851,31 @@ async def main():
             return
         
         logger.info("Starting Discord Union Bot (Performance Optimized)...")
+        logger.info(f"Gateway mode: {cluster.describe()}")
+        logger.info(f"Gateway profile: {gateway.describe()}")
         logger.info("Optimizations: Heartbeat monitoring, thread pooling, reduced blocking")
         
+        # Open and warm the shared database pool before any command can run
+        try:
+            pool = await init_pool(query_logger=bot.metrics.record_query)
+            logger.info(f"✅ Database pool ready ({pool.get_size()} warm connections, max {pool.get_max_size()})")
+
+            if os.getenv("DB_AUTO_MIGRATE", "1") != "0":
+                async with acquire() as conn:
+                    applied = await apply_migrations(conn)
+                logger.info(f"✅ Schema migrations: {len(applied)} applied" if applied else "✅ Schema is up to date")
+
+            await bot.cache_listener.start()
+            bot.role_queue.start()
+            bot.loop_lag.start()
+            bot.loop_watchdog.start()
+            await bot.metrics_server.start()
+            async with acquire() as conn:
+                await bot.lookup_cache.load(conn)
+        except Exception as e:
+            logger.error(f"❌ Database initialisation failed: {str(e)}")
+            return
+        
         # Initialize bot with connection retry logic
         max_retries = 3
         retry_delay = 5
@@ -566,7 +904,13 @@ async def main():
         logger.error(f"❌ Failed to start bot: {str(e)}")
         logger.error(traceback.format_exc())
     finally:
-        # Cleanup thread pool
+        # Release database connections and cleanup thread pool
+        await bot.cache_listener.stop()
+        await bot.role_queue.stop()
+        await bot.loop_lag.stop()
+        bot.loop_watchdog.stop()
+        await bot.metrics_server.stop()
+        await close_pool()
         executor.shutdown(wait=True)
 
 # ============================================================
@@ -1,71 +1,60 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db import get_connection  # asyncpg connection
+from utils.db import acquire
+from utils.roster import PRIMARY, SECONDARY, deregister_ign, fetch_slots, register_ign
+from utils.ign_search import search_igns
 
 class BasicCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    def union_display(self, guild, role_id):
+        """Role name for a union, falling back to its ID if the role is gone"""
+        role = guild.get_role(role_id) if guild else None
+        return role.name if role else f"Role ID: {role_id}"
+
+    async def register_ign(self, conn, user, slot, ign):
+        """Create the user row if needed and set the IGN for one slot"""
+        await register_ign(conn, user.id, user.display_name, slot, ign)
+        self.bot.lookup_cache.set_ign(user.id, slot, ign)
+
     @app_commands.command(name="register_primary_ign", description="Register a user's primary in-game name")
     @app_commands.describe(user="Discord user", ign="Primary in-game name", visible="Make this message visible to everyone (default: False)")
     async def register_primary_ign(self, interaction: discord.Interaction, user: discord.Member, ign: str, visible: bool = False):
-        conn = await get_connection()
         try:
-            # First, check if user exists and get their current data
-            existing_user = await conn.fetchrow("SELECT * FROM users WHERE discord_id = $1", str(user.id))
-            
-            if existing_user:
-                # User exists, just update primary IGN
-                await conn.execute("UPDATE users SET ign_primary = $1 WHERE discord_id = $2", ign, str(user.id))
-            else:
-                # User doesn't exist, create new record with primary IGN
-                await conn.execute("""
-                    INSERT INTO users (discord_id, username, ign_primary, ign_secondary, union_name, union_name_2)
-                    VALUES ($1, $2, $3, NULL, NULL, NULL)
-                """, str(user.id), user.display_name, ign)
+            async with acquire() as conn:
+                await self.register_ign(conn, user, PRIMARY, ign)
 
             await interaction.response.send_message(
                 f"✅ Primary IGN for {user.mention} ({user.name}) set to **{ign}**", ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error registering primary IGN: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="register_secondary_ign", description="Register a user's secondary in-game name")
     @app_commands.describe(user="Discord user", ign="Secondary in-game name", visible="Make this message visible to everyone (default: False)")
     async def register_secondary_ign(self, interaction: discord.Interaction, user: discord.Member, ign: str, visible: bool = False):
-        conn = await get_connection()
         try:
-            # First, check if user exists and get their current data
-            existing_user = await conn.fetchrow("SELECT * FROM users WHERE discord_id = $1", str(user.id))
-            
-            if existing_user:
-                # User exists, just update secondary IGN
-                await conn.execute("UPDATE users SET ign_secondary = $1 WHERE discord_id = $2", ign, str(user.id))
-            else:
-                # User doesn't exist, create new record with secondary IGN
-                await conn.execute("""
-                    INSERT INTO users (discord_id, username, ign_primary, ign_secondary, union_name, union_name_2)
-                    VALUES ($1, $2, NULL, $3, NULL, NULL)
-                """, str(user.id), user.display_name, ign)
+            async with acquire() as conn:
+                await self.register_ign(conn, user, SECONDARY, ign)
 
             await interaction.response.send_message(
                 f"✅ Secondary IGN for {user.mention} ({user.name}) set to **{ign}**", ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error registering secondary IGN: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="deregister_primary_ign", description="Remove a user's primary IGN registration")
     @app_commands.describe(user="Discord user", visible="Make this message visible to everyone (default: False)")
     async def deregister_primary_ign(self, interaction: discord.Interaction, user: discord.Member, visible: bool = False):
-        conn = await get_connection()
         try:
-            result = await conn.execute("UPDATE users SET ign_primary = NULL WHERE discord_id = $1", str(user.id))
-            if result and "UPDATE 1" in result:
+            async with acquire() as conn:
+                removed = await deregister_ign(conn, user.id, PRIMARY)
+            if removed:
+                self.bot.lookup_cache.remove_ign(user.id, PRIMARY)
                 await interaction.response.send_message(
                     f"✅ Primary IGN for {user.mention} ({user.name}) has been removed", ephemeral=not visible
                 )
@@ -74,17 +63,17 @@ class BasicCommands(commands.Cog):
                     f"❌ No primary IGN found for {user.mention}", ephemeral=not visible
                 )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error removing primary IGN: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="deregister_secondary_ign", description="Remove a user's secondary IGN registration")
     @app_commands.describe(user="Discord user", visible="Make this message visible to everyone (default: False)")
     async def deregister_secondary_ign(self, interaction: discord.Interaction, user: discord.Member, visible: bool = False):
-        conn = await get_connection()
         try:
-            result = await conn.execute("UPDATE users SET ign_secondary = NULL WHERE discord_id = $1", str(user.id))
-            if result and "UPDATE 1" in result:
+            async with acquire() as conn:
+                removed = await deregister_ign(conn, user.id, SECONDARY)
+            if removed:
+                self.bot.lookup_cache.remove_ign(user.id, SECONDARY)
                 await interaction.response.send_message(
                     f"✅ Secondary IGN for {user.mention} ({user.name}) has been removed", ephemeral=not visible
                 )
@@ -93,189 +82,113 @@ class BasicCommands(commands.Cog):
                     f"❌ No secondary IGN found for {user.mention}", ephemeral=not visible
                 )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error removing secondary IGN: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="search_user", description="Search for a user by Discord name, username, ID, or IGN")
     @app_commands.describe(query="Discord name, username, ID, or IGN to search for", visible="Make this message visible to everyone (default: True)")
     async def search_user(self, interaction: discord.Interaction, query: str, visible: bool = True):
-        conn = await get_connection()
         try:
             # First try to find by Discord ID (if query is numeric)
             discord_user = None
             if query.isdigit():
                 try:
-                    discord_user = await self.bot.fetch_user(int(query))
+                    discord_user = await self.bot.user_cache.fetch(int(query))
                 except:
                     pass
-            
-            # If not found by ID, try to find by Discord name/username in the guild
-            if not discord_user:
-                guild = interaction.guild
-                if guild:
-                    # Search by display name or username
-                    for member in guild.members:
-                        if (query.lower() in member.display_name.lower() or 
-                            query.lower() in member.name.lower() or
-                            query.lower() == member.display_name.lower() or
-                            query.lower() == member.name.lower()):
-                            discord_user = member
-                            break
-            
+
+            # If not found by ID, look the name up in the guild's member directory
+            # (exact name first, then prefix, then substring of username or display name)
+            if not discord_user and interaction.guild:
+                hits = self.bot.member_directory.search(interaction.guild.id, query, limit=1)
+                if hits:
+                    discord_user = hits[0]
+
             # If found by Discord info, get their data
             if discord_user:
-                row = await conn.fetchrow(
-                    "SELECT ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE discord_id = $1", 
-                    str(discord_user.id)
-                )
-                
+                async with acquire() as conn:
+                    slots = (await fetch_slots(conn, [discord_user.id])).get(discord_user.id, {})
+
                 response = f"**Discord:** {discord_user.mention} ({discord_user.name})\n"
-                if row:
-                    # Show Primary IGN with its union
-                    primary_ign = row['ign_primary'] or 'Not registered'
-                    if row['union_name']:
-                        try:
-                            role_id = int(row['union_name'])
-                            role = interaction.guild.get_role(role_id)
-                            primary_union = role.name if role else f"Role ID: {role_id}"
-                        except:
-                            primary_union = row['union_name']
-                    else:
-                        primary_union = "None"
-                    
-                    response += f"**Primary IGN:** {primary_ign} ~ **Union:** {primary_union}\n"
-                    
-                    # Show Secondary IGN with its union
-                    secondary_ign = row['ign_secondary'] or 'Not registered'
-                    if row['union_name_2']:
-                        try:
-                            role_id = int(row['union_name_2'])
-                            role = interaction.guild.get_role(role_id)
-                            secondary_union = role.name if role else f"Role ID: {role_id}"
-                        except:
-                            secondary_union = row['union_name_2']
-                    else:
-                        secondary_union = "None"
-                    
-                    response += f"**Secondary IGN:** {secondary_ign} ~ **Union:** {secondary_union}"
-                else:
-                    response += "**Primary IGN:** Not registered ~ **Union:** None\n"
-                    response += "**Secondary IGN:** Not registered ~ **Union:** None"
-                
-                await interaction.response.send_message(response, ephemeral=not visible)
+                for slot, label in ((PRIMARY, "Primary"), (SECONDARY, "Secondary")):
+                    ign, role_id = slots.get(slot, (None, None))
+                    union = self.union_display(interaction.guild, role_id) if role_id else "None"
+                    response += f"**{label} IGN:** {ign or 'Not registered'} ~ **Union:** {union}\n"
+
+                await interaction.response.send_message(response.rstrip("\n"), ephemeral=not visible)
                 return
-            
-            # If not found by Discord info, search by IGN
-            rows = await conn.fetch(
-                "SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE ign_primary ILIKE $1 OR ign_secondary ILIKE $1", 
-                f"%{query}%"
-            )
-            
-            if not rows:
+
+            # If not found by Discord info, run a ranked fuzzy search over IGNs
+            async with acquire() as conn:
+                matches, has_more = await search_igns(conn, query, limit=5)
+                all_slots = await fetch_slots(conn, list({match['discord_id'] for match in matches})) if matches else {}
+
+            if not matches:
                 await interaction.response.send_message(f"❌ No user found matching **{query}**", ephemeral=not visible)
                 return
-            
-            if len(rows) == 1:
+
+            matched = {match['discord_id']: match for match in matches}
+
+            if len(matched) == 1:
                 # Single result
-                row = rows[0]
+                discord_id, match = next(iter(matched.items()))
                 try:
-                    discord_user = await self.bot.fetch_user(int(row['discord_id']))
+                    discord_user = await self.bot.user_cache.fetch(discord_id)
                     user_display = f"{discord_user.mention} ({discord_user.name})"
                 except:
-                    user_display = f"Unknown User (ID: {row['discord_id']})"
-                
-                # Determine which IGN matched
-                matched_ign = ""
-                if row['ign_primary'] and query.lower() in row['ign_primary'].lower():
-                    matched_ign = f"{row['ign_primary']} (Primary)"
-                elif row['ign_secondary'] and query.lower() in row['ign_secondary'].lower():
-                    matched_ign = f"{row['ign_secondary']} (Secondary)"
-                
+                    user_display = f"Unknown User (ID: {discord_id})"
+
+                matched_ign = f"{match['ign']} ({'Primary' if match['slot'] == PRIMARY else 'Secondary'})"
                 response = f"**Discord:** {user_display}\n**Matched IGN:** {matched_ign}\n"
-                
+
                 # Handle dual unions for single result with IGN binding
+                slots = all_slots.get(discord_id, {})
                 unions = []
-                if row['union_name']:
-                    try:
-                        role_id = int(row['union_name'])
-                        role = interaction.guild.get_role(role_id)
-                        union_display = role.name if role else f"Role ID: {role_id}"
-                        primary_ign = row['ign_primary'] or '*Not registered*'
-                        unions.append(f"{union_display} ~ IGN: {primary_ign}")
-                    except:
-                        primary_ign = row['ign_primary'] or '*Not registered*'
-                        unions.append(f"{row['union_name']} ~ IGN: {primary_ign}")
-                
-                if row['union_name_2']:
-                    try:
-                        role_id = int(row['union_name_2'])
-                        role = interaction.guild.get_role(role_id)
-                        union_display = role.name if role else f"Role ID: {role_id}"
-                        secondary_ign = row['ign_secondary'] or '*Not registered*'
-                        unions.append(f"{union_display} ~ IGN: {secondary_ign}")
-                    except:
-                        secondary_ign = row['ign_secondary'] or '*Not registered*'
-                        unions.append(f"{row['union_name_2']} ~ IGN: {secondary_ign}")
-                
+                for slot in (PRIMARY, SECONDARY):
+                    ign, role_id = slots.get(slot, (None, None))
+                    if role_id:
+                        unions.append(f"{self.union_display(interaction.guild, role_id)} ~ IGN: {ign or '*Not registered*'}")
+
                 if unions:
                     union_text = "\n".join([f"**• {union}**" for union in unions])
                     response += f"**Unions:**\n{union_text}"
                 else:
                     response += "**Unions:** Not assigned"
-                
+
                 await interaction.response.send_message(response, ephemeral=not visible)
             else:
                 # Multiple results
+                shown = list(matched.items())
+                await self.bot.user_cache.get_many(matched.keys())
+
                 response = f"**Multiple users found matching '{query}':**\n\n"
-                for i, row in enumerate(rows[:5]):  # Limit to 5 results
+                for i, (discord_id, match) in enumerate(shown):
                     try:
-                        discord_user = await self.bot.fetch_user(int(row['discord_id']))
+                        discord_user = await self.bot.user_cache.fetch(discord_id)
                         user_display = f"{discord_user.mention} ({discord_user.name})"
                     except:
-                        user_display = f"Unknown User (ID: {row['discord_id']})"
-                    
-                    # Show which IGN matched
-                    matched_ign = ""
-                    if row['ign_primary'] and query.lower() in row['ign_primary'].lower():
-                        matched_ign = row['ign_primary']
-                    elif row['ign_secondary'] and query.lower() in row['ign_secondary'].lower():
-                        matched_ign = row['ign_secondary']
-                    
+                        user_display = f"Unknown User (ID: {discord_id})"
+
                     # Handle dual unions for multiple results
-                    unions = []
-                    if row['union_name']:
-                        try:
-                            role_id = int(row['union_name'])
-                            role = interaction.guild.get_role(role_id)
-                            union_display = role.name if role else f"Role ID: {role_id}"
-                            unions.append(union_display)
-                        except:
-                            unions.append(row['union_name'])
-                    
-                    if row['union_name_2']:
-                        try:
-                            role_id = int(row['union_name_2'])
-                            role = interaction.guild.get_role(role_id)
-                            union_display = role.name if role else f"Role ID: {role_id}"
-                            unions.append(union_display)
-                        except:
-                            unions.append(row['union_name_2'])
-                    
+                    slots = all_slots.get(discord_id, {})
+                    unions = [
+                        self.union_display(interaction.guild, slots[slot][1])
+                        for slot in (PRIMARY, SECONDARY)
+                        if slot in slots and slots[slot][1]
+                    ]
                     union_text = " | ".join(unions) if unions else "None"
-                    
+
                     response += f"**{i+1}.** {user_display}\n"
-                    response += f"   IGN: {matched_ign} | Unions: {union_text}\n\n"
-                
-                if len(rows) > 5:
-                    response += f"*... and {len(rows) - 5} more results*"
-                
+                    response += f"   IGN: {match['ign']} | Unions: {union_text}\n\n"
+
+                if has_more:
+                    response += "*... more results available - refine your search*"
+
                 await interaction.response.send_message(response, ephemeral=not visible)
-                
+
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error searching user: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
 async def setup(bot):
     await bot.add_cog(BasicCommands(bot))
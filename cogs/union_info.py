@@ -1,223 +1,331 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-from utils.db import get_connection
+from utils.db import acquire, transaction
+from utils.roster import PRIMARY, SECONDARY, SLOT_NAMES, fetch_union_rosters
+from utils.cleanup import clear_departure_marks, forget_removed, purge_users, reconcile, record_run
+
+logger = logging.getLogger(__name__)
+
+# Seconds to collect member departures before cleaning them up in one batch
+DEPARTURE_BATCH_DELAY = float(os.getenv("DEPARTURE_BATCH_DELAY", "15"))
+# Departures are handled as they happen; the full scan only catches missed events
+CLEANUP_SCAN_HOURS = 24
+# Guilds reconciled at the same time
+CLEANUP_GUILD_CONCURRENCY = int(os.getenv("CLEANUP_GUILD_CONCURRENCY", "3"))
+# Seconds the first scan waits for every guild's member directory to load
+DIRECTORY_WAIT_SECONDS = 300
+# Guilds skipped because their directory was not loaded are retried this often, this many times
+CLEANUP_RETRY_SECONDS = 300
+CLEANUP_RETRIES = 6
 
 class UnionInfo(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._departures = {}
+        self._departure_task = None
+        # guild_id -> (started_at, duration in seconds, CleanupReport) of the last scan
+        self.last_runs = {}
         self.auto_cleanup.start()
 
     def cog_unload(self):
         self.auto_cleanup.cancel()
+        if self._departure_task:
+            self._departure_task.cancel()
 
     def has_admin_role(self, member):
         """Check if member has admin or mod+ role"""
         admin_roles = ["admin", "mod+"]
         return any(role.name.lower() in admin_roles for role in member.roles)
 
-    @tasks.loop(hours=12)
-    async def auto_cleanup(self):
-        """Automated cleanup task that runs every 12 hours"""
-        try:
-            target_channel = None
-            for guild in self.bot.guilds:
-                for channel in guild.text_channels:
-                    if channel.name.lower() == "union-leader":
-                        target_channel = channel
-                        break
-                if target_channel:
-                    break
-            
-            if not target_channel:
-                print("⚠️ Auto-cleanup: No 'union-leader' channel found")
-                return
-            
-            guild = target_channel.guild
-            conn = await get_connection()
-            
+    @property
+    def pending_departures(self):
+        """Departures collected for the next batched cleanup"""
+        return sum(len(user_ids) for user_ids in self._departures.values())
+
+    def is_member_anywhere(self, discord_id):
+        return any(discord_id in directory for directory in self.bot.member_directory.guilds.values())
+
+    def directories_ready(self):
+        """Whether every guild of this process has been chunked, so absence from all of them can be trusted"""
+        return all(self.bot.member_directory.is_ready(guild.id) for guild in self.bot.guilds)
+
+    def departure_shards(self):
+        """(shard ids run here, shard count) when other cluster processes run the other shards
+
+        Their guilds' members are not visible here, so a user gone from every
+        guild of this process is only marked, and deleted once every shard has
+        marked them (see utils.cleanup.mark_departed).
+        """
+        cluster = self.bot.cluster
+        return (cluster.shard_ids, cluster.shard_count) if cluster.partial else None
+
+    async def send_cleanup_report(self, channel, report, title, description, footer, show_totals=True):
+        """Post a cleanup report embed, pinging the leaders of unions that lost members"""
+        guild = channel.guild
+        directory = self.bot.member_directory.get(guild.id)
+
+        cleanup_actions = []
+        for user in report.removed:
+            if user.led_roles:
+                role_names = []
+                for role_id in user.led_roles:
+                    role = guild.get_role(role_id)
+                    role_names.append(role.name if role else f"Role ID: {role_id}")
+                cleanup_actions.append(f"👑 **Leader removed:** {user.username} from {' & '.join(role_names)}")
+
+            ign_display = [
+                f"{SLOT_NAMES[slot]}: {user.slots[slot][0]}"
+                for slot in (PRIMARY, SECONDARY) if slot in user.slots and user.slots[slot][0]
+            ]
+            ign_text = f" ({' | '.join(ign_display)})" if ign_display else ""
+
+            union_display = []
+            for union_id in user.unions:
+                role = guild.get_role(union_id)
+                union_display.append(role.name if role else str(union_id))
+            union_text = f" from {' & '.join(union_display)}" if union_display else ""
+
+            cleanup_actions.append(f"👤 **User removed:** {user.username}{ign_text}{union_text}")
+
+        embed = discord.Embed(title=title, description=description, color=0xFFA500)
+
+        statistics = ""
+        if show_totals:
+            statistics += f"**Total users checked:** {report.checked}\n" \
+                          f"**Users still in Discord:** {report.present}\n"
+        statistics += f"**Users who left Discord:** {report.removed_count}\n" \
+                      f"**Leaders affected:** {report.leaders_removed}"
+        embed.add_field(name="📊 **STATISTICS**", value=statistics, inline=False)
+
+        if cleanup_actions:
+            action_text = "\n".join(cleanup_actions[:10])
+            if report.removed_count > len(report.removed) or len(cleanup_actions) > 10:
+                action_text += f"\n... and more ({report.removed_count} users removed in total)"
+
+            embed.add_field(
+                name="🧹 **CLEANUP ACTIONS**",
+                value=action_text,
+                inline=False
+            )
+
+        if report.leaders_removed > 0:
+            embed.add_field(
+                name="⚠️ **ATTENTION NEEDED**",
+                value=f"**{report.leaders_removed} union leader(s) were removed.** Use `/appoint_union_leader` to assign new leaders for affected unions.",
+                inline=False
+            )
+
+        embed.set_footer(text=footer)
+
+        leader_mentions = [directory.entries[leader_id].mention for leader_id in report.affected_leaders if leader_id in directory]
+        if leader_mentions:
+            ping_message = f"🔔 **Union Leaders:** {' '.join(leader_mentions[:10])}"
+            if len(leader_mentions) > 10:
+                ping_message += f" and {len(leader_mentions) - 10} others"
+            ping_message += "\n*Members from your unions have left Discord - please review the cleanup report below.*"
+            await channel.send(ping_message)
+
+        await channel.send(embed=embed)
+        if report.affected_leaders:
+            logger.info(f"📢 Pinged {len(leader_mentions)} union leaders about member departures")
+
+    # ---- event-driven departures ------------------------------------------
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        """Queue a departure; departures are processed in batches after a short delay
+
+        Raw event: with the member cache disabled, on_member_remove is not dispatched.
+        """
+        self._departures.setdefault(payload.guild_id, set()).add(payload.user.id)
+        if self._departure_task is None or self._departure_task.done():
+            self._departure_task = asyncio.create_task(self.process_departures())
+
+    async def process_departures(self):
+        """Process departure batches until none are left
+
+        Departures arriving while a batch is being processed start the next
+        batch: on_raw_member_remove only starts this task when it is not running.
+        """
+        while self._departures:
+            await asyncio.sleep(DEPARTURE_BATCH_DELAY)
+            pending, self._departures = self._departures, {}
+            await self.process_departure_batch(pending)
+
+    async def process_departure_batch(self, pending):
+        # Under the cluster launcher orphans are only confirmed by the scan's departure marks
+        all_ready = self.directories_ready() and self.departure_shards() is None
+
+        for guild_id, user_ids in pending.items():
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+
+            # Skip anyone who rejoined during the delay
+            directory = self.bot.member_directory.get(guild_id)
+            departed = [user_id for user_id in user_ids if user_id not in directory]
+            if not departed:
+                continue
+            orphans = [user_id for user_id in departed if not self.is_member_anywhere(user_id)] if all_ready else []
+
             try:
-                all_users = await conn.fetch("SELECT discord_id, username, ign_primary, ign_secondary, union_name, union_name_2 FROM users ORDER BY discord_id")
-                
-                if not all_users:
-                    return
-                
-                total_users = len(all_users)
-                users_still_in_guild = 0
-                users_left_guild = 0
-                leaders_affected = 0
-                cleanup_actions = []
-                affected_leaders = set()
-                
-                for user_record in all_users:
-                    discord_id = user_record['discord_id']
-                    username = user_record['username']
-                    ign_primary = user_record['ign_primary']
-                    ign_secondary = user_record['ign_secondary']
-                    union_name = user_record['union_name']
-                    union_name_2 = user_record['union_name_2']
-                    
-                    member = guild.get_member(int(discord_id))
-                    
-                    if member:
-                        users_still_in_guild += 1
-                    else:
-                        users_left_guild += 1
-                        
-                        leader_check = await conn.fetchrow("SELECT role_id, role_id_2 FROM union_leaders WHERE user_id = $1", int(discord_id))
-                        was_leader = leader_check is not None
-                        if leader_check:
-                            leaders_affected += 1
-                            await conn.execute("DELETE FROM union_leaders WHERE user_id = $1", int(discord_id))
-                            
-                            role_names = []
-                            if leader_check['role_id']:
-                                role = guild.get_role(leader_check['role_id'])
-                                role_names.append(role.name if role else f"Role ID: {leader_check['role_id']}")
-                            if leader_check['role_id_2']:
-                                role = guild.get_role(leader_check['role_id_2'])
-                                role_names.append(role.name if role else f"Role ID: {leader_check['role_id_2']}")
-                            
-                            cleanup_actions.append(f"👑 **Leader removed:** {username} from {' & '.join(role_names)}")
-                        
-                        member_unions = []
-                        if union_name:
-                            member_unions.append(union_name)
-                        if union_name_2:
-                            member_unions.append(union_name_2)
-                        
-                        for union_id in member_unions:
-                            try:
-                                union_leaders = await conn.fetch(
-                                    "SELECT user_id FROM union_leaders WHERE role_id = $1 OR role_id_2 = $1", 
-                                    int(union_id)
-                                )
-                                for leader_record in union_leaders:
-                                    leader_id = leader_record['user_id']
-                                    if leader_id != int(discord_id):
-                                        leader_member = guild.get_member(leader_id)
-                                        if leader_member:
-                                            affected_leaders.add(leader_id)
-                            except:
-                                pass
-                        
-                        await conn.execute("DELETE FROM users WHERE discord_id = $1", discord_id)
-                        
-                        ign_display = []
-                        if ign_primary:
-                            ign_display.append(f"Primary: {ign_primary}")
-                        if ign_secondary:
-                            ign_display.append(f"Secondary: {ign_secondary}")
-                        ign_text = f" ({' | '.join(ign_display)})" if ign_display else ""
-                        
-                        union_display = []
-                        if union_name:
-                            try:
-                                role = guild.get_role(int(union_name)) if union_name.isdigit() else None
-                                union_display.append(role.name if role else union_name)
-                            except:
-                                union_display.append(union_name)
-                        if union_name_2:
-                            try:
-                                role = guild.get_role(int(union_name_2)) if union_name_2.isdigit() else None
-                                union_display.append(role.name if role else union_name_2)
-                            except:
-                                union_display.append(union_name_2)
-                        union_text = f" from {' & '.join(union_display)}" if union_display else ""
-                        
-                        cleanup_actions.append(f"👤 **User removed:** {username}{ign_text}{union_text}")
-                
-                if users_left_guild > 0:
-                    embed = discord.Embed(
-                        title="🔄 **AUTOMATED DATABASE CLEANUP**",
-                        description="*12-hour automated cleanup completed*",
-                        color=0xFFA500
+                started_at = datetime.datetime.now(datetime.timezone.utc)
+                start = time.perf_counter()
+                async with transaction() as conn:
+                    report = await purge_users(
+                        conn, departed, guild_id, orphans, guild_role_ids=[role.id for role in guild.roles]
                     )
-                    
-                    embed.add_field(
-                        name="📊 **STATISTICS**",
-                        value=f"**Total users checked:** {total_users}\n"
-                              f"**Users still in Discord:** {users_still_in_guild}\n"
-                              f"**Users who left Discord:** {users_left_guild}\n"
-                              f"**Leaders affected:** {leaders_affected}",
-                        inline=False
+                    report.checked = len(departed)
+                    await record_run(conn, guild_id, "departure", started_at, time.perf_counter() - start, report)
+                forget_removed(self.bot.lookup_cache, report.removed)
+
+                if not report.removed_count:
+                    continue
+                logger.info(f"✅ Departure cleanup: {report.removed_count} users removed from {guild.name}", extra={"guild": guild.id})
+
+                channel = await self.bot.guild_settings.report_channel(guild)
+                if channel:
+                    await self.send_cleanup_report(
+                        channel, report,
+                        title="👋 **MEMBER DEPARTURE CLEANUP**",
+                        description="*Members who left Discord were removed from the database*",
+                        footer="Departures are cleaned up as they happen",
+                        show_totals=False
                     )
-                    
-                    if cleanup_actions:
-                        action_text = "\n".join(cleanup_actions[:10])
-                        if len(cleanup_actions) > 10:
-                            action_text += f"\n... and {len(cleanup_actions) - 10} more actions"
-                        
-                        embed.add_field(
-                            name="🧹 **CLEANUP ACTIONS**",
-                            value=action_text,
-                            inline=False
-                        )
-                    
-                    if leaders_affected > 0:
-                        embed.add_field(
-                            name="⚠️ **ATTENTION NEEDED**",
-                            value=f"**{leaders_affected} union leader(s) were removed.** Use `/appoint_union_leader` to assign new leaders for affected unions.",
-                            inline=False
-                        )
-                    
-                    embed.set_footer(text="Automated cleanup runs every 12 hours")
-                    
-                    leader_mentions = []
-                    for leader_id in affected_leaders:
-                        leader_member = guild.get_member(leader_id)
-                        if leader_member:
-                            leader_mentions.append(leader_member.mention)
-                    
-                    if leader_mentions:
-                        ping_message = f"🔔 **Union Leaders:** {' '.join(leader_mentions[:10])}"
-                        if len(leader_mentions) > 10:
-                            ping_message += f" and {len(leader_mentions) - 10} others"
-                        ping_message += "\n*Members from your unions have left Discord - please review the cleanup report below.*"
-                        await target_channel.send(ping_message)
-                    
-                    await target_channel.send(embed=embed)
-                    print(f"✅ Auto-cleanup completed: {users_left_guild} users removed, posted to #{target_channel.name}")
-                    if affected_leaders:
-                        print(f"📢 Pinged {len(affected_leaders)} union leaders about member departures")
-                
-                else:
-                    print("✅ Auto-cleanup completed: No users needed removal")
-                    
             except Exception as e:
+                logger.error(f"❌ Departure cleanup error in {guild.name}: {str(e)}", extra={"guild": guild.id})
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """Under the cluster launcher, a join anywhere cancels the user's pending orphan deletion"""
+        if self.departure_shards() is None:
+            return
+        try:
+            async with acquire() as conn:
+                await clear_departure_marks(conn, [member.id])
+        except Exception as e:
+            logger.error(f"❌ Could not clear departure marks for {member.id}: {str(e)}", extra={"guild": member.guild.id})
+
+    # ---- periodic reconciliation --------------------------------------------
+
+    @tasks.loop(hours=CLEANUP_SCAN_HOURS)
+    async def auto_cleanup(self):
+        """Reconciliation scan of every guild: catches departures missed while the bot was offline
+
+        Guilds whose member directory is still loading are retried a few times
+        after a short delay rather than waiting for the next scan.
+        """
+        try:
+            guilds = list(self.bot.guilds)
+            for attempt in range(CLEANUP_RETRIES + 1):
+                if attempt:
+                    await asyncio.sleep(CLEANUP_RETRY_SECONDS)
+                    guilds = [guild for guild in guilds if self.bot.get_guild(guild.id)]
+                guilds = await self.reconcile_guilds(guilds)
+                if not guilds:
+                    return
+            logger.warning(f"⚠️ Auto-cleanup: {len(guilds)} guild(s) still not loaded, left for the next scan")
+        except Exception as e:
+            logger.error(f"❌ Auto-cleanup task error: {str(e)}")
+
+    async def reconcile_guilds(self, guilds):
+        """Reconcile guilds concurrently; returns the ones skipped because their directory is not loaded"""
+        all_ready = self.directories_ready()
+        limit = asyncio.Semaphore(CLEANUP_GUILD_CONCURRENCY)
+
+        async def run(guild):
+            async with limit:
+                return await self.reconcile_guild(guild, all_ready)
+
+        done = await asyncio.gather(*(run(guild) for guild in guilds))
+        return [guild for guild, ran in zip(guilds, done) if not ran]
+
+    async def reconcile_guild(self, guild, all_ready):
+        """Remove users who left this guild from its unions, reporting to the guild's channel
+
+        Users gone from every guild are deleted outright, but only when every
+        guild's member directory is loaded. Returns False if the guild was
+        skipped because its own directory is not loaded yet.
+        """
+        # Presence is checked against the member directory; without a completed
+        # chunk every user would look absent, so skip this guild instead
+        if not self.bot.member_directory.is_ready(guild.id):
+            logger.warning(f"⚠️ Auto-cleanup: member directory for {guild.name} not loaded yet, skipping", extra={"guild": guild.id})
+            return False
+        directory = self.bot.member_directory.get(guild.id)
+        target_channel = None
+
+        try:
+            target_channel = await self.bot.guild_settings.report_channel(guild)
+
+            started_at = datetime.datetime.now(datetime.timezone.utc)
+            start = time.perf_counter()
+            report = await reconcile(
+                directory.__contains__,
+                guild_id=guild.id,
+                is_orphan=(lambda discord_id: not self.is_member_anywhere(discord_id)) if all_ready else None,
+                on_page=lambda page: forget_removed(self.bot.lookup_cache, page.removed),
+                shards=self.departure_shards(),
+                guild_role_ids=[role.id for role in guild.roles]
+            )
+            duration = time.perf_counter() - start
+
+            async with acquire() as conn:
+                await record_run(conn, guild.id, "scan", started_at, duration, report)
+            self.last_runs[guild.id] = (started_at, duration, report)
+            logger.info(f"✅ Auto-cleanup {guild.name}: {report.checked} users checked, {report.removed_count} removed in {duration:.2f}s", extra={"guild": guild.id, "latency_ms": round(duration * 1000, 1)})
+
+            if report.removed_count and target_channel:
+                await self.send_cleanup_report(
+                    target_channel, report,
+                    title="🔄 **AUTOMATED DATABASE CLEANUP**",
+                    description=f"*{CLEANUP_SCAN_HOURS}-hour reconciliation scan completed*",
+                    footer=f"Reconciliation scan runs every {CLEANUP_SCAN_HOURS} hours"
+                )
+            elif report.removed_count:
+                logger.warning(f"⚠️ Auto-cleanup: no report channel configured for {guild.name}", extra={"guild": guild.id})
+
+        except Exception as e:
+            if target_channel:
                 error_embed = discord.Embed(
                     title="❌ **AUTOMATED CLEANUP ERROR**",
                     description=f"*Error during automated cleanup: {str(e)}*",
                     color=0xFF0000
                 )
                 await target_channel.send(embed=error_embed)
-                print(f"❌ Auto-cleanup error: {str(e)}")
-            finally:
-                await conn.close()
-                
-        except Exception as e:
-            print(f"❌ Auto-cleanup task error: {str(e)}")
+            logger.error(f"❌ Auto-cleanup error in {guild.name}: {str(e)}", extra={"guild": guild.id})
+        return True
 
     @auto_cleanup.before_loop
     async def before_auto_cleanup(self):
-        """Wait until the bot is ready before starting the cleanup loop"""
+        """Wait until the bot is ready and the member directories are loaded (or a timeout passes)"""
         await self.bot.wait_until_ready()
-        print("🔄 Auto-cleanup task started - runs every 12 hours")
+        loaded = await self.bot.member_directory.wait_until_ready(
+            [guild.id for guild in self.bot.guilds], DIRECTORY_WAIT_SECONDS
+        )
+        if not loaded:
+            logger.warning(f"⚠️ Auto-cleanup: member directories not all loaded after {DIRECTORY_WAIT_SECONDS}s, starting anyway")
+        logger.info(f"🔄 Auto-cleanup task started - runs every {CLEANUP_SCAN_HOURS} hours")
 
     @app_commands.command(name="show_union_leader", description="Show all union leaders and their assignments")
     @app_commands.describe(visible="Make this message visible to everyone (default: True)")
     async def show_union_leader(self, interaction: discord.Interaction, visible: bool = True):
         await interaction.response.defer(ephemeral=not visible)
         
-        conn = await get_connection()
         try:
-            rows = await conn.fetch("""
-                SELECT ul.user_id, ul.role_id, ul.role_id_2, u.ign_primary, u.ign_secondary
-                FROM union_leaders ul
-                LEFT JOIN users u ON ul.user_id::text = u.discord_id
-                WHERE ul.role_id IS NOT NULL OR ul.role_id_2 IS NOT NULL
-                ORDER BY ul.user_id
-            """)
+            async with acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT ul.user_id, ul.slot, ul.role_id, i.ign
+                    FROM union_leaders ul
+                    LEFT JOIN user_igns i ON i.discord_id = ul.user_id AND i.slot = ul.slot
+                    ORDER BY ul.user_id, ul.slot
+                """)
 
             if not rows:
                 await interaction.followup.send("❌ No union leaders found.", ephemeral=not visible)
@@ -230,42 +338,35 @@ class UnionInfo(commands.Cog):
             )
             embed.set_footer(text="Use /appoint_union_leader to assign new leaders")
 
+            # One entry per leader, each holding its leading slots in slot order
+            leaders = {}
             for row in rows:
-                leader_id = row["user_id"]
-                role_id_primary = row["role_id"]
-                role_id_secondary = row["role_id_2"]
-                ign_primary = row["ign_primary"]
-                ign_secondary = row["ign_secondary"]
+                leaders.setdefault(row["user_id"], []).append(row)
+
+            # Resolve every leader profile up front (cached, concurrent) instead of one REST call per row
+            await self.bot.user_cache.get_many(leaders.keys())
 
+            for leader_id, led_slots in leaders.items():
                 try:
-                    leader = await self.bot.fetch_user(int(leader_id))
+                    leader = await self.bot.user_cache.fetch(leader_id)
                     leader_display = f"**{leader.display_name}** ({leader.name})\n"
                     leader_display += f"🆔 `{leader.id}`"
                 except:
                     leader_display = f"**Unknown User**\n🆔 `{leader_id}`"
 
-                leadership_info = []
-                
-                if role_id_primary:
-                    role = interaction.guild.get_role(role_id_primary)
-                    role_name = role.name if role else f"Role ID: {role_id_primary}"
-                    primary_ign_display = f"🎮 **Primary IGN:** {ign_primary}" if ign_primary else "🎮 **Primary IGN:** *Not registered*"
-                    leadership_info.append(f"🏛️ **{role_name}**\n{leader_display}\n{primary_ign_display}")
-                
-                if role_id_secondary:
-                    role = interaction.guild.get_role(role_id_secondary)
-                    role_name = role.name if role else f"Role ID: {role_id_secondary}"
-                    secondary_ign_display = f"🎯 **Secondary IGN:** {ign_secondary}" if ign_secondary else "🎯 **Secondary IGN:** *Not registered*"
-                    leadership_info.append(f"🏛️ **{role_name}**\n{leader_display}\n{secondary_ign_display}")
-                
-                for info in leadership_info:
+                for row in led_slots:
+                    role = interaction.guild.get_role(row["role_id"])
+                    role_name = role.name if role else f"Role ID: {row['role_id']}"
+                    icon = "🎮" if row["slot"] == PRIMARY else "🎯"
+                    ign_display = f"{icon} **{SLOT_NAMES[row['slot']]} IGN:** {row['ign'] or '*Not registered*'}"
+
                     embed.add_field(
                         name="👑 **LEADERSHIP**",
-                        value=f"{info}\n\u200b",
+                        value=f"🏛️ **{role_name}**\n{leader_display}\n{ign_display}\n\u200b",
                         inline=False
                     )
 
-            total_leaders = len(rows)
+            total_leaders = len(leaders)
             embed.add_field(
                 name="📊 **SUMMARY**",
                 value=f"**Total Leaders:** {total_leaders}",
@@ -275,9 +376,8 @@ class UnionInfo(commands.Cog):
             await interaction.followup.send(embed=embed, ephemeral=not visible)
 
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.followup.send(f"❌ Error: {str(e)}", ephemeral=True)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="show_union_detail", description="Show all unions with member lists in embed format")
     @app_commands.describe(
@@ -288,28 +388,32 @@ class UnionInfo(commands.Cog):
     async def show_union_detail(self, interaction: discord.Interaction, union_name: str = None, show_members: bool = True, visible: bool = True):
         await interaction.response.defer(ephemeral=not visible)
         
-        conn = await get_connection()
         try:
-            if union_name:
+            # Query first and release the connection before any Discord calls
+            async with acquire() as conn:
                 all_unions = await conn.fetch("SELECT role_id FROM union_roles ORDER BY role_id")
-                
+                if not union_name:
+                    unions = all_unions
+                    rosters = await fetch_union_rosters(conn, [union_row['role_id'] for union_row in unions])
+
+            if union_name:
                 matching_union = None
                 available_unions = []
-                
+
                 for union_row in all_unions:
-                    role_id = int(union_row['role_id'])
+                    role_id = union_row['role_id']
                     role = interaction.guild.get_role(role_id)
                     if role:
                         available_unions.append(role.name)
                         if union_name.lower() in role.name.lower():
                             matching_union = union_row
                             break
-                
+
                 if not matching_union:
                     union_list = "\n".join([f"• {name}" for name in available_unions[:10]])
                     if len(available_unions) > 10:
                         union_list += f"\n... and {len(available_unions) - 10} more"
-                    
+
                     await interaction.followup.send(
                         f"❌ No registered union found matching **{union_name}**\n\n"
                         f"**Available registered unions:**\n{union_list}\n\n"
@@ -317,38 +421,42 @@ class UnionInfo(commands.Cog):
                         ephemeral=not visible
                     )
                     return
-                
+
                 unions = [matching_union]
-            else:
-                unions = await conn.fetch("SELECT role_id FROM union_roles ORDER BY role_id")
+                # Leaders and members of every requested union in a single round trip
+                async with acquire() as conn:
+                    rosters = await fetch_union_rosters(conn, [matching_union['role_id']])
 
             if not unions:
                 await interaction.followup.send("❌ No unions found.", ephemeral=not visible)
                 return
 
+            # Warm the profile cache for every leader and member shown, concurrently
+            profile_ids = set()
+            for roster in rosters.values():
+                if roster["leader_id"]:
+                    profile_ids.add(roster["leader_id"])
+                if show_members:
+                    profile_ids.update(discord_id for discord_id, _ in roster["members"])
+            await self.bot.user_cache.get_many(profile_ids)
+
             embeds = []
-            
+
             for union_row in unions:
-                role_id = int(union_row['role_id'])
-                
+                role_id = union_row['role_id']
+
                 role = interaction.guild.get_role(role_id)
                 role_name = role.name if role else f"Unknown Role (ID: {role_id})"
 
-                leader_row = await conn.fetchrow("SELECT user_id FROM union_leaders WHERE role_id = $1 OR role_id_2 = $1", role_id)
-                leader_id = leader_row['user_id'] if leader_row else None
-
-                members = await conn.fetch("""
-                    SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2
-                    FROM users
-                    WHERE union_name = $1 OR union_name_2 = $1
-                    ORDER BY discord_id
-                """, str(role_id))
+                roster = rosters.get(role_id, {"leader_id": None, "leader_igns": [], "members": []})
+                leader_id = roster["leader_id"]
+                members = roster["members"]
 
                 member_count = len(members)
-                
+
                 leader_in_members = False
                 if leader_id:
-                    leader_in_members = any(str(member['discord_id']) == str(leader_id) for member in members)
+                    leader_in_members = any(discord_id == leader_id for discord_id, _ in members)
                     if not leader_in_members:
                         member_count += 1
 
@@ -362,62 +470,43 @@ class UnionInfo(commands.Cog):
                     if member_count == 0:
                         if leader_id:
                             try:
-                                leader_user = await self.bot.fetch_user(int(leader_id))
+                                leader_user = await self.bot.user_cache.fetch(leader_id)
                                 discord_name = leader_user.display_name
-                                
-                                leader_igns = await conn.fetchrow(
-                                    "SELECT ign_primary, ign_secondary FROM users WHERE discord_id = $1", 
-                                    str(leader_id)
-                                )
-                                if leader_igns and (leader_igns['ign_primary'] or leader_igns['ign_secondary']):
-                                    ign_parts = []
-                                    if leader_igns['ign_primary']:
-                                        ign_parts.append(leader_igns['ign_primary'])
-                                    if leader_igns['ign_secondary']:
-                                        ign_parts.append(leader_igns['ign_secondary'])
-                                    
+
+                                ign_parts = roster["leader_igns"]
+                                if ign_parts:
                                     leader_display = f"**{discord_name}** ~ IGN: *{' | '.join(ign_parts)}*"
                                 else:
                                     leader_display = f"**{discord_name}** ~ IGN: *Not registered*"
-                                
+
                                 member_list = f"👑 {leader_display}\n\n*No other members*"
                             except:
                                 member_list = f"👑 **Unknown Leader**\n\n*No other members*"
                         else:
                             member_list = "🔍 **No leader assigned**\n🔍 **No members**\n\n*Use `/appoint_union_leader` to assign a leader*"
-                        
+
                         embed.add_field(name="Members", value=member_list, inline=False)
                     else:
                         member_entries = []
                         leader_entry = None
-                        
-                        for record in members:
-                            discord_id = record['discord_id']
-                            ign_primary = record['ign_primary']
-                            ign_secondary = record['ign_secondary']
-                            union_name = record['union_name']
-                            union_name_2 = record['union_name_2']
+
+                        for discord_id, ign in members:
 
                             try:
-                                member_obj = interaction.guild.get_member(int(discord_id))
+                                member_obj = interaction.guild.get_member(discord_id)
                                 if member_obj:
                                     discord_name = member_obj.display_name
                                 else:
-                                    user = await self.bot.fetch_user(int(discord_id))
+                                    user = await self.bot.user_cache.fetch(discord_id)
                                     discord_name = user.display_name
                             except:
                                 discord_name = f"Unknown User (ID: {discord_id})"
 
-                            if str(union_name) == str(role_id):
-                                relevant_ign = ign_primary if ign_primary else "*Not registered*"
-                            elif str(union_name_2) == str(role_id):
-                                relevant_ign = ign_secondary if ign_secondary else "*Not registered*"
-                            else:
-                                relevant_ign = "*Unknown*"
+                            relevant_ign = ign if ign else "*Not registered*"
 
                             full_display = f"**{discord_name}** ~ IGN: *{relevant_ign}*"
 
-                            if leader_id and str(discord_id) == str(leader_id):
+                            if leader_id and discord_id == leader_id:
                                 leader_entry = {
                                     'display': f"👑 {full_display}",
                                     'sort_key': relevant_ign.lower() if relevant_ign != "*Not registered*" and relevant_ign != "*Unknown*" else "zzz"
@@ -427,14 +516,14 @@ class UnionInfo(commands.Cog):
                                     'display': f"👤 {full_display}",
                                     'sort_key': relevant_ign.lower() if relevant_ign != "*Not registered*" and relevant_ign != "*Unknown*" else "zzz"
                                 })
-                        
+
                         if leader_id and not leader_in_members:
                             try:
-                                leader_user = await self.bot.fetch_user(int(leader_id))
+                                leader_user = await self.bot.user_cache.fetch(leader_id)
                                 discord_name = leader_user.display_name
                             except:
                                 discord_name = f"Unknown User (ID: {leader_id})"
-                            
+
                             leader_entry = {
                                 'display': f"👑 **{discord_name}** ~ IGN: *Not in union*",
                                 'sort_key': "zzz"
@@ -445,39 +534,39 @@ class UnionInfo(commands.Cog):
                         all_entries = []
                         if leader_entry:
                             all_entries.append(leader_entry['display'])
-                        
+
                         max_members = 34 if leader_entry else 35
                         all_entries.extend([entry['display'] for entry in member_entries[:max_members]])
-                        
+
                         if len(member_entries) > max_members:
                             remaining = len(member_entries) - max_members
                             all_entries.append(f"\n*... and {remaining} more members (35 line limit)*")
-                        
+
                         full_member_list = "\n".join(all_entries)
-                        
+
                         if len(full_member_list) <= 1024:
                             embed.add_field(name="Members", value=full_member_list, inline=False)
                         else:
                             current_chunk = []
                             current_length = 0
                             field_count = 0
-                            
+
                             for entry in all_entries:
                                 entry_length = len(entry) + 1
-                                
+
                                 if current_length + entry_length > 1000 and current_chunk:
                                     field_count += 1
                                     if field_count == 1:
                                         embed.add_field(name="Members", value="\n".join(current_chunk), inline=False)
                                     else:
                                         embed.add_field(name="\u200b", value="\n".join(current_chunk), inline=False)
-                                    
+
                                     current_chunk = [entry]
                                     current_length = entry_length
                                 else:
                                     current_chunk.append(entry)
                                     current_length += entry_length
-                            
+
                             if current_chunk:
                                 field_count += 1
                                 if field_count == 1:
@@ -487,14 +576,14 @@ class UnionInfo(commands.Cog):
                 else:
                     if leader_id:
                         try:
-                            leader_user = await self.bot.fetch_user(int(leader_id))
+                            leader_user = await self.bot.user_cache.fetch(leader_id)
                             leader_name = leader_user.display_name
                             leader_info = f"👑 **Leader:** {leader_name}"
                         except:
                             leader_info = f"👑 **Leader:** Unknown User (ID: {leader_id})"
                     else:
                         leader_info = "🔍 **No leader assigned**"
-                    
+
                     embed.add_field(
                         name="Summary", 
                         value=f"{leader_info}\n👥 **Total Members:** {member_count}/30", 
@@ -502,25 +591,24 @@ class UnionInfo(commands.Cog):
                     )
 
                 embeds.append(embed)
-            
+
             if not embeds:
                 await interaction.followup.send("❌ No union data found.", ephemeral=not visible)
                 return
-            
+
             if union_name:
                 await interaction.followup.send(f"🔍 **Union Search Result for '{union_name}'**", embed=embeds[0], ephemeral=not visible)
             else:
                 members_text = " (members hidden)" if not show_members else ""
                 await interaction.followup.send(f"🏛️ **Union Overview** ({len(embeds)} unions){members_text}", embed=embeds[0], ephemeral=not visible)
-            
+
             for i, embed in enumerate(embeds[1:], 2):
                 members_text = " (members hidden)" if not show_members else ""
                 await interaction.followup.send(f"🏛️ **Union Overview (Part {i})**{members_text}", embed=embed, ephemeral=not visible)
 
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.followup.send(f"❌ Error: {str(e)}", ephemeral=True)
-        finally:
-            await conn.close()
 
 async def setup(bot):
     await bot.add_cog(UnionInfo(bot))
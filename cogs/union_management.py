@@ -1,11 +1,19 @@
+import logging
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db import get_connection  # asyncpg connection
+from utils.db import acquire, transaction
+from utils.roster import SLOT_NAMES
+from utils.union_ops import appoint_leader, deregister_union, dismiss_leader
+from utils.role_drift import RoleDrift, full_drift, member_drift
+
+logger = logging.getLogger(__name__)
 
 class UnionManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> RoleDrift, from the last full scan plus incremental checks
+        self.role_drift = {}
 
     def has_admin_role(self, member):
         """Check if member has admin or mod+ role"""
@@ -13,16 +21,8 @@ class UnionManagement(commands.Cog):
         return any(role.name.lower() in admin_roles for role in member.roles)
 
     async def find_user_by_ign(self, ign):
-        """Find Discord user by their primary or secondary IGN"""
-        conn = await get_connection()
-        try:
-            row = await conn.fetchrow(
-                "SELECT discord_id FROM users WHERE ign_primary = $1 OR ign_secondary = $1", 
-                ign
-            )
-            return row['discord_id'] if row else None
-        finally:
-            await conn.close()
+        """Find (discord_id, slot) for a primary or secondary IGN"""
+        return await self.bot.lookup_cache.find_ign(ign)
 
     @app_commands.command(name="register_role_as_union", description="Register a Discord role as a union (Admin only)")
     @app_commands.describe(role="Discord role to register as union", visible="Make this message visible to everyone (default: False)")
@@ -35,21 +35,36 @@ class UnionManagement(commands.Cog):
             await interaction.response.send_message("❌ Role name must start with 'Union-' prefix.", ephemeral=not visible)
             return
 
-        conn = await get_connection()
         try:
-            # Check if already exists first
-            existing = await conn.fetchrow("SELECT role_id FROM union_roles WHERE role_id = $1", role.id)
+            async with acquire() as conn:
+                # Check if already exists first
+                existing = await conn.fetchrow("SELECT role_id FROM union_roles WHERE role_id = $1", role.id)
+                if not existing:
+                    # Insert new union role
+                    await conn.execute("INSERT INTO union_roles (role_id, guild_id) VALUES ($1, $2)", role.id, interaction.guild.id)
+
             if existing:
                 await interaction.response.send_message(f"❌ Role **{role.name}** is already registered as union", ephemeral=not visible)
                 return
-            
-            # Insert new union role
-            await conn.execute("INSERT INTO union_roles (role_id) VALUES ($1)", role.id)
+            self.bot.union_roles.invalidate()
             await interaction.response.send_message(f"✅ Role **{role.name}** registered as union", ephemeral=not visible)
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error registering union role: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
+
+    @app_commands.command(name="set_cleanup_channel", description="Set the channel for this server's cleanup reports (Admin only)")
+    @app_commands.describe(channel="Channel that receives cleanup reports and leader pings", visible="Make this message visible to everyone (default: False)")
+    async def set_cleanup_channel(self, interaction: discord.Interaction, channel: discord.TextChannel, visible: bool = False):
+        if not self.has_admin_role(interaction.user):
+            await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
+            return
+
+        try:
+            await self.bot.guild_settings.set_report_channel(interaction.guild.id, channel.id)
+            await interaction.response.send_message(f"✅ Cleanup reports will be posted in {channel.mention}", ephemeral=not visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.response.send_message(f"❌ Error setting cleanup channel: {str(e)}", ephemeral=not visible)
 
     @app_commands.command(name="deregister_role_as_union", description="Deregister a union role (Admin only)")
     @app_commands.describe(role="Discord role to deregister", visible="Make this message visible to everyone (default: False)")
@@ -58,17 +73,25 @@ class UnionManagement(commands.Cog):
             await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
             return
 
-        conn = await get_connection()
         try:
-            await conn.execute("DELETE FROM union_roles WHERE role_id = $1", role.id)
-            await conn.execute("DELETE FROM union_leaders WHERE role_id = $1 OR role_id_2 = $1", role.id)
-            await conn.execute("UPDATE users SET union_name = NULL WHERE union_name = $1", str(role.id))
-            await conn.execute("UPDATE users SET union_name_2 = NULL WHERE union_name_2 = $1", str(role.id))
-            await interaction.response.send_message(f"✅ Union **{role.name}** deregistered and all members removed", ephemeral=not visible)
+            async with acquire() as conn:
+                result = await deregister_union(conn, role.id)
+            self.bot.lookup_cache.remove_role(role.id)
+            self.bot.union_roles.invalidate()
+
+            if not result['registered']:
+                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+
+            await interaction.response.send_message(
+                f"✅ Union **{role.name}** deregistered and all members removed "
+                f"({result['members_removed']} member{'s' if result['members_removed'] != 1 else ''}, "
+                f"{result['leaders_removed']} leader{'s' if result['leaders_removed'] != 1 else ''})",
+                ephemeral=not visible
+            )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error deregistering union role: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="appoint_union_leader", description="Appoint a union leader by IGN (Admin only)")
     @app_commands.describe(ign="In-game name of the player to appoint as leader", role="Union role", visible="Make this message visible to everyone (default: False)")
@@ -77,152 +100,88 @@ class UnionManagement(commands.Cog):
             await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
             return
 
-        # Find Discord user by IGN
-        discord_id = await self.find_user_by_ign(ign)
-        if not discord_id:
+        # Find Discord user and IGN slot by IGN
+        found = await self.find_user_by_ign(ign)
+        if not found:
             await interaction.response.send_message(
-                f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first using `/register_primary_ign` or `/register_secondary_ign`.", 
+                f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first using `/register_primary_ign` or `/register_secondary_ign`.",
                 ephemeral=not visible
             )
             return
+        discord_id, slot = found
+        ign_type = SLOT_NAMES[slot]
 
-        conn = await get_connection()
         try:
-            # Check if role is registered as union
-            role_check = await conn.fetchrow("SELECT role_id FROM union_roles WHERE role_id = $1", role.id)
-            if not role_check:
-                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
-                return
-
             # Get the Discord user object for display
             try:
-                discord_user = await self.bot.fetch_user(int(discord_id))
+                discord_user = await self.bot.user_cache.fetch(discord_id)
                 user_display = f"{discord_user.mention} ({discord_user.name})"
             except:
                 user_display = f"User ID: {discord_id}"
 
-            # Check current leadership status
-            existing_leadership = await conn.fetchrow("SELECT role_id, role_id_2 FROM union_leaders WHERE user_id = $1", int(discord_id))
-            
-            # Determine which IGN slot this IGN belongs to
-            user_data = await conn.fetchrow(
-                "SELECT ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE discord_id = $1",
-                discord_id
-            )
-            
-            if not user_data:
+            # Registration check, leadership check and both inserts in one statement
+            username = user_display.split('(')[0].strip() if '(' in user_display else f"User_{discord_id}"
+            in_server = self.bot.member_directory.may_contain(interaction.guild.id, discord_id)
+            remove = []
+            async with transaction() as conn:
+                result = await appoint_leader(conn, discord_id, slot, role.id, username)
+                if result['appointed'] and in_server:
+                    previous_union = result['previous_union']
+                    # Moving from another union takes its role away, unless the other IGN is still in it
+                    if previous_union and previous_union != role.id and result['other'] != previous_union:
+                        remove = [previous_union]
+                    await self.bot.role_queue.enqueue(
+                        conn, interaction.guild.id, discord_id, add=[role.id], remove=remove,
+                        reason=f"Appointed as union leader by {interaction.user}"
+                    )
+
+            if not result['registered']:
+                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+
+            current_role = result['current_role']
+            if current_role == role.id:
+                # Already leading this union with this IGN
                 await interaction.response.send_message(
-                    f"❌ User with IGN **{ign}** not found in database. They must register their IGN first.",
+                    f"❌ **{ign}** is already the leader of **{role.name}**",
                     ephemeral=not visible
                 )
                 return
-            
-            is_primary_ign = (user_data['ign_primary'] == ign)
-            is_secondary_ign = (user_data['ign_secondary'] == ign)
-            
-            if not is_primary_ign and not is_secondary_ign:
+            if not result['appointed']:
+                # This IGN already leads another union
+                existing_role = interaction.guild.get_role(current_role) if current_role else None
+                existing_role_name = existing_role.name if existing_role else f"Role ID: {current_role}"
                 await interaction.response.send_message(
-                    f"❌ IGN **{ign}** is not registered for this Discord user.",
+                    f"❌ **{ign}** ({ign_type} IGN) is already leading **{existing_role_name}**. "
+                    f"Use `/dismiss_union_leader` first to transfer leadership.",
                     ephemeral=not visible
                 )
                 return
-            
-            ign_type = "Primary" if is_primary_ign else "Secondary"
-            
-            if existing_leadership:
-                current_role_primary = existing_leadership['role_id']
-                current_role_secondary = existing_leadership['role_id_2']
-                
-                # Check if this IGN is already leading another union
-                if is_primary_ign and current_role_primary and current_role_primary != role.id:
-                    # Primary IGN already leads another union
-                    existing_role = interaction.guild.get_role(current_role_primary)
-                    existing_role_name = existing_role.name if existing_role else f"Role ID: {current_role_primary}"
-                    await interaction.response.send_message(
-                        f"❌ **{ign}** (Primary IGN) is already leading **{existing_role_name}**. "
-                        f"Use `/dismiss_union_leader` first to transfer leadership.",
-                        ephemeral=not visible
-                    )
-                    return
-                elif is_secondary_ign and current_role_secondary and current_role_secondary != role.id:
-                    # Secondary IGN already leads another union
-                    existing_role = interaction.guild.get_role(current_role_secondary)
-                    existing_role_name = existing_role.name if existing_role else f"Role ID: {current_role_secondary}"
-                    await interaction.response.send_message(
-                        f"❌ **{ign}** (Secondary IGN) is already leading **{existing_role_name}**. "
-                        f"Use `/dismiss_union_leader` first to transfer leadership.",
-                        ephemeral=not visible
-                    )
-                    return
-                elif (is_primary_ign and current_role_primary == role.id) or (is_secondary_ign and current_role_secondary == role.id):
-                    # Already leading this union with this IGN
-                    await interaction.response.send_message(
-                        f"❌ **{ign}** is already the leader of **{role.name}**",
-                        ephemeral=not visible
-                    )
-                    return
-                
-                # Update existing leadership record
-                if is_primary_ign:
-                    await conn.execute("UPDATE union_leaders SET role_id = $1 WHERE user_id = $2", role.id, int(discord_id))
-                else:
-                    await conn.execute("UPDATE union_leaders SET role_id_2 = $1 WHERE user_id = $2", role.id, int(discord_id))
-            else:
-                # Create new leadership record
-                if is_primary_ign:
-                    await conn.execute("INSERT INTO union_leaders (user_id, role_id, role_id_2) VALUES ($1, $2, NULL)", int(discord_id), role.id)
-                else:
-                    await conn.execute("INSERT INTO union_leaders (user_id, role_id, role_id_2) VALUES ($1, NULL, $2)", int(discord_id), role.id)
-
-            # Properly add them as a member using the correct IGN slot
-            if is_primary_ign:
-                # Primary IGN appointment - update union_name
-                await conn.execute("""
-                    INSERT INTO users (discord_id, username, ign_primary, ign_secondary, union_name, union_name_2)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    ON CONFLICT (discord_id) DO UPDATE SET 
-                        union_name = EXCLUDED.union_name,
-                        username = EXCLUDED.username
-                """, discord_id, 
-                     user_display.split('(')[0].strip() if '(' in user_display else f"User_{discord_id}",
-                     user_data['ign_primary'], 
-                     user_data['ign_secondary'], 
-                     str(role.id),
-                     user_data['union_name_2'])
+            self.bot.lookup_cache.set_leader(discord_id, slot, role.id)
+
+            transfer_message = ""
+            previous_union = result['previous_union']
+            if previous_union and previous_union != role.id:
+                previous_role = interaction.guild.get_role(previous_union)
+                previous_name = previous_role.name if previous_role else f"Role ID: {previous_union}"
+                transfer_message = f" (moved from **{previous_name}**)"
+
+            if in_server and remove:
+                removed_role = interaction.guild.get_role(remove[0])
+                removed_name = removed_role.name if removed_role else f"Role ID: {remove[0]}"
+                role_status = f" (removing **@{removed_name}** and assigning **@{role.name}** Discord roles queued)"
+            elif in_server:
+                role_status = f" (assigning **@{role.name}** Discord role queued)"
             else:
-                # Secondary IGN appointment - update union_name_2
-                await conn.execute("""
-                    INSERT INTO users (discord_id, username, ign_primary, ign_secondary, union_name, union_name_2)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    ON CONFLICT (discord_id) DO UPDATE SET 
-                        union_name_2 = EXCLUDED.union_name_2,
-                        username = EXCLUDED.username
-                """, discord_id, 
-                     user_display.split('(')[0].strip() if '(' in user_display else f"User_{discord_id}",
-                     user_data['ign_primary'], 
-                     user_data['ign_secondary'], 
-                     user_data['union_name'],
-                     str(role.id))
-
-            # Also assign the Discord role
-            try:
-                member = interaction.guild.get_member(int(discord_id))
-                if member:
-                    await member.add_roles(role, reason=f"Appointed as union leader by {interaction.user}")
-                    role_status = f" and assigned **@{role.name}** Discord role"
-                else:
-                    role_status = " (Discord role not assigned - user not in server)"
-            except Exception as role_error:
-                role_status = f" (Discord role assignment failed: {str(role_error)})"
+                role_status = " (Discord role not assigned - user not in server)"
 
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) appointed as leader of **{role.name}** and automatically added as a member using {ign_type} IGN{role_status}", 
+                f"✅ **{ign}** ({user_display}) appointed as leader of **{role.name}** and automatically added as a member using {ign_type} IGN{transfer_message}{role_status}",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error appointing union leader: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="dismiss_union_leader", description="Dismiss a union leader by IGN (Admin only)")
     @app_commands.describe(ign="In-game name of the leader to dismiss", role="Union role to dismiss leader from", visible="Make this message visible to everyone (default: False)")
@@ -231,81 +190,155 @@ class UnionManagement(commands.Cog):
             await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
             return
 
-        # Find Discord user by IGN
-        discord_id = await self.find_user_by_ign(ign)
-        if not discord_id:
+        # Find Discord user and IGN slot by IGN
+        found = await self.find_user_by_ign(ign)
+        if not found:
             await interaction.response.send_message(
-                f"❌ No Discord user found with IGN **{ign}**.", 
+                f"❌ No Discord user found with IGN **{ign}**.",
                 ephemeral=not visible
             )
             return
+        discord_id, slot = found
 
-        conn = await get_connection()
         try:
-            # Check current leadership status
-            current_leadership = await conn.fetchrow("SELECT role_id, role_id_2 FROM union_leaders WHERE user_id = $1", int(discord_id))
-            
-            if not current_leadership:
+            # Check if this IGN is actually leading this role
+            leadership = await self.bot.lookup_cache.leadership(discord_id)
+            current_role = leadership.get(slot)
+
+            if not leadership:
                 await interaction.response.send_message(f"❌ No leadership found for IGN **{ign}**", ephemeral=not visible)
                 return
-            
-            # Determine which IGN slot this IGN belongs to
-            user_data = await conn.fetchrow(
-                "SELECT ign_primary, ign_secondary FROM users WHERE discord_id = $1",
-                discord_id
-            )
-            
-            if not user_data:
-                await interaction.response.send_message(f"❌ User data not found for IGN **{ign}**", ephemeral=not visible)
+
+            if current_role != role.id:
+                await interaction.response.send_message(
+                    f"❌ **{ign}** ({SLOT_NAMES[slot]} IGN) is not the leader of **{role.name}**",
+                    ephemeral=not visible
+                )
                 return
-            
-            is_primary_ign = (user_data['ign_primary'] == ign)
-            is_secondary_ign = (user_data['ign_secondary'] == ign)
-            
-            if not is_primary_ign and not is_secondary_ign:
-                await interaction.response.send_message(f"❌ IGN **{ign}** is not registered for this user", ephemeral=not visible)
+
+            # Remove leadership for this IGN slot
+            async with acquire() as conn:
+                removed = await dismiss_leader(conn, discord_id, slot, role.id)
+                if not removed:
+                    # Changed by another writer since the cache check
+                    await self.bot.lookup_cache.refresh_user(conn, discord_id)
+            if not removed:
+                await interaction.response.send_message(f"❌ No leadership found for IGN **{ign}**", ephemeral=not visible)
                 return
-            
-            # Check if this IGN is actually leading this role
-            if is_primary_ign:
-                if current_leadership['role_id'] != role.id:
-                    await interaction.response.send_message(
-                        f"❌ **{ign}** (Primary IGN) is not the leader of **{role.name}**", 
-                        ephemeral=not visible
-                    )
-                    return
-                # Remove primary leadership
-                await conn.execute("UPDATE union_leaders SET role_id = NULL WHERE user_id = $1", int(discord_id))
-            else:
-                if current_leadership['role_id_2'] != role.id:
-                    await interaction.response.send_message(
-                        f"❌ **{ign}** (Secondary IGN) is not the leader of **{role.name}**", 
-                        ephemeral=not visible
-                    )
-                    return
-                # Remove secondary leadership
-                await conn.execute("UPDATE union_leaders SET role_id_2 = NULL WHERE user_id = $1", int(discord_id))
-            
-            # Clean up record if both leadership slots are now NULL
-            updated_leadership = await conn.fetchrow("SELECT role_id, role_id_2 FROM union_leaders WHERE user_id = $1", int(discord_id))
-            if updated_leadership and not updated_leadership['role_id'] and not updated_leadership['role_id_2']:
-                await conn.execute("DELETE FROM union_leaders WHERE user_id = $1", int(discord_id))
-            
+            self.bot.lookup_cache.remove_leader(discord_id, slot)
+
             # Get user display for response
             try:
-                discord_user = await self.bot.fetch_user(int(discord_id))
+                discord_user = await self.bot.user_cache.fetch(discord_id)
                 user_display = f"{discord_user.mention} ({discord_user.name})"
             except:
                 user_display = f"User ID: {discord_id}"
-            
+
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) dismissed as leader of **{role.name}**", 
+                f"✅ **{ign}** ({user_display}) dismissed as leader of **{role.name}**",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error dismissing union leader: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
+
+    # ---- role drift ---------------------------------------------------------
+
+    @commands.Cog.listener()
+    async def on_directory_member_update(self, guild_id, member_id, before_roles, after_roles):
+        """Re-check one member's union roles whenever their union roles change"""
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return
+        try:
+            union_roles = await self.bot.union_roles.get(guild)
+            if not (before_roles ^ after_roles) & union_roles:
+                return
+            async with acquire() as conn:
+                missing, extra = await member_drift(conn, guild, member_id, after_roles, union_roles)
+            drift = self.role_drift.setdefault(guild_id, RoleDrift())
+            drift.set_member(member_id, missing, extra)
+            if missing or extra:
+                logger.info(f"Role drift for {member_id} in {guild.name}: missing {sorted(missing)}, extra {sorted(extra)}")
+        except Exception as e:
+            logger.error(f"Role drift check failed for {member_id}: {e}")
+
+    def format_drift_members(self, member_ids, limit=10):
+        mentions = [f"<@{member_id}>" for member_id in sorted(member_ids)[:limit]]
+        if len(member_ids) > limit:
+            mentions.append(f"... and {len(member_ids) - limit} more")
+        return " ".join(mentions)
+
+    @app_commands.command(name="role_drift", description="Compare union roles in Discord with the database (Admin only)")
+    @app_commands.describe(
+        full="Re-scan every union role instead of showing drift seen since the last scan (default: False)",
+        fix="Queue role changes that make Discord match the database (default: False)",
+        visible="Make this message visible to everyone (default: False)"
+    )
+    async def role_drift_command(self, interaction: discord.Interaction, full: bool = False, fix: bool = False, visible: bool = False):
+        if not self.has_admin_role(interaction.user):
+            await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
+            return
+
+        await interaction.response.defer(ephemeral=not visible)
+        guild = interaction.guild
+
+        try:
+            if full:
+                if not self.bot.member_directory.is_ready(guild.id):
+                    await interaction.followup.send("❌ Member list is still loading - try again in a minute.", ephemeral=not visible)
+                    return
+                async with acquire() as conn:
+                    self.role_drift[guild.id] = await full_drift(conn, guild, self.bot.member_directory.get(guild.id))
+            drift = self.role_drift.get(guild.id, RoleDrift())
+
+            if not drift:
+                if drift.complete:
+                    await interaction.followup.send("✅ Discord union roles match the database", ephemeral=not visible)
+                else:
+                    await interaction.followup.send(
+                        "✅ No role drift seen since startup. Use `/role_drift full:True` for a complete scan.",
+                        ephemeral=not visible
+                    )
+                return
+
+            embed = discord.Embed(
+                title="🧭 **UNION ROLE DRIFT**",
+                description=f"*{drift.total} difference(s) between Discord roles and union memberships*",
+                color=0xFFA500
+            )
+            for role_id in sorted(set(drift.missing) | set(drift.extra)):
+                missing, extra = drift.missing.get(role_id, set()), drift.extra.get(role_id, set())
+                if not missing and not extra:
+                    continue
+                role = guild.get_role(role_id)
+                value = ""
+                if missing:
+                    value += f"**Missing role ({len(missing)}):** {self.format_drift_members(missing)}\n"
+                if extra:
+                    value += f"**Not in union ({len(extra)}):** {self.format_drift_members(extra)}"
+                embed.add_field(name=f"🏛️ {role.name if role else f'Role ID: {role_id}'}", value=value[:1024], inline=False)
+                if len(embed.fields) >= 24:
+                    break
+
+            if fix:
+                changes = drift.by_member()
+                async with acquire() as conn:
+                    await self.bot.role_queue.enqueue_many(
+                        conn, guild.id,
+                        [(member_id, add, remove) for member_id, (add, remove) in changes.items()],
+                        reason=f"Union role drift fix by {interaction.user}"
+                    )
+                # Members are re-checked as the queued edits arrive
+                self.role_drift.pop(guild.id, None)
+                embed.set_footer(text=f"Queued role changes for {len(changes)} member(s)")
+            else:
+                embed.set_footer(text="Use /role_drift fix:True to queue the fixes")
+
+            await interaction.followup.send(embed=embed, ephemeral=not visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.followup.send(f"❌ Error checking role drift: {str(e)}", ephemeral=not visible)
 
 async def setup(bot):
     await bot.add_cog(UnionManagement(bot))
@@ -1,7 +1,15 @@
+import csv
+import io
+import re
 import discord
 from discord.ext import commands
 from discord import app_commands
-from utils.db import get_connection
+from utils.db import acquire, transaction
+from utils.roster import SLOT_NAMES
+from utils.union_ops import join_union, leave_union
+
+# Most IGNs one bulk command accepts
+BULK_LIMIT = 100
 
 class UnionMembership(commands.Cog):
     def __init__(self, bot):
@@ -13,15 +21,43 @@ class UnionMembership(commands.Cog):
         return any(role.name.lower() in admin_roles for role in member.roles)
 
     async def get_user_led_union(self, user_id):
-        """Get the union role_id this user leads (checks both leadership slots)"""
-        conn = await get_connection()
+        """Get the union role_id this user leads (primary leadership slot first)"""
+        return await self.bot.lookup_cache.led_union(user_id)
+
+    def role_name(self, guild, role_id):
+        role = guild.get_role(role_id)
+        return role.name if role else f"Role ID: {role_id}"
+
+    async def user_display(self, discord_id):
         try:
-            row = await conn.fetchrow("SELECT role_id, role_id_2 FROM union_leaders WHERE user_id = $1", int(user_id))
-            if row:
-                return int(row['role_id']) if row['role_id'] else (int(row['role_id_2']) if row['role_id_2'] else None)
-            return None
-        finally:
-            await conn.close()
+            discord_user = await self.bot.user_cache.fetch(discord_id)
+            return f"{discord_user.mention} ({discord_user.name})"
+        except:
+            return f"User ID: {discord_id}"
+
+    async def queue_join_roles(self, conn, guild, discord_id, role_id, result, reason):
+        """Queue the Discord role changes for a join_union() result; returns the status text for the reply"""
+        if not self.bot.member_directory.may_contain(guild.id, discord_id):
+            return " (Discord roles not changed - user not in server)"
+
+        previous = result['previous']
+        # Keep the old union's role if the user's other IGN is still in it
+        remove = [previous] if previous and result['other'] != previous else []
+        await self.bot.role_queue.enqueue(conn, guild.id, discord_id, add=[role_id], remove=remove, reason=reason)
+
+        role_changes = [f"removing **@{self.role_name(guild, old)}**" for old in remove]
+        role_changes.append(f"assigning **@{self.role_name(guild, role_id)}**")
+        return f" ({' and '.join(role_changes)} Discord role{'s' if len(role_changes) > 1 else ''} queued)"
+
+    async def queue_leave_roles(self, conn, guild, discord_id, role_id, result, reason):
+        """Queue the Discord role removal for a leave_union() result; returns the status text for the reply"""
+        if not self.bot.member_directory.may_contain(guild.id, discord_id):
+            return " (Discord role not removed - user not in server)"
+        if result['other'] == role_id:
+            return " (Discord role kept - other IGN still in union)"
+
+        await self.bot.role_queue.enqueue(conn, guild.id, discord_id, remove=[role_id], reason=reason)
+        return f" (removal of **@{self.role_name(guild, role_id)}** Discord role queued)"
 
     @app_commands.command(name="add_user_to_union", description="Add user to YOUR union by IGN (auto-detects your union, transfers if already in another)")
     @app_commands.describe(ign="In-game name of the user to add", visible="Make this message visible to everyone (default: False)")
@@ -31,88 +67,49 @@ class UnionMembership(commands.Cog):
             await interaction.response.send_message("❌ You are not assigned as a union leader.", ephemeral=not visible)
             return
 
-        led_union_role = interaction.guild.get_role(led_union_id)
-        led_union_name = led_union_role.name if led_union_role else f"Role ID: {led_union_id}"
+        led_union_name = self.role_name(interaction.guild, led_union_id)
 
-        conn = await get_connection()
         try:
-            row = await conn.fetchrow(
-                "SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE ign_primary = $1 OR ign_secondary = $1", 
-                ign
-            )
-            
-            if not row:
+            found = await self.bot.lookup_cache.find_ign(ign)
+
+            if not found:
                 await interaction.response.send_message(
-                    f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first.", 
+                    f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first.",
                     ephemeral=not visible
                 )
                 return
 
-            is_primary_ign = (row['ign_primary'] == ign)
-            ign_type = "Primary" if is_primary_ign else "Secondary"
-            current_union = row['union_name'] if is_primary_ign else row['union_name_2']
-            
-            if str(current_union) == str(led_union_id):
+            discord_id, slot = found
+            ign_type = SLOT_NAMES[slot]
+
+            # Membership change and its role changes commit together
+            async with transaction() as conn:
+                result = await join_union(conn, discord_id, slot, led_union_id)
+                if result['changed']:
+                    role_status = await self.queue_join_roles(
+                        conn, interaction.guild, discord_id, led_union_id, result,
+                        reason=f"Added to union via leader command by {interaction.user}"
+                    )
+
+            if not result['changed']:
                 await interaction.response.send_message(
-                    f"❌ **{ign}** is already in your union **{led_union_name}**", 
+                    f"❌ **{ign}** is already in your union **{led_union_name}**",
                     ephemeral=not visible
                 )
                 return
 
             transfer_message = ""
-            old_role_to_remove = None
-            if current_union:
-                try:
-                    old_role_id = int(current_union)
-                    old_role = interaction.guild.get_role(old_role_id)
-                    old_union_name = old_role.name if old_role else f"Role ID: {old_role_id}"
-                    transfer_message = f" (transferred from **{old_union_name}**)"
-                    old_role_to_remove = old_role
-                except:
-                    old_union_name = current_union
-                    transfer_message = f" (transferred from **{old_union_name}**)"
-
-            if is_primary_ign:
-                await conn.execute("UPDATE users SET union_name = $1 WHERE discord_id = $2", str(led_union_id), row['discord_id'])
-            else:
-                await conn.execute("UPDATE users SET union_name_2 = $1 WHERE discord_id = $2", str(led_union_id), row['discord_id'])
-
-            try:
-                discord_user = await self.bot.fetch_user(int(row['discord_id']))
-                user_display = f"{discord_user.mention} ({discord_user.name})"
-                
-                try:
-                    member = interaction.guild.get_member(int(row['discord_id']))
-                    if member:
-                        role_changes = []
-                        
-                        if old_role_to_remove:
-                            other_union = row['union_name_2'] if is_primary_ign else row['union_name']
-                            if str(other_union) != str(old_role_to_remove.id):
-                                await member.remove_roles(old_role_to_remove, reason=f"Transferred from union via leader command by {interaction.user}")
-                                role_changes.append(f"removed **@{old_role_to_remove.name}**")
-                        
-                        await member.add_roles(led_union_role, reason=f"Added to union via leader command by {interaction.user}")
-                        role_changes.append(f"assigned **@{led_union_name}**")
-                        
-                        role_status = f" and {' and '.join(role_changes)} Discord role{'s' if len(role_changes) > 1 else ''}"
-                    else:
-                        role_status = " (Discord roles not changed - user not in server)"
-                except Exception as role_error:
-                    role_status = f" (Discord role management failed: {str(role_error)})"
-                    
-            except:
-                user_display = f"User ID: {row['discord_id']}"
-                role_status = " (Discord roles not changed - user not found)"
+            if result['previous']:
+                transfer_message = f" (transferred from **{self.role_name(interaction.guild, result['previous'])}**)"
 
+            user_display = await self.user_display(discord_id)
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) added to your union **{led_union_name}** using {ign_type} IGN{transfer_message}{role_status}", 
+                f"✅ **{ign}** ({user_display}) added to your union **{led_union_name}** using {ign_type} IGN{transfer_message}{role_status}",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error adding user to union: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="remove_user_from_union", description="Remove user from YOUR union by IGN")
     @app_commands.describe(ign="In-game name of the user to remove", visible="Make this message visible to everyone (default: False)")
@@ -122,66 +119,41 @@ class UnionMembership(commands.Cog):
             await interaction.response.send_message("❌ You are not assigned as a union leader.", ephemeral=not visible)
             return
 
-        led_union_role = interaction.guild.get_role(led_union_id)
-        led_union_name = led_union_role.name if led_union_role else f"Role ID: {led_union_id}"
+        led_union_name = self.role_name(interaction.guild, led_union_id)
 
-        conn = await get_connection()
         try:
-            row = await conn.fetchrow(
-                "SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE ign_primary = $1 OR ign_secondary = $1", 
-                ign
-            )
-            
-            if not row:
+            found = await self.bot.lookup_cache.find_ign(ign)
+
+            if not found:
                 await interaction.response.send_message(f"❌ No user with IGN **{ign}** found", ephemeral=not visible)
                 return
 
-            is_primary_ign = (row['ign_primary'] == ign)
-            current_union = row['union_name'] if is_primary_ign else row['union_name_2']
-            ign_type = "Primary" if is_primary_ign else "Secondary"
-            
-            if str(current_union) != str(led_union_id):
+            discord_id, slot = found
+            ign_type = SLOT_NAMES[slot]
+
+            async with transaction() as conn:
+                result = await leave_union(conn, discord_id, slot, led_union_id)
+                if result['removed']:
+                    role_status = await self.queue_leave_roles(
+                        conn, interaction.guild, discord_id, led_union_id, result,
+                        reason=f"Removed from union via leader command by {interaction.user}"
+                    )
+
+            if not result['removed']:
                 await interaction.response.send_message(
-                    f"❌ **{ign}** is not in your union **{led_union_name}** (checked {ign_type} IGN slot)", 
+                    f"❌ **{ign}** is not in your union **{led_union_name}** (checked {ign_type} IGN slot)",
                     ephemeral=not visible
                 )
                 return
 
-            if is_primary_ign:
-                await conn.execute("UPDATE users SET union_name = NULL WHERE discord_id = $1", row['discord_id'])
-            else:
-                await conn.execute("UPDATE users SET union_name_2 = NULL WHERE discord_id = $1", row['discord_id'])
-
-            try:
-                discord_user = await self.bot.fetch_user(int(row['discord_id']))
-                user_display = f"{discord_user.mention} ({discord_user.name})"
-                
-                try:
-                    member = interaction.guild.get_member(int(row['discord_id']))
-                    if member:
-                        other_union = row['union_name_2'] if is_primary_ign else row['union_name']
-                        if str(other_union) == str(led_union_id):
-                            role_status = " (Discord role kept - other IGN still in union)"
-                        else:
-                            await member.remove_roles(led_union_role, reason=f"Removed from union via leader command by {interaction.user}")
-                            role_status = f" and removed **@{led_union_name}** Discord role"
-                    else:
-                        role_status = " (Discord role not removed - user not in server)"
-                except Exception as role_error:
-                    role_status = f" (Discord role removal failed: {str(role_error)})"
-                    
-            except:
-                user_display = f"User ID: {row['discord_id']}"
-                role_status = " (Discord role not removed - user not found)"
-
+            user_display = await self.user_display(discord_id)
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) removed from your union **{led_union_name}** ({ign_type} IGN slot){role_status}", 
+                f"✅ **{ign}** ({user_display}) removed from your union **{led_union_name}** ({ign_type} IGN slot){role_status}",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error removing user from union: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="admin_add_user_to_union", description="Add user to ANY union by IGN (Admin override, auto-transfers)")
     @app_commands.describe(ign="In-game name of the user to add", role="Union role to add them to", visible="Make this message visible to everyone (default: False)")
@@ -190,87 +162,47 @@ class UnionMembership(commands.Cog):
             await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
             return
 
-        conn = await get_connection()
         try:
-            role_check = await conn.fetchrow("SELECT role_id FROM union_roles WHERE role_id = $1", role.id)
-            if not role_check:
-                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
-                return
+            found = await self.bot.lookup_cache.find_ign(ign)
 
-            user_row = await conn.fetchrow(
-                "SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE ign_primary = $1 OR ign_secondary = $1", 
-                ign
-            )
-            
-            if not user_row:
+            if not found:
                 await interaction.response.send_message(
-                    f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first.", 
+                    f"❌ No Discord user found with IGN **{ign}**. They must register their IGN first.",
                     ephemeral=not visible
                 )
                 return
 
-            is_primary_ign = (user_row['ign_primary'] == ign)
-            ign_type = "Primary" if is_primary_ign else "Secondary"
-            current_union = user_row['union_name'] if is_primary_ign else user_row['union_name_2']
-            
-            if str(current_union) == str(role.id):
+            discord_id, slot = found
+            ign_type = SLOT_NAMES[slot]
+
+            async with transaction() as conn:
+                result = await join_union(conn, discord_id, slot, role.id, require_registered=True)
+                if result['changed']:
+                    role_status = await self.queue_join_roles(
+                        conn, interaction.guild, discord_id, role.id, result,
+                        reason=f"Added to union via admin command by {interaction.user}"
+                    )
+
+            if not result['registered']:
+                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+
+            if not result['changed']:
                 await interaction.response.send_message(f"❌ **{ign}** is already in union **{role.name}**", ephemeral=not visible)
                 return
 
             transfer_message = ""
-            old_role_to_remove = None
-            if current_union:
-                try:
-                    old_role_id = int(current_union)
-                    old_role = interaction.guild.get_role(old_role_id)
-                    old_union_name = old_role.name if old_role else f"Role ID: {current_union}"
-                    transfer_message = f" (transferred from **{old_union_name}**)"
-                    old_role_to_remove = old_role
-                except:
-                    old_union_name = current_union
-                    transfer_message = f" (transferred from **{old_union_name}**)"
-
-            if is_primary_ign:
-                await conn.execute("UPDATE users SET union_name = $1 WHERE discord_id = $2", str(role.id), user_row['discord_id'])
-            else:
-                await conn.execute("UPDATE users SET union_name_2 = $1 WHERE discord_id = $2", str(role.id), user_row['discord_id'])
-
-            try:
-                discord_user = await self.bot.fetch_user(int(user_row['discord_id']))
-                user_display = f"{discord_user.mention} ({discord_user.name})"
-                
-                try:
-                    member = interaction.guild.get_member(int(user_row['discord_id']))
-                    if member:
-                        role_changes = []
-                        
-                        if old_role_to_remove:
-                            other_union = user_row['union_name_2'] if is_primary_ign else user_row['union_name']
-                            if str(other_union) != str(old_role_to_remove.id):
-                                await member.remove_roles(old_role_to_remove, reason=f"Transferred from union via admin command by {interaction.user}")
-                                role_changes.append(f"removed **@{old_role_to_remove.name}**")
-                        
-                        await member.add_roles(role, reason=f"Added to union via admin command by {interaction.user}")
-                        role_changes.append(f"assigned **@{role.name}**")
-                        
-                        role_status = f" and {' and '.join(role_changes)} Discord role{'s' if len(role_changes) > 1 else ''}"
-                    else:
-                        role_status = " (Discord roles not changed - user not in server)"
-                except Exception as role_error:
-                    role_status = f" (Discord role management failed: {str(role_error)})"
-                    
-            except:
-                user_display = f"User ID: {user_row['discord_id']}"
-                role_status = " (Discord roles not changed - user not found)"
+            if result['previous']:
+                transfer_message = f" (transferred from **{self.role_name(interaction.guild, result['previous'])}**)"
 
+            user_display = await self.user_display(discord_id)
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) added to union **{role.name}** using {ign_type} IGN{transfer_message}{role_status} (Admin override)", 
+                f"✅ **{ign}** ({user_display}) added to union **{role.name}** using {ign_type} IGN{transfer_message}{role_status} (Admin override)",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error adding user to union: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
 
     @app_commands.command(name="admin_remove_user_from_union", description="Remove user from specified union by IGN (Admin override)")
     @app_commands.describe(ign="In-game name to remove", role="Union role to remove them from", visible="Make this message visible to everyone (default: False)")
@@ -279,76 +211,199 @@ class UnionMembership(commands.Cog):
             await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
             return
 
-        conn = await get_connection()
         try:
-            role_check = await conn.fetchrow("SELECT role_id FROM union_roles WHERE role_id = $1", role.id)
-            if not role_check:
-                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
-                return
+            found = await self.bot.lookup_cache.find_ign(ign)
 
-            row = await conn.fetchrow(
-                "SELECT discord_id, ign_primary, ign_secondary, union_name, union_name_2 FROM users WHERE ign_primary = $1 OR ign_secondary = $1", 
-                ign
-            )
-            
-            if not row:
+            if not found:
                 await interaction.response.send_message(f"❌ No user found with IGN **{ign}**", ephemeral=not visible)
                 return
 
-            is_primary_ign = (row['ign_primary'] == ign)
-            current_union = row['union_name'] if is_primary_ign else row['union_name_2']
-            ign_type = "Primary" if is_primary_ign else "Secondary"
-            
-            if str(current_union) != str(role.id):
+            discord_id, slot = found
+            ign_type = SLOT_NAMES[slot]
+
+            async with transaction() as conn:
+                result = await leave_union(conn, discord_id, slot, role.id, require_registered=True)
+                if result['removed']:
+                    role_status = await self.queue_leave_roles(
+                        conn, interaction.guild, discord_id, role.id, result,
+                        reason=f"Removed from union via admin command by {interaction.user}"
+                    )
+            current_union = result['previous']
+
+            if not result['registered']:
+                await interaction.response.send_message(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+
+            if not result['removed']:
                 if current_union:
-                    try:
-                        actual_role = interaction.guild.get_role(int(current_union))
-                        actual_union_name = actual_role.name if actual_role else f"Role ID: {current_union}"
-                        await interaction.response.send_message(
-                            f"❌ **{ign}** ({ign_type} IGN) is not in **{role.name}**.\nThey are currently in: **{actual_union_name}**", 
-                            ephemeral=not visible
-                        )
-                    except:
-                        await interaction.response.send_message(f"❌ **{ign}** ({ign_type} IGN) is not in **{role.name}**", ephemeral=not visible)
+                    await interaction.response.send_message(
+                        f"❌ **{ign}** ({ign_type} IGN) is not in **{role.name}**.\nThey are currently in: **{self.role_name(interaction.guild, current_union)}**",
+                        ephemeral=not visible
+                    )
                 else:
                     await interaction.response.send_message(f"❌ **{ign}** ({ign_type} IGN) is not in any union", ephemeral=not visible)
                 return
 
-            if is_primary_ign:
-                await conn.execute("UPDATE users SET union_name = NULL WHERE discord_id = $1", row['discord_id'])
-            else:
-                await conn.execute("UPDATE users SET union_name_2 = NULL WHERE discord_id = $1", row['discord_id'])
-
-            try:
-                discord_user = await self.bot.fetch_user(int(row['discord_id']))
-                user_display = f"{discord_user.mention} ({discord_user.name})"
-                
-                try:
-                    member = interaction.guild.get_member(int(row['discord_id']))
-                    if member:
-                        other_union = row['union_name_2'] if is_primary_ign else row['union_name']
-                        if str(other_union) == str(role.id):
-                            role_status = " (Discord role kept - other IGN still in union)"
-                        else:
-                            await member.remove_roles(role, reason=f"Removed from union via admin command by {interaction.user}")
-                            role_status = f" and removed **@{role.name}** Discord role"
-                    else:
-                        role_status = " (Discord role not removed - user not in server)"
-                except Exception as role_error:
-                    role_status = f" (Discord role removal failed: {str(role_error)})"
-                    
-            except:
-                user_display = f"User ID: {row['discord_id']}"
-                role_status = " (Discord role not removed - user not found)"
-
+            user_display = await self.user_display(discord_id)
             await interaction.response.send_message(
-                f"✅ **{ign}** ({user_display}) removed from union **{role.name}** ({ign_type} IGN slot){role_status} (Admin override)", 
+                f"✅ **{ign}** ({user_display}) removed from union **{role.name}** ({ign_type} IGN slot){role_status} (Admin override)",
                 ephemeral=not visible
             )
         except Exception as e:
+            self.bot.metrics.mark_failed()
             await interaction.response.send_message(f"❌ Error removing user from union: {str(e)}", ephemeral=not visible)
-        finally:
-            await conn.close()
+
+    # ---- bulk commands ------------------------------------------------------
+
+    async def read_ign_list(self, igns, csv_file):
+        """IGNs from a comma / newline separated string and/or the first column of a CSV attachment"""
+        names = [name.strip() for name in re.split(r"[,\n]", igns or "")]
+        if csv_file is not None:
+            text = (await csv_file.read()).decode("utf-8-sig", errors="replace")
+            for row in csv.reader(io.StringIO(text)):
+                if row and row[0].strip().lower() not in ("ign", "igns"):
+                    names.append(row[0].strip())
+        return list(dict.fromkeys(name for name in names if name))
+
+    async def run_bulk(self, interaction, role_id, igns, csv_file, adding, admin, visible):
+        """Apply a bulk add / remove: one IGN lookup, one transaction, one role queue insert"""
+        guild = interaction.guild
+        names = await self.read_ign_list(igns, csv_file)
+        if not names:
+            await interaction.followup.send("❌ No IGNs given - pass a comma-separated list or attach a CSV file.", ephemeral=not visible)
+            return
+        if len(names) > BULK_LIMIT:
+            await interaction.followup.send(f"❌ Too many IGNs ({len(names)}) - the limit is {BULK_LIMIT} per command.", ephemeral=not visible)
+            return
+
+        union_name = self.role_name(guild, role_id)
+        source = "admin" if admin else "leader"
+        reason = f"Bulk {'added to' if adding else 'removed from'} union via {source} command by {interaction.user}"
+        found = await self.bot.lookup_cache.find_igns(names)
+
+        outcomes = []
+        role_changes = {}
+        applied = 0
+        async with transaction() as conn:
+            for ign in names:
+                if ign not in found:
+                    outcomes.append(f"❌ **{ign}** - no registered user")
+                    continue
+                discord_id, slot = found[ign]
+
+                if adding:
+                    result = await join_union(conn, discord_id, slot, role_id)
+                    if not result['changed']:
+                        outcomes.append(f"➖ **{ign}** - already in {union_name}")
+                        continue
+                    add, remove = {role_id}, set()
+                    previous = result['previous']
+                    if previous and result['other'] != previous:
+                        remove.add(previous)
+                    transfer = f" (transferred from {self.role_name(guild, previous)})" if previous else ""
+                    outcomes.append(f"✅ **{ign}** - added{transfer}")
+                else:
+                    result = await leave_union(conn, discord_id, slot, role_id)
+                    if not result['removed']:
+                        outcomes.append(f"➖ **{ign}** - not in {union_name}")
+                        continue
+                    add, remove = set(), ({role_id} if result['other'] != role_id else set())
+                    outcomes.append(f"✅ **{ign}** - removed")
+                applied += 1
+
+                if self.bot.member_directory.may_contain(guild.id, discord_id):
+                    pending_add, pending_remove = role_changes.setdefault(discord_id, (set(), set()))
+                    # A later change in the batch overrides an earlier one for the same role
+                    pending_add.difference_update(remove)
+                    pending_remove.difference_update(add)
+                    pending_add.update(add)
+                    pending_remove.update(remove)
+
+            await self.bot.role_queue.enqueue_many(
+                conn, guild.id, [(member_id, add, remove) for member_id, (add, remove) in role_changes.items()], reason=reason
+            )
+
+        embed = discord.Embed(
+            title=f"📋 **BULK {'ADD TO' if adding else 'REMOVE FROM'} {union_name.upper()}**",
+            description="\n".join(outcomes)[:4000],
+            color=0x00FF00 if applied == len(names) else 0xFFA500
+        )
+        embed.add_field(
+            name="📊 **SUMMARY**",
+            value=f"**IGNs processed:** {len(names)}\n**Changed:** {applied}\n**Discord role updates queued:** {len(role_changes)}",
+            inline=False
+        )
+        if admin:
+            embed.set_footer(text="Admin override")
+        await interaction.followup.send(embed=embed, ephemeral=not visible)
+
+    @app_commands.command(name="bulk_add_to_union", description="Add many users to YOUR union by IGN list or CSV")
+    @app_commands.describe(igns="Comma or newline separated IGNs", csv_file="CSV file with one IGN per row (first column)", visible="Make this message visible to everyone (default: False)")
+    async def bulk_add_to_union(self, interaction: discord.Interaction, igns: str = None, csv_file: discord.Attachment = None, visible: bool = False):
+        led_union_id = await self.get_user_led_union(interaction.user.id)
+        if not led_union_id:
+            await interaction.response.send_message("❌ You are not assigned as a union leader.", ephemeral=not visible)
+            return
+
+        await interaction.response.defer(ephemeral=not visible)
+        try:
+            await self.run_bulk(interaction, led_union_id, igns, csv_file, adding=True, admin=False, visible=visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.followup.send(f"❌ Error adding users to union: {str(e)}", ephemeral=not visible)
+
+    @app_commands.command(name="bulk_remove_from_union", description="Remove many users from YOUR union by IGN list or CSV")
+    @app_commands.describe(igns="Comma or newline separated IGNs", csv_file="CSV file with one IGN per row (first column)", visible="Make this message visible to everyone (default: False)")
+    async def bulk_remove_from_union(self, interaction: discord.Interaction, igns: str = None, csv_file: discord.Attachment = None, visible: bool = False):
+        led_union_id = await self.get_user_led_union(interaction.user.id)
+        if not led_union_id:
+            await interaction.response.send_message("❌ You are not assigned as a union leader.", ephemeral=not visible)
+            return
+
+        await interaction.response.defer(ephemeral=not visible)
+        try:
+            await self.run_bulk(interaction, led_union_id, igns, csv_file, adding=False, admin=False, visible=visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.followup.send(f"❌ Error removing users from union: {str(e)}", ephemeral=not visible)
+
+    @app_commands.command(name="admin_bulk_add_to_union", description="Add many users to ANY union by IGN list or CSV (Admin override)")
+    @app_commands.describe(role="Union role to add them to", igns="Comma or newline separated IGNs", csv_file="CSV file with one IGN per row (first column)", visible="Make this message visible to everyone (default: False)")
+    async def admin_bulk_add_to_union(self, interaction: discord.Interaction, role: discord.Role, igns: str = None, csv_file: discord.Attachment = None, visible: bool = False):
+        if not self.has_admin_role(interaction.user):
+            await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
+            return
+
+        await interaction.response.defer(ephemeral=not visible)
+        try:
+            async with acquire() as conn:
+                registered = await conn.fetchval("SELECT 1 FROM union_roles WHERE role_id = $1", role.id)
+            if not registered:
+                await interaction.followup.send(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+            await self.run_bulk(interaction, role.id, igns, csv_file, adding=True, admin=True, visible=visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.followup.send(f"❌ Error adding users to union: {str(e)}", ephemeral=not visible)
+
+    @app_commands.command(name="admin_bulk_remove_from_union", description="Remove many users from ANY union by IGN list or CSV (Admin override)")
+    @app_commands.describe(role="Union role to remove them from", igns="Comma or newline separated IGNs", csv_file="CSV file with one IGN per row (first column)", visible="Make this message visible to everyone (default: False)")
+    async def admin_bulk_remove_from_union(self, interaction: discord.Interaction, role: discord.Role, igns: str = None, csv_file: discord.Attachment = None, visible: bool = False):
+        if not self.has_admin_role(interaction.user):
+            await interaction.response.send_message("❌ This command requires the @Admin or @Mod+ role.", ephemeral=not visible)
+            return
+
+        await interaction.response.defer(ephemeral=not visible)
+        try:
+            async with acquire() as conn:
+                registered = await conn.fetchval("SELECT 1 FROM union_roles WHERE role_id = $1", role.id)
+            if not registered:
+                await interaction.followup.send(f"❌ Role **{role.name}** is not registered as union", ephemeral=not visible)
+                return
+            await self.run_bulk(interaction, role.id, igns, csv_file, adding=False, admin=True, visible=visible)
+        except Exception as e:
+            self.bot.metrics.mark_failed()
+            await interaction.followup.send(f"❌ Error removing users from union: {str(e)}", ephemeral=not visible)
 
 async def setup(bot):
     await bot.add_cog(UnionMembership(bot))
@@ -0,0 +1,30 @@
+-- Baseline: the table layout the cogs actually query.
+-- Written to be safe on databases created before migrations existed.
+
+CREATE TABLE IF NOT EXISTS users (
+    discord_id    TEXT PRIMARY KEY,
+    username      TEXT,
+    ign_primary   TEXT,
+    ign_secondary TEXT,
+    union_name    TEXT,
+    union_name_2  TEXT
+);
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS username      TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS ign_primary   TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS ign_secondary TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS union_name    TEXT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS union_name_2  TEXT;
+
+CREATE TABLE IF NOT EXISTS union_roles (
+    role_id BIGINT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS union_leaders (
+    user_id   BIGINT PRIMARY KEY,
+    role_id   BIGINT,
+    role_id_2 BIGINT
+);
+
+ALTER TABLE union_leaders ADD COLUMN IF NOT EXISTS role_id   BIGINT;
+ALTER TABLE union_leaders ADD COLUMN IF NOT EXISTS role_id_2 BIGINT;
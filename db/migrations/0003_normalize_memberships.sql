@@ -0,0 +1,107 @@
+-- Normalised membership model with native BIGINT snowflakes.
+--
+--   users              one row per Discord user
+--   user_igns          one row per (user, IGN slot)      slot 1 = primary, 2 = secondary
+--   union_memberships  one row per (user, IGN slot) that belongs to a union
+--   union_leaders      one row per (user, IGN slot) that leads a union
+--
+-- Every former "col = $1 OR col_2 = $1" lookup becomes a single indexed equality.
+--
+-- Legacy values that are not snowflakes (non-numeric ids, union names instead of
+-- role ids) cannot be converted. They are copied to legacy_quarantine with the
+-- reason, so the conversion neither aborts halfway nor drops them silently, and
+-- the migration warns with the counts.
+
+CREATE TABLE legacy_quarantine (
+    id             BIGSERIAL   PRIMARY KEY,
+    source         TEXT        NOT NULL,
+    reason         TEXT        NOT NULL,
+    row_data       JSONB       NOT NULL,
+    quarantined_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Canonical decimal snowflake: no sign, no leading zero, fits in BIGINT
+CREATE OR REPLACE FUNCTION pg_temp.is_snowflake(value TEXT) RETURNS BOOLEAN AS $$
+    SELECT CASE WHEN value ~ '^[1-9][0-9]{0,18}$' THEN value::numeric <= 9223372036854775807 ELSE false END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- users.discord_id held stringified snowflakes
+INSERT INTO legacy_quarantine (source, reason, row_data)
+SELECT 'users', 'discord_id is not a snowflake', to_jsonb(u)
+FROM users u WHERE NOT pg_temp.is_snowflake(u.discord_id);
+DELETE FROM users WHERE NOT pg_temp.is_snowflake(discord_id);
+
+ALTER TABLE users ALTER COLUMN discord_id TYPE BIGINT USING discord_id::bigint;
+
+CREATE TABLE user_igns (
+    discord_id BIGINT   NOT NULL REFERENCES users (discord_id) ON DELETE CASCADE,
+    slot       SMALLINT NOT NULL CHECK (slot IN (1, 2)),
+    ign        TEXT     NOT NULL,
+    PRIMARY KEY (discord_id, slot)
+);
+CREATE INDEX idx_user_igns_ign ON user_igns (ign);
+
+CREATE TABLE union_memberships (
+    discord_id BIGINT   NOT NULL REFERENCES users (discord_id) ON DELETE CASCADE,
+    slot       SMALLINT NOT NULL CHECK (slot IN (1, 2)),
+    role_id    BIGINT   NOT NULL,
+    PRIMARY KEY (discord_id, slot)
+);
+CREATE INDEX idx_union_memberships_role_id ON union_memberships (role_id);
+
+-- Backfill from the two-column layout
+INSERT INTO user_igns (discord_id, slot, ign)
+SELECT discord_id, 1, ign_primary FROM users WHERE ign_primary IS NOT NULL
+UNION ALL
+SELECT discord_id, 2, ign_secondary FROM users WHERE ign_secondary IS NOT NULL;
+
+INSERT INTO union_memberships (discord_id, slot, role_id)
+SELECT discord_id, 1, union_name::bigint FROM users WHERE pg_temp.is_snowflake(union_name)
+UNION ALL
+SELECT discord_id, 2, union_name_2::bigint FROM users WHERE pg_temp.is_snowflake(union_name_2);
+
+-- Memberships recorded by union name (or otherwise unparseable) need a manual fix
+INSERT INTO legacy_quarantine (source, reason, row_data)
+SELECT 'users.union_name', 'union_name is not a role id',
+       jsonb_build_object('discord_id', discord_id, 'slot', 1, 'ign', ign_primary, 'union_name', union_name)
+FROM users WHERE union_name IS NOT NULL AND union_name <> '' AND NOT pg_temp.is_snowflake(union_name)
+UNION ALL
+SELECT 'users.union_name_2', 'union_name_2 is not a role id',
+       jsonb_build_object('discord_id', discord_id, 'slot', 2, 'ign', ign_secondary, 'union_name', union_name_2)
+FROM users WHERE union_name_2 IS NOT NULL AND union_name_2 <> '' AND NOT pg_temp.is_snowflake(union_name_2);
+
+ALTER TABLE users
+    DROP COLUMN ign_primary,
+    DROP COLUMN ign_secondary,
+    DROP COLUMN union_name,
+    DROP COLUMN union_name_2;
+
+-- union_leaders(user_id, role_id, role_id_2) -> one row per leading slot
+ALTER TABLE union_leaders RENAME TO union_leaders_legacy;
+
+CREATE TABLE union_leaders (
+    user_id BIGINT   NOT NULL,
+    slot    SMALLINT NOT NULL CHECK (slot IN (1, 2)),
+    role_id BIGINT   NOT NULL,
+    PRIMARY KEY (user_id, slot)
+);
+CREATE INDEX idx_union_leaders_by_role ON union_leaders (role_id);
+
+INSERT INTO union_leaders (user_id, slot, role_id)
+SELECT user_id, 1, role_id FROM union_leaders_legacy WHERE role_id IS NOT NULL
+UNION ALL
+SELECT user_id, 2, role_id_2 FROM union_leaders_legacy WHERE role_id_2 IS NOT NULL;
+
+DROP TABLE union_leaders_legacy;
+
+DO $$
+DECLARE
+    counts TEXT;
+BEGIN
+    SELECT string_agg(source || ': ' || n, ', ') INTO counts
+    FROM (SELECT source, count(*) AS n FROM legacy_quarantine GROUP BY source ORDER BY source) q;
+    IF counts IS NOT NULL THEN
+        RAISE WARNING 'Legacy rows that could not be converted were moved to legacy_quarantine (%)', counts;
+    END IF;
+END
+$$;
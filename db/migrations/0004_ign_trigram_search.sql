@@ -0,0 +1,15 @@
+-- Indexed substring / fuzzy IGN search for /search_user.
+-- A trigram GIN index serves both ILIKE '%q%' and the similarity operator (%).
+--
+-- Servers without the pg_trgm extension (contrib not installed) still migrate;
+-- utils.ign_search then falls back to exact matches.
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_user_igns_ign_trgm ON user_igns USING gin (ign gin_trgm_ops);
+    ELSE
+        RAISE WARNING 'pg_trgm is not available; fuzzy IGN search falls back to exact matches';
+    END IF;
+END $$;
@@ -0,0 +1,74 @@
+-- Cross-process cache invalidation.
+-- Every write to a cached table sends a NOTIFY on 'union_cache' carrying the
+-- changed key columns (old and new values), so each bot process can drop or
+-- reload exactly the affected cache entries.
+--
+-- Payload: {"table": ..., "op": ..., "keys": {"<column>": [values...]}}
+
+CREATE OR REPLACE FUNCTION notify_cache_change() RETURNS trigger AS $$
+DECLARE
+    old_row jsonb;
+    new_row jsonb;
+    keys    jsonb := '{}'::jsonb;
+    vals    jsonb;
+    col     text;
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        -- TRUNCATE: no per-row keys, listeners reload everything
+        PERFORM pg_notify('union_cache', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', keys)::text);
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN old_row := to_jsonb(OLD); END IF;
+    IF TG_OP <> 'DELETE' THEN new_row := to_jsonb(NEW); END IF;
+
+    FOREACH col IN ARRAY TG_ARGV LOOP
+        vals := '[]'::jsonb;
+        IF old_row IS NOT NULL THEN
+            vals := vals || jsonb_build_array(old_row -> col);
+        END IF;
+        IF new_row IS NOT NULL AND (old_row IS NULL OR (new_row -> col) IS DISTINCT FROM (old_row -> col)) THEN
+            vals := vals || jsonb_build_array(new_row -> col);
+        END IF;
+        keys := keys || jsonb_build_object(col, vals);
+    END LOOP;
+
+    PERFORM pg_notify('union_cache', jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', keys)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('discord_id');
+CREATE TRIGGER users_cache_truncate
+    AFTER TRUNCATE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change();
+
+CREATE TRIGGER user_igns_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON user_igns
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('discord_id');
+CREATE TRIGGER user_igns_cache_truncate
+    AFTER TRUNCATE ON user_igns
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change();
+
+CREATE TRIGGER union_memberships_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON union_memberships
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('discord_id', 'role_id');
+CREATE TRIGGER union_memberships_cache_truncate
+    AFTER TRUNCATE ON union_memberships
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change();
+
+CREATE TRIGGER union_leaders_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON union_leaders
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('user_id', 'role_id');
+CREATE TRIGGER union_leaders_cache_truncate
+    AFTER TRUNCATE ON union_leaders
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change();
+
+CREATE TRIGGER union_roles_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON union_roles
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('role_id');
+CREATE TRIGGER union_roles_cache_truncate
+    AFTER TRUNCATE ON union_roles
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change();
@@ -0,0 +1,32 @@
+-- Per-guild scoping for multi-guild deployments.
+--
+--   union_roles.guild_id   guild the union role belongs to; NULL for unions registered
+--                          before this migration until the bot backfills them
+--   guild_settings         per-guild configuration (cleanup report channel)
+--   cleanup_runs           timing and row counts of every cleanup run, per guild
+
+ALTER TABLE union_roles ADD COLUMN guild_id BIGINT;
+CREATE INDEX idx_union_roles_guild_id ON union_roles (guild_id);
+
+CREATE TABLE guild_settings (
+    guild_id          BIGINT PRIMARY KEY,
+    report_channel_id BIGINT,
+    updated_at        TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE cleanup_runs (
+    id              BIGSERIAL   PRIMARY KEY,
+    guild_id        BIGINT      NOT NULL,
+    kind            TEXT        NOT NULL CHECK (kind IN ('scan', 'departure')),
+    started_at      TIMESTAMPTZ NOT NULL,
+    duration_ms     INTEGER     NOT NULL,
+    checked         INTEGER     NOT NULL,
+    removed         INTEGER     NOT NULL,
+    leaders_removed INTEGER     NOT NULL
+);
+CREATE INDEX idx_cleanup_runs_guild ON cleanup_runs (guild_id, started_at DESC);
+
+-- Settings are cached in every bot process (see 0005)
+CREATE TRIGGER guild_settings_cache_notify
+    AFTER INSERT OR UPDATE OR DELETE ON guild_settings
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_change('guild_id');
@@ -0,0 +1,22 @@
+-- Persistent queue of Discord role changes.
+--
+-- Commands record the role changes they need here, in the same transaction as
+-- the membership change, and reply immediately. A background worker claims due
+-- rows with FOR UPDATE SKIP LOCKED, merges each member's pending changes into a
+-- single role edit and deletes the rows once applied. Failed edits are retried
+-- with backoff through not_before.
+
+CREATE TABLE role_ops (
+    id         BIGSERIAL   PRIMARY KEY,
+    guild_id   BIGINT      NOT NULL,
+    member_id  BIGINT      NOT NULL,
+    role_id    BIGINT      NOT NULL,
+    add        BOOLEAN     NOT NULL,
+    reason     TEXT,
+    attempts   INTEGER     NOT NULL DEFAULT 0,
+    last_error TEXT,
+    not_before TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX idx_role_ops_due ON role_ops (not_before, id);
+CREATE INDEX idx_role_ops_member ON role_ops (guild_id, member_id);
@@ -0,0 +1,13 @@
+-- Fingerprint of the application commands last synced to each guild.
+--
+-- on_ready runs again after every gateway reconnect. The bot hashes the payload
+-- tree.sync() would send for a guild and only syncs when the hash differs from
+-- the one stored here, so reconnects and restarts without command changes cost
+-- no sync requests.
+
+CREATE TABLE command_sync (
+    guild_id      BIGINT      PRIMARY KEY,
+    fingerprint   TEXT        NOT NULL,
+    command_count INTEGER     NOT NULL,
+    synced_at     TIMESTAMPTZ NOT NULL DEFAULT now()
+);
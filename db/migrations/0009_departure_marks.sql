@@ -0,0 +1,15 @@
+-- Users seen absent from every guild of a shard, for orphan deletion under the
+-- cluster launcher.
+--
+-- A process that runs only some of the shards cannot tell on its own whether a
+-- user who left all of its guilds is still in a guild of another process. Each
+-- reconciliation scan therefore marks such users for the shards it runs; a user
+-- is deleted outright once every shard has marked them recently. Marks are
+-- cleared when the user is seen again (scan or member join).
+
+CREATE TABLE departure_marks (
+    discord_id BIGINT      NOT NULL REFERENCES users (discord_id) ON DELETE CASCADE,
+    shard_id   INTEGER     NOT NULL,
+    marked_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (discord_id, shard_id)
+);
@@ -0,0 +1,9 @@
+-- Lease-based claims for the role queue.
+--
+-- Workers used to hold FOR UPDATE locks (and a pooled connection) on the rows
+-- they claimed for as long as the Discord role edits took. A claim now pushes
+-- not_before past a lease and commits at once; the edits run outside any
+-- transaction and each member's rows are deleted or rescheduled afterwards.
+-- Rows of a worker that died mid-batch become due again when the lease runs out.
+
+ALTER TABLE role_ops ADD COLUMN claimed_at TIMESTAMPTZ;
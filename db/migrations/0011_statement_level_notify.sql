@@ -0,0 +1,72 @@
+-- One cache NOTIFY per statement instead of one per row.
+--
+-- The row-level triggers from 0005 sent a notification for every row a bulk
+-- purge, backfill or seed touched. These statement-level triggers read the
+-- changed rows from transition tables and send a single payload with the
+-- distinct keys. A payload that would not fit a NOTIFY (8000 bytes) becomes a
+-- RESYNC message instead, on which listeners reload their caches in full.
+-- Transition tables allow only one event per trigger, hence three per table.
+
+CREATE OR REPLACE FUNCTION notify_cache_change_statement() RETURNS trigger AS $$
+DECLARE
+    changed text;
+    empty   boolean;
+    keys    jsonb := '{}'::jsonb;
+    vals    jsonb;
+    col     text;
+    payload text;
+BEGIN
+    changed := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+        ELSE 'SELECT * FROM old_rows UNION ALL SELECT * FROM new_rows'
+    END;
+
+    EXECUTE format('SELECT NOT EXISTS (%s)', changed) INTO empty;
+    IF empty THEN
+        RETURN NULL;
+    END IF;
+
+    FOREACH col IN ARRAY TG_ARGV LOOP
+        EXECUTE format('SELECT coalesce(jsonb_agg(DISTINCT c.%I), ''[]'') FROM (%s) c', col, changed) INTO vals;
+        keys := keys || jsonb_build_object(col, vals);
+    END LOOP;
+
+    payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'keys', keys)::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', 'RESYNC', 'keys', '{}'::jsonb)::text;
+    END IF;
+    PERFORM pg_notify('union_cache', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    cached RECORD;
+BEGIN
+    FOR cached IN
+        SELECT * FROM (VALUES
+            ('users', '''discord_id'''),
+            ('user_igns', '''discord_id'''),
+            ('union_memberships', '''discord_id'', ''role_id'''),
+            ('union_leaders', '''user_id'', ''role_id'''),
+            ('union_roles', '''role_id'''),
+            ('guild_settings', '''guild_id''')
+        ) AS t(tbl, cols)
+    LOOP
+        EXECUTE format('DROP TRIGGER %I ON %I', cached.tbl || '_cache_notify', cached.tbl);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change_statement(%s)',
+            cached.tbl || '_cache_notify_insert', cached.tbl, cached.cols);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change_statement(%s)',
+            cached.tbl || '_cache_notify_update', cached.tbl, cached.cols);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change_statement(%s)',
+            cached.tbl || '_cache_notify_delete', cached.tbl, cached.cols);
+    END LOOP;
+END $$;
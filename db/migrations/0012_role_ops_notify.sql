@@ -0,0 +1,10 @@
+-- Wake role queue workers once queued role changes are committed.
+--
+-- enqueue() runs inside the caller's transaction, so waking the worker from
+-- there let it claim before the rows were visible and then sleep until the
+-- next poll. A NOTIFY is only delivered on commit; this statement-level trigger
+-- sends one on the 'union_cache' channel per INSERT into role_ops, and every
+-- bot process (not just the one that queued the change) wakes its worker.
+
+CREATE TRIGGER role_ops_notify_insert AFTER INSERT ON role_ops REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_change_statement('guild_id');
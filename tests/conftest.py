@@ -0,0 +1,46 @@
+"""Database-backed tests
+
+These run against a disposable PostgreSQL database named by TEST_DATABASE_URL:
+migrations are applied to it and every application table is truncated before
+each test. Without TEST_DATABASE_URL (or asyncpg) the tests are skipped.
+Set DB_SSL=disable for a local server without TLS.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/unionbot_test DB_SSL=disable python -m pytest -q
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+asyncpg = pytest.importorskip("asyncpg")
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+APP_TABLES = (
+    "users", "user_igns", "union_memberships", "union_leaders", "union_roles",
+    "guild_settings", "role_ops", "cleanup_runs", "command_sync", "departure_marks",
+)
+
+async def _prepare():
+    from utils.db import get_connection
+    from utils.migrations import apply_migrations
+
+    conn = await get_connection()
+    try:
+        await apply_migrations(conn)
+        await conn.execute(f"TRUNCATE {', '.join(APP_TABLES)} CASCADE")
+    finally:
+        await conn.close()
+
+@pytest.fixture
+def database(monkeypatch):
+    """Point utils.db at the test database, migrated and emptied"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    monkeypatch.setenv("DATABASE_URL", TEST_DATABASE_URL)
+    asyncio.run(_prepare())
+    return TEST_DATABASE_URL
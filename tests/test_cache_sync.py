@@ -0,0 +1,171 @@
+"""Cross-process cache invalidation over LISTEN/NOTIFY
+
+Two bot processes are stood in for by two connection pools with their own
+lookup cache. Writes go through process A; process B only learns about them
+from the 'union_cache' notifications, wired up the way bot.py wires them.
+"""
+
+import asyncio
+import json
+import time
+
+import asyncpg
+
+from utils.cache_sync import CHANNEL, CacheInvalidationListener
+from utils.db import _connect_kwargs, get_connection
+from utils.lookup_cache import LookupCache
+from utils.roster import PRIMARY, SECONDARY, register_ign
+from utils.union_ops import appoint_leader
+
+FLUSH_DELAY = 0.25
+# Slack on top of the debounce window for the round trip and the refresh query
+MARGIN = 1.0
+
+class Process:
+    def __init__(self, pool, listen=False):
+        self.pool = pool
+        self.cache = LookupCache()
+        self.listener = None
+        if listen:
+            self.listener = CacheInvalidationListener(flush_delay=FLUSH_DELAY, max_backoff=1)
+            for table in ("users", "user_igns", "union_leaders"):
+                self.listener.subscribe(table, self._refresh_users)
+            self.listener.on_resync(self._reload)
+
+    async def _refresh_users(self, keys):
+        user_ids = keys.get("discord_id", set()) | keys.get("user_id", set())
+        async with self.pool.acquire() as conn:
+            await self.cache.refresh_users(conn, user_ids)
+
+    async def _reload(self):
+        async with self.pool.acquire() as conn:
+            await self.cache.load(conn)
+
+    async def start(self):
+        if self.listener:
+            await self.listener.start()
+        await self._reload()
+
+async def wait_until(read, expected, timeout):
+    """Poll the async read() until it returns expected; returns the seconds it took"""
+    started = time.monotonic()
+    while (value := await read()) != expected:
+        if time.monotonic() - started > timeout:
+            raise AssertionError(f"still {value!r} after {timeout}s, expected {expected!r}")
+        await asyncio.sleep(0.02)
+    return time.monotonic() - started
+
+async def listener_pids(conn):
+    return await conn.fetch(
+        """
+        SELECT pid FROM pg_stat_activity
+        WHERE datname = current_database() AND query LIKE 'LISTEN%' AND pid <> pg_backend_pid()
+        """
+    )
+
+async def scenario():
+    pool_a = await asyncpg.create_pool(min_size=1, max_size=2, **_connect_kwargs())
+    pool_b = await asyncpg.create_pool(min_size=1, max_size=2, **_connect_kwargs())
+    a, b = Process(pool_a), Process(pool_b, listen=True)
+    try:
+        await b.start()
+        await a.start()
+
+        # A write on A reaches B's cache within the debounce window
+        async with pool_a.acquire() as conn:
+            await register_ign(conn, 1, "user1", PRIMARY, "Alpha")
+        a.cache.set_ign(1, PRIMARY, "Alpha")
+        took = await wait_until(lambda: b.cache.find_ign("Alpha"), (1, PRIMARY), FLUSH_DELAY + MARGIN)
+        assert took >= FLUSH_DELAY * 0.8, "B refreshed before the debounce window closed"
+
+        # A burst of writes is merged into one refresh and still ends consistent
+        async with pool_a.acquire() as conn:
+            await conn.execute("INSERT INTO union_roles (role_id) VALUES (101)")
+            for n in range(2, 6):
+                await register_ign(conn, n, f"user{n}", PRIMARY, f"Burst{n}")
+            async with conn.transaction():
+                await appoint_leader(conn, 3, PRIMARY, 101, "user3")
+        await wait_until(lambda: b.cache.leadership(3), {PRIMARY: 101}, FLUSH_DELAY + MARGIN)
+        for n in range(2, 6):
+            assert await b.cache.find_ign(f"Burst{n}") == (n, PRIMARY)
+
+        # Kill B's listening connection; a write made while it is down is only
+        # picked up by the resync after the reconnect
+        async with pool_a.acquire() as conn:
+            pids = await listener_pids(conn)
+            assert len(pids) == 1
+            await conn.execute("SELECT pg_terminate_backend($1)", pids[0]['pid'])
+        await wait_until(lambda: _connected(b), False, MARGIN)
+
+        async with pool_a.acquire() as conn:
+            await register_ign(conn, 1, "user1", SECONDARY, "WhileDown")
+        # max_backoff=1: reconnects one second after the drop
+        await wait_until(lambda: b.cache.find_ign("WhileDown"), (1, SECONDARY), 1 + FLUSH_DELAY + MARGIN)
+        assert b.listener.connected
+
+        # And notifications flow again on the new connection
+        async with pool_a.acquire() as conn:
+            await register_ign(conn, 6, "user6", PRIMARY, "AfterReconnect")
+        await wait_until(lambda: b.cache.find_ign("AfterReconnect"), (6, PRIMARY), FLUSH_DELAY + MARGIN)
+
+        async with pool_b.acquire() as conn:
+            assert await b.cache.verify(conn) == []
+    finally:
+        await b.listener.stop()
+        await pool_a.close()
+        await pool_b.close()
+
+async def _connected(process):
+    return process.listener.connected
+
+def test_notify_invalidates_other_process_and_resyncs_after_reconnect(database):
+    asyncio.run(scenario())
+
+async def bulk_scenario():
+    listen = await get_connection()
+    received = []
+    await listen.add_listener(CHANNEL, lambda conn, pid, channel, payload: received.append(json.loads(payload)))
+    conn = await get_connection()
+    try:
+        # 100 users fit one payload; 2000 do not and turn into a RESYNC
+        for rows in (100, 2000):
+            await conn.execute("""
+                INSERT INTO users (discord_id, username) SELECT g, 'bulk' || g FROM generate_series(1, $1::bigint) g
+            """, rows)
+            await conn.execute("DELETE FROM users")
+        await conn.execute("DELETE FROM users WHERE discord_id = 0")
+        await asyncio.sleep(0.2)
+    finally:
+        await conn.close()
+        await listen.close()
+
+    assert [(message['table'], message['op']) for message in received] == [
+        ("users", "INSERT"), ("users", "DELETE"), ("users", "RESYNC"), ("users", "RESYNC")
+    ]
+    assert sorted(received[0]['keys']['discord_id']) == list(range(1, 101))
+
+def test_bulk_writes_send_one_notification_per_statement(database):
+    asyncio.run(bulk_scenario())
+
+async def role_queue_scenario():
+    listen = await get_connection()
+    received = []
+    await listen.add_listener(CHANNEL, lambda conn, pid, channel, payload: received.append(json.loads(payload)))
+    conn = await get_connection()
+    try:
+        async with conn.transaction():
+            await conn.execute("""
+                INSERT INTO role_ops (guild_id, member_id, role_id, add) VALUES (1, 7, 101, true), (1, 7, 102, false)
+            """)
+            await asyncio.sleep(0.2)
+            # Not visible to a worker yet, so nothing may wake it
+            assert received == []
+        await asyncio.sleep(0.2)
+    finally:
+        await conn.close()
+        await listen.close()
+
+    assert received == [{"table": "role_ops", "op": "INSERT", "keys": {"guild_id": [1]}}]
+
+def test_role_queue_wakes_on_commit_only(database):
+    asyncio.run(role_queue_scenario())
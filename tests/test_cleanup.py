@@ -0,0 +1,88 @@
+"""Guild-scoped cleanup
+
+Two processes each run half of the shards. A user gone from every guild of
+one process must survive that process's scan and is deleted only once the
+other process has seen them gone as well. Unions whose guild is not recorded
+yet belong to a guild only if it holds their role.
+"""
+
+import asyncio
+
+from utils.cleanup import clear_departure_marks, purge_users, reconcile
+from utils.db import close_pool, get_connection, init_pool
+from utils.roster import PRIMARY, SECONDARY, register_ign
+from utils.union_ops import backfill_union_guilds, join_union
+
+SHARD_COUNT = 4
+CLUSTER_A, CLUSTER_B = [0, 1], [2, 3]
+
+async def users(conn):
+    return {row['discord_id'] for row in await conn.fetch("SELECT discord_id FROM users")}
+
+async def scan(shard_ids, present):
+    return await reconcile(
+        present.__contains__,
+        guild_id=1,
+        is_orphan=lambda discord_id: discord_id not in present,
+        shards=(shard_ids, SHARD_COUNT)
+    )
+
+async def scenario():
+    await init_pool()
+    conn = await get_connection()
+    try:
+        for discord_id in (1, 2, 3):
+            await register_ign(conn, discord_id, f"user{discord_id}", PRIMARY, f"Player{discord_id}")
+
+        # User 2 left A's guilds, user 3 left everywhere
+        await scan(CLUSTER_A, present={1})
+        assert await users(conn) == {1, 2, 3}
+
+        # B still sees user 2; user 3 is now marked by every shard
+        report = await scan(CLUSTER_B, present={1, 2})
+        assert await users(conn) == {1, 2}
+        assert [user.discord_id for user in report.removed if user.deleted] == [3]
+
+        # User 2 rejoins one of A's guilds before B marks them: the join clears A's marks
+        await clear_departure_marks(conn, [2])
+        await scan(CLUSTER_B, present={1})
+        assert await users(conn) == {1, 2}
+    finally:
+        await conn.close()
+        await close_pool()
+
+def test_orphans_need_every_shard_in_partial_cluster_mode(database):
+    asyncio.run(scenario())
+
+class FakeGuild:
+    def __init__(self, guild_id, role_ids):
+        self.id = guild_id
+        self.role_ids = set(role_ids)
+
+    def get_role(self, role_id):
+        return role_id if role_id in self.role_ids else None
+
+async def legacy_union_scenario():
+    conn = await get_connection()
+    try:
+        # 101 belongs to guild 1; 201 was registered before guild_id existed and is guild 2's
+        await conn.execute("INSERT INTO union_roles (role_id, guild_id) VALUES (101, 1), (201, NULL)")
+        await register_ign(conn, 7, "user7", PRIMARY, "Main")
+        await register_ign(conn, 7, "user7", SECONDARY, "Alt")
+        await join_union(conn, 7, PRIMARY, 101)
+        await join_union(conn, 7, SECONDARY, 201)
+
+        # Leaving guild 1 must not touch the legacy union of guild 2
+        async with conn.transaction():
+            report = await purge_users(conn, [7], guild_id=1, guild_role_ids=[101, 102])
+        assert [user.unions for user in report.removed] == [[101]]
+        assert await conn.fetchval("SELECT role_id FROM union_memberships WHERE discord_id = 7") == 201
+
+        assert await backfill_union_guilds(conn, [FakeGuild(1, [101]), FakeGuild(2, [201])]) == 1
+        assert await conn.fetchval("SELECT guild_id FROM union_roles WHERE role_id = 201") == 2
+        assert await backfill_union_guilds(conn, [FakeGuild(2, [201])]) == 0
+    finally:
+        await conn.close()
+
+def test_unions_without_guild_only_match_the_guild_holding_their_role(database):
+    asyncio.run(legacy_union_scenario())
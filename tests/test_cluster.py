@@ -0,0 +1,73 @@
+"""Event split between cluster workers
+
+A fake gateway routes each guild's events to shard (guild_id >> 22) % shard_count
+the way Discord does, and hands them to the worker process running that shard.
+Each worker's ClusterConfig is built from the environment the launcher gives it.
+"""
+
+import random
+from collections import Counter
+
+import pytest
+
+from utils.cluster import ClusterConfig, Worker, shard_of, split_shards
+
+DISCORD_EPOCH_MS = 1420070400000
+
+def snowflake(rng):
+    """A guild id as Discord issues them: creation time in the top bits"""
+    created_ms = rng.randrange(DISCORD_EPOCH_MS, 1_780_000_000_000) - DISCORD_EPOCH_MS
+    return (created_ms << 22) | rng.getrandbits(22)
+
+class FakeGateway:
+    def __init__(self, shard_count):
+        self.shard_count = shard_count
+        # shard id -> cluster id of the worker that identified it
+        self.sessions = {}
+
+    def identify(self, cluster_id, config):
+        for shard_id in config.shard_ids:
+            assert shard_id not in self.sessions, f"shard {shard_id} identified twice"
+            self.sessions[shard_id] = cluster_id
+
+    def route(self, guild_id):
+        return self.sessions[shard_of(guild_id, self.shard_count)]
+
+def worker_configs(monkeypatch, clusters, shard_count):
+    configs = {}
+    for cluster_id, shard_ids in enumerate(split_shards(shard_count, clusters)):
+        for key, value in Worker(cluster_id, shard_ids, shard_count).env().items():
+            monkeypatch.setenv(key, value)
+        configs[cluster_id] = ClusterConfig.from_env()
+    return configs
+
+@pytest.mark.parametrize("clusters, shard_count", [(1, 1), (2, 4), (3, 8), (4, 10), (5, 16)])
+def test_every_guild_goes_to_exactly_one_worker(monkeypatch, clusters, shard_count):
+    rng = random.Random(shard_count)
+    guild_ids = {snowflake(rng) for _ in range(5000)}
+    configs = worker_configs(monkeypatch, clusters, shard_count)
+
+    gateway = FakeGateway(shard_count)
+    for cluster_id, config in configs.items():
+        gateway.identify(cluster_id, config)
+    assert sorted(gateway.sessions) == list(range(shard_count))
+
+    received = Counter()
+    for guild_id in guild_ids:
+        cluster_id = gateway.route(guild_id)
+        received[cluster_id] += 1
+        # The worker the event reaches agrees the guild is its own, and no other does
+        assert [cid for cid, config in configs.items() if config.handles(guild_id)] == [cluster_id]
+
+    assert sum(received.values()) == len(guild_ids)
+    # Shard ranges differ by at most one shard, so the load stays close to even
+    for cluster_id, config in configs.items():
+        share = received[cluster_id] / len(guild_ids)
+        expected = len(config.shard_ids) / shard_count
+        assert abs(share - expected) < 0.05, f"cluster {cluster_id}: {share:.2f} of events, expected {expected:.2f}"
+        assert config.partial == (clusters > 1)
+
+def test_unsharded_process_handles_every_guild():
+    config = ClusterConfig()
+    assert not config.sharded
+    assert all(config.handles(snowflake(random.Random(n))) for n in range(100))
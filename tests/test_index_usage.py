@@ -0,0 +1,76 @@
+"""The lookups issued on nearly every command must be served by an index
+
+Each hot query is EXPLAINed against a representative number of seeded rows -
+on a near-empty table a sequential scan is the right plan, so the planner is
+left alone rather than forced with enable_seqscan. The seed runs in a
+transaction that is rolled back, with ids far above the ones other tests use.
+"""
+
+import asyncio
+
+import pytest
+
+from utils.db import get_connection
+
+# Users seeded per check; enough for an index to beat a sequential scan
+ROWS = 20_000
+# Members per seeded union
+UNION_SIZE = 30
+# Seeded ids start here, clear of the small ids the other tests create
+ID_BASE = 1_000_000_000
+
+# label -> (query, arguments matching the seeded rows, extension the query needs)
+HOT_QUERIES = {
+    "user by IGN": ("SELECT discord_id, slot FROM user_igns WHERE ign = $1", ["CheckIGN4242"], None),
+    "union members": ("SELECT discord_id, slot FROM union_memberships WHERE role_id = $1", [ID_BASE + 7], None),
+    "union leader": ("SELECT user_id, slot FROM union_leaders WHERE role_id = $1", [ID_BASE + 7], None),
+    "user slots": ("SELECT slot, ign FROM user_igns WHERE discord_id = $1", [ID_BASE + 4242], None),
+    "IGN fuzzy search": (
+        "SELECT discord_id FROM user_igns WHERE ign ILIKE $1 OR ign % $2", ["%checkign4242%", "CheckIGN4242"], "pg_trgm"
+    ),
+}
+
+async def seed(conn, rows):
+    """Users with both IGN slots, unions of UNION_SIZE members and one leader each"""
+    unions = max(1, rows // UNION_SIZE)
+    await conn.execute("""
+        INSERT INTO users (discord_id, username) SELECT $2 + g, 'check_' || g FROM generate_series(1, $1::bigint) g
+    """, rows, ID_BASE)
+    await conn.execute("""
+        INSERT INTO user_igns (discord_id, slot, ign)
+        SELECT $2 + g, s, CASE s WHEN 1 THEN 'CheckIGN' ELSE 'CheckAlt' END || g
+        FROM generate_series(1, $1::bigint) g, generate_series(1, 2) s
+    """, rows, ID_BASE)
+    await conn.execute("""
+        INSERT INTO union_memberships (discord_id, slot, role_id)
+        SELECT $3 + g, 1, $3 + g % $2 FROM generate_series(1, $1::bigint) g
+    """, rows, unions, ID_BASE)
+    await conn.execute("""
+        INSERT INTO union_leaders (user_id, slot, role_id)
+        SELECT $2 + g, 2, $2 + g FROM generate_series(1, $1::bigint) g
+    """, unions, ID_BASE)
+    for table in ("users", "user_igns", "union_memberships", "union_leaders"):
+        await conn.execute(f"ANALYZE {table}")
+
+async def explain(label):
+    query, args, extension = HOT_QUERIES[label]
+    conn = await get_connection()
+    try:
+        if extension and not await conn.fetchval("SELECT 1 FROM pg_extension WHERE extname = $1", extension):
+            return None
+        tx = conn.transaction()
+        await tx.start()
+        try:
+            await seed(conn, ROWS)
+            return "\n".join(row[0] for row in await conn.fetch(f"EXPLAIN {query}", *args))
+        finally:
+            await tx.rollback()
+    finally:
+        await conn.close()
+
+@pytest.mark.parametrize("label", HOT_QUERIES)
+def test_hot_query_uses_an_index(database, label):
+    plan = asyncio.run(explain(label))
+    if plan is None:
+        pytest.skip(f"{HOT_QUERIES[label][2]} is not installed")
+    assert "Seq Scan" not in plan, plan
@@ -0,0 +1,181 @@
+"""The write-through lookup cache must answer exactly like the database
+
+Random command sequences are applied the way the cogs apply them - the same
+database call, then the same cache hook - and after every step each IGN and
+leadership lookup is answered by the cache and by the database and compared.
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from utils.cleanup import forget_removed, purge_users
+from utils.db import get_connection
+from utils.lookup_cache import LookupCache
+from utils.roster import PRIMARY, SECONDARY, deregister_ign, find_ign, register_ign
+from utils.union_ops import appoint_leader, deregister_union, dismiss_leader
+
+USERS = range(1, 9)
+ROLES = (101, 102, 103)
+IGNS = [f"Player{n}" for n in range(12)]
+
+async def db_leadership(conn, user_id):
+    rows = await conn.fetch("SELECT slot, role_id FROM union_leaders WHERE user_id = $1", user_id)
+    return {row['slot']: row['role_id'] for row in rows}
+
+async def assert_consistent(conn, cache, step):
+    for ign in IGNS:
+        assert await cache.find_ign(ign) == await find_ign(conn, ign), f"{step}: find_ign({ign!r})"
+    for user_id in USERS:
+        assert await cache.leadership(user_id) == await db_leadership(conn, user_id), f"{step}: leadership({user_id})"
+    assert await cache.verify(conn) == [], step
+
+# ---- commands, as the cogs run them ----------------------------------------------
+
+async def register(conn, cache, rng):
+    user_id, slot, ign = rng.choice(USERS), rng.choice((PRIMARY, SECONDARY)), rng.choice(IGNS)
+    await register_ign(conn, user_id, f"user{user_id}", slot, ign)
+    cache.set_ign(user_id, slot, ign)
+    return f"register {user_id}/{slot} = {ign}"
+
+async def deregister(conn, cache, rng):
+    user_id, slot = rng.choice(USERS), rng.choice((PRIMARY, SECONDARY))
+    if await deregister_ign(conn, user_id, slot):
+        cache.remove_ign(user_id, slot)
+    return f"deregister {user_id}/{slot}"
+
+async def appoint(conn, cache, rng):
+    found = await cache.find_ign(rng.choice(IGNS))
+    if not found:
+        return "appoint (unregistered IGN)"
+    user_id, slot = found
+    role_id = rng.choice(ROLES)
+    async with conn.transaction():
+        result = await appoint_leader(conn, user_id, slot, role_id, f"user{user_id}")
+    if result['appointed']:
+        cache.set_leader(user_id, slot, role_id)
+    return f"appoint {user_id}/{slot} -> {role_id}"
+
+async def dismiss(conn, cache, rng):
+    found = await cache.find_ign(rng.choice(IGNS))
+    if not found:
+        return "dismiss (unregistered IGN)"
+    user_id, slot = found
+    role_id = (await cache.leadership(user_id)).get(slot)
+    if role_id is None:
+        return f"dismiss {user_id}/{slot} (not a leader)"
+    if await dismiss_leader(conn, user_id, slot, role_id):
+        cache.remove_leader(user_id, slot)
+    else:
+        await cache.refresh_user(conn, user_id)
+    return f"dismiss {user_id}/{slot} from {role_id}"
+
+async def drop_union(conn, cache, rng):
+    role_id = rng.choice(ROLES)
+    await deregister_union(conn, role_id)
+    cache.remove_role(role_id)
+    # Registered again so later steps can keep using it
+    await conn.execute("INSERT INTO union_roles (role_id) VALUES ($1) ON CONFLICT DO NOTHING", role_id)
+    return f"deregister union {role_id}"
+
+async def departure(conn, cache, rng):
+    user_id = rng.choice(USERS)
+    async with conn.transaction():
+        report = await purge_users(conn, [user_id])
+    forget_removed(cache, report.removed)
+    return f"departure {user_id}"
+
+async def external_write(conn, cache, rng):
+    """Another process renames an IGN; the NOTIFY handler refreshes that user"""
+    user_id = rng.choice(USERS)
+    await conn.execute(
+        "UPDATE user_igns SET ign = $2 WHERE discord_id = $1 AND slot = $3", user_id, rng.choice(IGNS), PRIMARY
+    )
+    await cache.refresh_users(conn, [user_id])
+    return f"external rename {user_id}"
+
+COMMANDS = (register, register, register, deregister, appoint, appoint, dismiss, drop_union, departure, external_write)
+
+async def run_sequence(seed, steps):
+    rng = random.Random(seed)
+    conn = await get_connection()
+    try:
+        for role_id in ROLES:
+            await conn.execute("INSERT INTO union_roles (role_id) VALUES ($1)", role_id)
+        cache = LookupCache()
+        await cache.load(conn)
+
+        history = []
+        for _ in range(steps):
+            history.append(await rng.choice(COMMANDS)(conn, cache, rng))
+            await assert_consistent(conn, cache, " -> ".join(history[-5:]))
+
+        # A fresh load must agree with the cache built up step by step
+        reloaded = LookupCache()
+        await reloaded.load(conn)
+        for ign in IGNS:
+            assert await cache.find_ign(ign) == await reloaded.find_ign(ign)
+    finally:
+        await conn.close()
+
+@pytest.mark.parametrize("seed", range(5))
+def test_command_sequences_keep_cache_consistent(database, seed):
+    asyncio.run(run_sequence(seed, steps=80))
+
+def test_verify_reports_drift(database):
+    async def scenario():
+        conn = await get_connection()
+        try:
+            await register_ign(conn, 1, "user1", PRIMARY, "Player1")
+            cache = LookupCache()
+            await cache.load(conn)
+            # Written without the cache hook, as a missed invalidation would leave it
+            await register_ign(conn, 1, "user1", SECONDARY, "Player2")
+            assert await cache.verify(conn) == ["IGN (1, 2): db='Player2' cache=None"]
+        finally:
+            await conn.close()
+
+    asyncio.run(scenario())
+
+class WriteDuringLoad:
+    """A connection on which another command writes (database, then cache hook) after each query of a load"""
+    def __init__(self, conn, writes):
+        self.conn = conn
+        self.writes = list(writes)
+
+    async def fetch(self, query, *args):
+        rows = await self.conn.fetch(query, *args)
+        if self.writes:
+            await self.writes.pop(0)()
+        return rows
+
+def test_writes_during_load_are_not_lost(database):
+    async def scenario():
+        conn = await get_connection()
+        try:
+            await conn.execute("INSERT INTO union_roles (role_id) VALUES (101)")
+            await register_ign(conn, 1, "user1", PRIMARY, "Player1")
+            await register_ign(conn, 2, "user2", PRIMARY, "Player2")
+            cache = LookupCache()
+
+            async def register_after_snapshot():
+                await register_ign(conn, 3, "user3", PRIMARY, "Player3")
+                cache.set_ign(3, PRIMARY, "Player3")
+
+            async def appoint_and_deregister():
+                async with conn.transaction():
+                    await appoint_leader(conn, 1, PRIMARY, 101, "user1")
+                cache.set_leader(1, PRIMARY, 101)
+                await deregister_ign(conn, 2, PRIMARY)
+                cache.remove_ign(2, PRIMARY)
+
+            # The first write lands between the two queries of the load, the
+            # second after both; neither is in the rows the load read
+            await cache.load(WriteDuringLoad(conn, [register_after_snapshot, appoint_and_deregister]))
+            await assert_consistent(conn, cache, "writes during load")
+            assert cache._journals == []
+        finally:
+            await conn.close()
+
+    asyncio.run(scenario())
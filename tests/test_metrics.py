@@ -0,0 +1,33 @@
+"""Command error counting
+
+A command that catches its own exception and replies "❌ Error ..." returns
+normally; it is still counted as an error once it has called mark_failed().
+"""
+
+import asyncio
+
+from utils.metrics import Metrics
+
+async def command(metrics, fail):
+    timing = metrics.start()
+    try:
+        if fail:
+            raise ValueError("boom")
+    except Exception:
+        metrics.mark_failed()
+    return timing
+
+def test_handled_errors_are_counted():
+    metrics = Metrics()
+
+    async def scenario():
+        # Each invocation runs in its own task, as discord.py dispatches them
+        for fail in (False, True, True):
+            timing = await asyncio.create_task(command(metrics, fail))
+            metrics.finish("/register", timing)
+        # Outside a command there is nothing to mark
+        metrics.mark_failed()
+
+    asyncio.run(scenario())
+    stats = metrics.commands["/register"]
+    assert (stats.calls, stats.errors) == (3, 2)
@@ -0,0 +1,37 @@
+"""Leader appointment results the role queue acts on
+
+Moving a leader out of another union must report that union, and whether the
+user's other IGN is still in it (then the Discord role stays).
+"""
+
+import asyncio
+
+from utils.db import get_connection
+from utils.roster import PRIMARY, SECONDARY, register_ign
+from utils.union_ops import appoint_leader, join_union
+
+async def scenario():
+    conn = await get_connection()
+    try:
+        await conn.execute("INSERT INTO union_roles (role_id) VALUES (101), (102), (103)")
+        await register_ign(conn, 7, "user7", PRIMARY, "Main")
+        await register_ign(conn, 7, "user7", SECONDARY, "Alt")
+        await join_union(conn, 7, PRIMARY, 101)
+        await join_union(conn, 7, SECONDARY, 101)
+
+        # Both IGNs in 101: the main moves to lead 102, the alt still needs 101's role
+        async with conn.transaction():
+            result = await appoint_leader(conn, 7, PRIMARY, 102, "user7")
+        assert result['appointed']
+        assert (result['previous_union'], result['other']) == (101, 101)
+
+        # The alt moves on its own: nothing left in 101
+        async with conn.transaction():
+            result = await appoint_leader(conn, 7, SECONDARY, 103, "user7")
+        assert (result['previous_union'], result['other']) == (101, 102)
+        assert await conn.fetchval("SELECT count(*) FROM union_memberships WHERE role_id = 101") == 0
+    finally:
+        await conn.close()
+
+def test_appointment_reports_previous_and_other_union(database):
+    asyncio.run(scenario())
@@ -0,0 +1,143 @@
+"""Cross-process cache invalidation over Postgres LISTEN/NOTIFY
+
+Triggers from migrations 0005 and 0011 send one NOTIFY on the 'union_cache'
+channel per statement writing to a cached table, carrying the distinct changed
+key columns (or RESYNC when they do not fit one payload). This module holds a
+dedicated connection LISTENing on that channel and forwards the keys to the
+handlers subscribed for each table. Notifications arriving close
+together are merged so a bulk write costs one refresh per table.
+
+If the listening connection drops, notifications sent meanwhile are lost, so
+after reconnecting every resync handler runs to rebuild its cache in full.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from utils.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "union_cache"
+
+class CacheInvalidationListener:
+    def __init__(self, flush_delay=0.25, max_backoff=60):
+        self.flush_delay = flush_delay
+        self.max_backoff = max_backoff
+        # table -> [async handler(keys)], keys being {column: set(values)}
+        self._handlers = defaultdict(list)
+        # async handlers run when notifications may have been missed
+        self._resync_handlers = []
+        # table -> column -> set of changed values, waiting for the next flush
+        self._pending = defaultdict(lambda: defaultdict(set))
+        self._truncated = False
+        self._flush_task = None
+        self._task = None
+        self._lost = None
+        self.connected = False
+        self.received = 0
+
+    def subscribe(self, table, handler):
+        self._handlers[table].append(handler)
+
+    def on_resync(self, handler):
+        self._resync_handlers.append(handler)
+
+    async def start(self):
+        """LISTEN before the caches are loaded so no write slips between load and listen
+
+        A failed first connection is logged and retried in the background.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        conn = None
+        try:
+            conn = await self._listen()
+        except Exception as e:
+            logger.error(f"Cache invalidation listener could not connect: {e}")
+        self._task = asyncio.create_task(self._run(conn))
+
+    async def stop(self):
+        for task in (self._task, self._flush_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _listen(self):
+        conn = await get_connection()
+        self._lost = asyncio.Event()
+        conn.add_termination_listener(lambda _: self._lost.set())
+        await conn.add_listener(CHANNEL, self._on_notify)
+        self.connected = True
+        logger.info(f"Listening for cache invalidations on '{CHANNEL}'")
+        return conn
+
+    async def _run(self, conn):
+        backoff = 1
+        while True:
+            try:
+                if conn is None:
+                    conn = await self._listen()
+                    # Anything written while we were not listening is unknown
+                    await self._resync()
+                backoff = 1
+                await self._lost.wait()
+                logger.warning("Cache invalidation connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+                conn = None
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _resync(self):
+        for handler in self._resync_handlers:
+            try:
+                await handler()
+            except Exception as e:
+                logger.error(f"Cache resync failed: {e}")
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Ignoring malformed cache notification: {payload!r}")
+            return
+
+        self.received += 1
+        if message.get("op") in ("TRUNCATE", "RESYNC"):
+            self._truncated = True
+        else:
+            pending = self._pending[message["table"]]
+            for column, values in message.get("keys", {}).items():
+                pending[column].update(v for v in values if v is not None)
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        await asyncio.sleep(self.flush_delay)
+        pending, self._pending = self._pending, defaultdict(lambda: defaultdict(set))
+        truncated, self._truncated = self._truncated, False
+
+        if truncated:
+            await self._resync()
+            return
+
+        for table, keys in pending.items():
+            for handler in self._handlers.get(table, []):
+                try:
+                    await handler(keys)
+                except Exception as e:
+                    logger.error(f"Cache invalidation for {table} failed: {e}")
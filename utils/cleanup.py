@@ -0,0 +1,357 @@
+"""Bulk removal of users who left Discord
+
+Used both by the event-driven departure handler and by the periodic
+reconciliation scan. Every statement takes the whole batch of ids
+(`= ANY($1)`), so the number of round trips does not depend on batch size.
+
+The scan walks `users` in discord_id order one page at a time, each page in
+its own short transaction, so memory and lock time stay bounded however big
+the table gets. A benchmark against a seeded copy of the data (rolled back
+afterwards) is available from the command line:
+
+    python -m utils.cleanup bench [rows] [page_size]
+"""
+
+import asyncio
+import datetime
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from utils.db import transaction
+from utils.roster import PRIMARY, SECONDARY
+
+logger = logging.getLogger(__name__)
+
+# Users read and purged per reconciliation transaction
+SCAN_PAGE_SIZE = int(os.getenv("CLEANUP_PAGE_SIZE", "1000"))
+# Removed users kept in detail on a report; beyond this only counts are kept
+REPORT_DETAIL_LIMIT = 50
+# Departure marks older than this no longer count towards orphan deletion
+DEPARTURE_MARK_MAX_AGE = datetime.timedelta(days=2)
+
+class DepartedUser:
+    __slots__ = ("discord_id", "username", "slots", "led", "deleted")
+
+    def __init__(self, discord_id, username, slots, led, deleted):
+        self.discord_id = discord_id
+        self.username = username
+        # {slot: (ign, removed role_id or None)}
+        self.slots = slots
+        # [(slot, role_id)] leaderships removed, in slot order
+        self.led = led
+        # Whether the users row itself was deleted (gone from every guild)
+        self.deleted = deleted
+
+    @property
+    def led_roles(self):
+        return [role_id for _, role_id in self.led]
+
+    @property
+    def unions(self):
+        return [self.slots[slot][1] for slot in (PRIMARY, SECONDARY) if slot in self.slots and self.slots[slot][1]]
+
+def forget_removed(lookup_cache, users):
+    """Apply a purge to the IGN / leadership cache"""
+    for user in users:
+        if user.deleted:
+            lookup_cache.remove_user(user.discord_id)
+        else:
+            for slot, _ in user.led:
+                lookup_cache.remove_leader(user.discord_id, slot)
+
+class CleanupReport:
+    def __init__(self, detail_limit=None):
+        self.detail_limit = detail_limit
+        self.checked = 0
+        self.present = 0
+        self.removed_count = 0
+        self.leaders_removed = 0
+        # Removed users in detail, up to detail_limit
+        self.removed = []
+        # Remaining leaders of unions that lost members
+        self.affected_leaders = set()
+
+    def add_removed(self, users):
+        self.removed_count += len(users)
+        self.leaders_removed += sum(1 for user in users if user.led_roles)
+        room = len(users) if self.detail_limit is None else max(0, self.detail_limit - len(self.removed))
+        self.removed.extend(users[:room])
+
+    def merge(self, other):
+        self.checked += other.checked
+        self.present += other.present
+        self.removed_count += other.removed_count
+        self.leaders_removed += other.leaders_removed
+        room = len(other.removed) if self.detail_limit is None else max(0, self.detail_limit - len(self.removed))
+        self.removed.extend(other.removed[:room])
+        self.affected_leaders |= other.affected_leaders
+
+async def purge_users(conn, discord_ids, guild_id=None, orphan_ids=None, report=None, guild_role_ids=None):
+    """Remove departed users from the database
+
+    Without guild_id the users are deleted outright. With guild_id only their
+    memberships and leaderships in that guild's unions are removed - including
+    unions whose guild is not recorded yet, but only if their role is among
+    guild_role_ids (the guild's current roles). Users in orphan_ids, gone from
+    every guild, are deleted outright. Run inside a transaction. Returns a CleanupReport (or
+    extends the one given) describing what was removed and which leaders should
+    be told.
+    """
+    report = report if report is not None else CleanupReport()
+    discord_ids = list(discord_ids)
+    if not discord_ids:
+        return report
+    orphan_ids = discord_ids if guild_id is None else list(orphan_ids or [])
+
+    names = {
+        row['discord_id']: row['username']
+        for row in await conn.fetch("SELECT discord_id, username FROM users WHERE discord_id = ANY($1::bigint[])", discord_ids)
+    }
+    igns = {
+        (row['discord_id'], row['slot']): row['ign']
+        for row in await conn.fetch("SELECT discord_id, slot, ign FROM user_igns WHERE discord_id = ANY($1::bigint[])", discord_ids)
+    }
+
+    led_rows = await conn.fetch("""
+        DELETE FROM union_leaders l USING union_roles r
+        WHERE l.role_id = r.role_id AND l.user_id = ANY($1::bigint[])
+          AND ($2::bigint IS NULL OR r.guild_id = $2 OR (r.guild_id IS NULL AND r.role_id = ANY($3::bigint[])))
+        RETURNING l.user_id, l.slot, l.role_id
+    """, discord_ids, guild_id, guild_role_ids)
+    member_rows = await conn.fetch("""
+        DELETE FROM union_memberships m USING union_roles r
+        WHERE m.role_id = r.role_id AND m.discord_id = ANY($1::bigint[])
+          AND ($2::bigint IS NULL OR r.guild_id = $2 OR (r.guild_id IS NULL AND r.role_id = ANY($3::bigint[])))
+        RETURNING m.discord_id, m.slot, m.role_id
+    """, discord_ids, guild_id, guild_role_ids)
+
+    deleted = set()
+    if orphan_ids:
+        # Leaderships elsewhere (or of unregistered roles) go too; user_igns and
+        # union_memberships rows cascade
+        led_rows += await conn.fetch(
+            "DELETE FROM union_leaders WHERE user_id = ANY($1::bigint[]) RETURNING user_id, slot, role_id", orphan_ids
+        )
+        deleted = {
+            row['discord_id']
+            for row in await conn.fetch("DELETE FROM users WHERE discord_id = ANY($1::bigint[]) RETURNING discord_id", orphan_ids)
+        }
+
+    led = {}
+    for row in sorted(led_rows, key=lambda r: r['slot']):
+        led.setdefault(row['user_id'], []).append((row['slot'], row['role_id']))
+    memberships = {(row['discord_id'], row['slot']): row['role_id'] for row in member_rows}
+    lost_membership = {row['discord_id'] for row in member_rows}
+
+    removed = []
+    for discord_id in sorted(names):
+        if discord_id not in deleted and discord_id not in led and discord_id not in lost_membership:
+            continue
+        slots = {
+            slot: (igns.get((discord_id, slot)), memberships.get((discord_id, slot)))
+            for slot in (PRIMARY, SECONDARY)
+            if (discord_id, slot) in igns or (discord_id, slot) in memberships
+        }
+        removed.append(DepartedUser(discord_id, names[discord_id], slots, led.get(discord_id, []), discord_id in deleted))
+
+    unions = {role_id for user in removed for role_id in user.unions}
+    if unions:
+        leader_rows = await conn.fetch(
+            "SELECT DISTINCT user_id FROM union_leaders WHERE role_id = ANY($1::bigint[])", list(unions)
+        )
+        report.affected_leaders.update(row['user_id'] for row in leader_rows)
+
+    report.add_removed(removed)
+    return report
+
+async def mark_departed(conn, discord_ids, shard_ids, shard_count):
+    """Mark users as gone from every guild on shard_ids
+
+    Returns the ids that every one of the shard_count shards has now marked
+    within DEPARTURE_MARK_MAX_AGE, i.e. the users gone from every guild.
+    """
+    if not discord_ids:
+        return []
+    await conn.execute("""
+        INSERT INTO departure_marks (discord_id, shard_id)
+        SELECT u.discord_id, s.shard_id
+        FROM users u CROSS JOIN unnest($2::int[]) AS s(shard_id)
+        WHERE u.discord_id = ANY($1::bigint[])
+        ON CONFLICT (discord_id, shard_id) DO UPDATE SET marked_at = now()
+    """, discord_ids, shard_ids)
+    rows = await conn.fetch("""
+        SELECT discord_id FROM departure_marks
+        WHERE discord_id = ANY($1::bigint[]) AND marked_at > now() - $2::interval
+        GROUP BY discord_id HAVING count(*) >= $3
+    """, discord_ids, DEPARTURE_MARK_MAX_AGE, shard_count)
+    return [row['discord_id'] for row in rows]
+
+async def clear_departure_marks(conn, discord_ids, shard_ids=None):
+    """Forget departure marks of users seen in a guild again (on shard_ids, or any shard)"""
+    if discord_ids:
+        await conn.execute(
+            "DELETE FROM departure_marks WHERE discord_id = ANY($1::bigint[]) AND ($2::int[] IS NULL OR shard_id = ANY($2::int[]))",
+            list(discord_ids), shard_ids
+        )
+
+async def reconcile_page(conn, after_id, page_size, is_present, guild_id=None, is_orphan=None, shards=None, guild_role_ids=None):
+    """Check and purge one page of users with discord_id > after_id
+
+    With shards=(shard_ids, shard_count) this process only runs some of the
+    shards: is_orphan() then only means gone from every guild seen here, and
+    such users are deleted once every shard has marked them (mark_departed).
+
+    Returns (last discord_id read or None when the table is exhausted, page report).
+    """
+    rows = await conn.fetch(
+        "SELECT discord_id FROM users WHERE discord_id > $1 ORDER BY discord_id LIMIT $2",
+        after_id, page_size
+    )
+    page = CleanupReport()
+    if not rows:
+        return None, page
+
+    ids = [row['discord_id'] for row in rows]
+    departed = [discord_id for discord_id in ids if not is_present(discord_id)]
+    orphans = [discord_id for discord_id in departed if is_orphan(discord_id)] if is_orphan else []
+    if shards:
+        shard_ids, shard_count = shards
+        await clear_departure_marks(conn, [discord_id for discord_id in ids if discord_id not in orphans], shard_ids)
+        orphans = await mark_departed(conn, orphans, shard_ids, shard_count)
+    await purge_users(conn, departed, guild_id, orphans, page, guild_role_ids)
+    page.checked = len(ids)
+    page.present = len(ids) - len(departed)
+    return ids[-1], page
+
+async def reconcile(is_present, guild_id=None, is_orphan=None, page_size=None, on_page=None, shards=None, guild_role_ids=None):
+    """Stream every user through is_present() and purge the absent ones
+
+    Scoped to one guild when guild_id is given (see purge_users for
+    guild_role_ids); is_orphan()
+    then decides which absent users are deleted outright (see reconcile_page
+    for shards). Keyset pages
+    (discord_id > last seen) rather than one long-lived cursor, so each page
+    commits on its own and no transaction spans the whole scan.
+    on_page(page_report) is called after each committed page.
+    """
+    page_size = page_size or SCAN_PAGE_SIZE
+    report = CleanupReport(detail_limit=REPORT_DETAIL_LIMIT)
+    last_id = -1
+
+    while True:
+        async with transaction() as conn:
+            last_id, page = await reconcile_page(
+                conn, last_id, page_size, is_present, guild_id, is_orphan, shards, guild_role_ids
+            )
+        if last_id is None:
+            break
+        report.merge(page)
+        if on_page:
+            on_page(page)
+        if page.checked < page_size:
+            break
+
+    return report
+
+async def record_run(conn, guild_id, kind, started_at, duration, report):
+    """Store timing and row counts of one cleanup run"""
+    await conn.execute("""
+        INSERT INTO cleanup_runs (guild_id, kind, started_at, duration_ms, checked, removed, leaders_removed)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+    """, guild_id, kind, started_at, int(duration * 1000), report.checked, report.removed_count, report.leaders_removed)
+
+async def _whole_table_scan(conn, is_present, page_size):
+    """The layout reconcile() replaced: every id loaded and purged in one transaction"""
+    async with conn.transaction():
+        ids = [row['discord_id'] for row in await conn.fetch("SELECT discord_id FROM users")]
+        departed = [discord_id for discord_id in ids if not is_present(discord_id)]
+        report = await purge_users(conn, departed)
+    report.checked = len(ids)
+    report.present = len(ids) - len(departed)
+    return report, 1
+
+async def _paged_scan(conn, is_present, page_size):
+    total = CleanupReport(detail_limit=0)
+    last_id, pages = -1, 0
+    while True:
+        async with conn.transaction():
+            last_id, page = await reconcile_page(conn, last_id, page_size, is_present)
+        if last_id is None:
+            break
+        total.merge(page)
+        pages += 1
+        if page.checked < page_size:
+            break
+    return total, pages
+
+async def _bench(conn, rows, page_size):
+    """Seed `rows` synthetic users, reconcile them with 10% absent, then roll back
+
+    Both the paged scan and the whole-table scan it replaced run against the
+    same seeded rows; each is rolled back before the next starts.
+    """
+    # Synthetic ids stay far below real snowflakes, and real users count as present
+    def is_present(discord_id):
+        return discord_id > rows or discord_id % 10 != 0
+
+    tx = conn.transaction()
+    await tx.start()
+    try:
+        started = time.perf_counter()
+        await conn.execute("""
+            INSERT INTO users (discord_id, username) SELECT g, 'bench_' || g FROM generate_series(1, $1::bigint) g;
+        """, rows)
+        await conn.execute("""
+            INSERT INTO user_igns (discord_id, slot, ign) SELECT g, 1, 'BenchIGN' || g FROM generate_series(1, $1::bigint) g;
+        """, rows)
+        await conn.execute("""
+            INSERT INTO union_memberships (discord_id, slot, role_id)
+            SELECT g, 1, 1 + g % 20 FROM generate_series(1, $1::bigint) g;
+        """, rows)
+        await conn.execute("ANALYZE users")
+        print(f"Seeded {rows} users in {time.perf_counter() - started:.1f}s")
+
+        for label, scan in ((f"paged scan ({page_size} per page)", _paged_scan), ("whole-table scan", _whole_table_scan)):
+            attempt = conn.transaction()
+            await attempt.start()
+            try:
+                gc.collect()
+                tracemalloc.start()
+                started = time.perf_counter()
+                total, pages = await scan(conn, is_present, page_size)
+                elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            finally:
+                await attempt.rollback()
+            print(f"{label}: {total.checked} users checked in {pages} transaction(s), "
+                  f"{total.removed_count} removed in {elapsed:.2f}s "
+                  f"({elapsed / max(total.checked, 1) * 1e6:.1f} µs/user), peak {peak / 2**20:.1f} MB")
+    finally:
+        await tx.rollback()
+        print("Rolled back seeded data")
+
+async def _cli(argv):
+    from utils.db import get_connection
+
+    command = argv[0] if argv else "bench"
+    if command != "bench":
+        print(__doc__)
+        return 2
+
+    rows = int(argv[1]) if len(argv) > 1 else 200_000
+    page_size = int(argv[2]) if len(argv) > 2 else SCAN_PAGE_SIZE
+    conn = await get_connection()
+    try:
+        await _bench(conn, rows, page_size)
+    finally:
+        await conn.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
@@ -0,0 +1,202 @@
+"""Sharded and multi-process (cluster) operation
+
+A single bot process runs as a plain commands.Bot. Setting SHARDED=1 or
+SHARD_COUNT switches bot.py to commands.AutoShardedBot; SHARD_IDS then limits
+the process to a subset of the shards. The launcher starts one bot.py worker
+per cluster, each with a contiguous range of shard ids, and restarts workers
+that exit:
+
+    python -m utils.cluster launch [clusters] [shards]   # run the workers
+    python -m utils.cluster plan [clusters] [shards]     # print the shard split only
+
+Without [shards] Discord's recommended shard count is used. Workers share no
+memory: caches stay coherent through the database's NOTIFY channel, and the
+role queue, guild settings and command sync state live in the database.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+GATEWAY_URL = "https://discord.com/api/v10/gateway/bot"
+# Discord allows one IDENTIFY per max_concurrency bucket every 5 seconds
+IDENTIFY_INTERVAL = 5.0
+# A worker that stayed up this long is restarted without backoff
+STABLE_RUN_SECONDS = 60
+MAX_RESTART_DELAY = 300
+
+class ClusterConfig:
+    def __init__(self, sharded=False, shard_count=None, shard_ids=None, cluster_id=None):
+        self.sharded = sharded or shard_count is not None
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+        self.cluster_id = cluster_id
+
+    @classmethod
+    def from_env(cls):
+        shard_count = os.getenv("SHARD_COUNT")
+        shard_ids = os.getenv("SHARD_IDS")
+        return cls(
+            sharded=os.getenv("SHARDED", "0") == "1",
+            shard_count=int(shard_count) if shard_count else None,
+            shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+            cluster_id=os.getenv("CLUSTER_ID")
+        )
+
+    def handles(self, guild_id):
+        """Whether this process receives the guild's gateway events"""
+        if not self.sharded or self.shard_ids is None:
+            return True
+        return shard_of(guild_id, self.shard_count) in self.shard_ids
+
+    @property
+    def partial(self):
+        """Whether other processes run some of the shards (and so some guilds)"""
+        return self.shard_ids is not None and self.shard_count is not None and len(self.shard_ids) < self.shard_count
+
+    def bot_options(self):
+        """Keyword arguments for the bot constructor"""
+        if not self.sharded:
+            return {}
+        return {"shard_count": self.shard_count, "shard_ids": self.shard_ids}
+
+    def describe(self):
+        if not self.sharded:
+            return "single process, unsharded"
+        shards = ",".join(map(str, self.shard_ids)) if self.shard_ids else "all"
+        cluster = f"cluster {self.cluster_id}, " if self.cluster_id else ""
+        return f"{cluster}shards {shards} of {self.shard_count or 'auto'}"
+
+def shard_of(guild_id, shard_count):
+    """The shard Discord delivers a guild's events on"""
+    return (guild_id >> 22) % shard_count
+
+def split_shards(shard_count, clusters):
+    """Contiguous shard id ranges, one per cluster, as even as possible"""
+    clusters = max(1, min(clusters, shard_count))
+    base, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for index in range(clusters):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def gateway_info(token):
+    """Recommended shard count and IDENTIFY concurrency from GET /gateway/bot"""
+    request = urllib.request.Request(GATEWAY_URL, headers={
+        "Authorization": f"Bot {token}",
+        "User-Agent": "DiscordBot (discord-union-bot, 1.0)"
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = json.load(response)
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+class Worker:
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.restart_delay = 5
+
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            "SHARDED": "1",
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "CLUSTER_ID": str(self.cluster_id)
+        })
+        return env
+
+    async def run(self, stopping):
+        """Run the worker, restarting it with backoff until stopping is set"""
+        while not stopping.is_set():
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=self.env())
+            logger.info(f"Cluster {self.cluster_id}: started pid {self.process.pid} for shards {self.shard_ids[0]}-{self.shard_ids[-1]}")
+            code = await self.process.wait()
+            if stopping.is_set():
+                break
+
+            if time.monotonic() - started > STABLE_RUN_SECONDS:
+                self.restart_delay = 5
+            logger.warning(f"Cluster {self.cluster_id}: exited with code {code}, restarting in {self.restart_delay}s")
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=self.restart_delay)
+            except asyncio.TimeoutError:
+                pass
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+
+    def terminate(self):
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+
+async def launch(clusters, shard_count, max_concurrency=1):
+    workers = [
+        Worker(index, shard_ids, shard_count)
+        for index, shard_ids in enumerate(split_shards(shard_count, clusters))
+    ]
+    stopping = asyncio.Event()
+
+    def stop():
+        logger.info("Stopping cluster workers...")
+        stopping.set()
+        for worker in workers:
+            worker.terminate()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop)
+        except NotImplementedError:
+            pass
+
+    tasks = []
+    for worker in workers:
+        tasks.append(asyncio.create_task(worker.run(stopping)))
+        # Each worker identifies its shards one bucket at a time; let it get
+        # through them before the next worker starts identifying
+        delay = IDENTIFY_INTERVAL * len(worker.shard_ids) / max(max_concurrency, 1)
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+    await asyncio.gather(*tasks)
+
+async def _cli(argv):
+    command = argv[0] if argv else "launch"
+    if command not in ("launch", "plan"):
+        print(__doc__)
+        return 2
+
+    clusters = int(argv[1]) if len(argv) > 1 else int(os.getenv("CLUSTER_COUNT", "2"))
+    max_concurrency = 1
+    if len(argv) > 2:
+        shard_count = int(argv[2])
+    else:
+        token = os.getenv("DISCORD_TOKEN")
+        if not token:
+            print("DISCORD_TOKEN is required to look up the recommended shard count")
+            return 2
+        shard_count, max_concurrency = gateway_info(token)
+
+    ranges = split_shards(shard_count, clusters)
+    for index, shard_ids in enumerate(ranges):
+        print(f"cluster {index}: shards {shard_ids[0]}-{shard_ids[-1]} ({len(shard_ids)} of {shard_count})")
+    if command == "launch":
+        await launch(len(ranges), shard_count, max_concurrency)
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
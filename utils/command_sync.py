@@ -0,0 +1,212 @@
+"""Application command sync that skips unchanged guilds
+
+on_ready fires again after every gateway reconnect, but the command tree only
+changes when the code does. The exact payload tree.sync() would send for a
+guild is hashed, and the hash of the last successful sync is stored per guild
+in command_sync; guilds whose stored hash matches are not synced again.
+Discord drops a guild's commands when the bot leaves it, so a guild the bot
+joins is always synced and a guild it leaves has its hash removed.
+
+Guilds that do need a sync are synced concurrently, at most
+COMMAND_SYNC_CONCURRENCY at a time. discord.py retries 429 responses itself,
+so the syncer watches them through the HTTP trace: each 429 on a command route
+halves the concurrency and holds back new syncs until Discord's retry-after
+has passed; every run of clean syncs lets the limit grow back by one.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from utils.db import acquire
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for one guild's tree.sync() call, from the moment it starts
+SYNC_TIMEOUT = float(os.getenv("COMMAND_SYNC_TIMEOUT", "30"))
+# Guild syncs in flight at once before any rate limiting is seen
+SYNC_CONCURRENCY = int(os.getenv("COMMAND_SYNC_CONCURRENCY", "4"))
+
+COMMANDS_ROUTE = re.compile(r"/applications/\d+/(?:guilds/(\d+)/)?commands")
+
+def tree_fingerprint(tree, guild):
+    """Stable hash of the commands registered for a guild"""
+    payload = [command.to_dict(tree) for command in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class SyncResult:
+    __slots__ = ("guild", "status", "commands", "error", "duration", "rate_limited")
+
+    def __init__(self, guild, status, commands=None, error=None, duration=0.0, rate_limited=0):
+        self.guild = guild
+        # "synced", "unchanged" or "failed"
+        self.status = status
+        # Commands returned by Discord (synced) or registered locally (unchanged)
+        self.commands = commands or []
+        self.error = error
+        # Seconds spent in tree.sync(), including discord.py's own 429 retries
+        self.duration = duration
+        # 429 responses seen while this guild was syncing
+        self.rate_limited = rate_limited
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on a rate limit and grows back after clean runs"""
+
+    def __init__(self, limit):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.active = 0
+        # time.monotonic() before which no new work starts
+        self.paused_until = 0.0
+        self._clean = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, clean):
+        async with self._cond:
+            self.active -= 1
+            if clean:
+                self._clean += 1
+                if self.limit < self.max_limit and self._clean >= self.limit:
+                    self.limit += 1
+                    self._clean = 0
+            self._cond.notify_all()
+
+    def rate_limited(self, retry_after):
+        self.limit = max(1, self.limit // 2)
+        self._clean = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+class CommandSyncer:
+    def __init__(self, bot, concurrency=None, timeout=None):
+        self.bot = bot
+        self.timeout = timeout or SYNC_TIMEOUT
+        self.limiter = AdaptiveLimiter(concurrency or SYNC_CONCURRENCY)
+        # guild_id -> fingerprint, mirrors command_sync once loaded
+        self._fingerprints = None
+        # guild_id -> 429s seen while that guild's sync is in flight
+        self._in_flight = {}
+
+        # guild_id -> latest SyncResult
+        self.results = {}
+        self.rate_limited = 0
+        self.last_run = None
+
+    # ---- rate-limit feedback ----------------------------------------------
+
+    def watch(self, trace_config):
+        """Observe command route responses through the bot's aiohttp trace config"""
+        trace_config.on_request_end.append(self._on_request_end)
+
+    async def _on_request_end(self, session, context, params):
+        if params.response.status != 429:
+            return
+        match = COMMANDS_ROUTE.search(params.url.path)
+        if not match:
+            return
+
+        headers = params.response.headers
+        try:
+            retry_after = float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1.0)
+        except ValueError:
+            retry_after = 1.0
+        self.rate_limited += 1
+        self.limiter.rate_limited(retry_after)
+        if match.group(1):
+            guild_id = int(match.group(1))
+            if guild_id in self._in_flight:
+                self._in_flight[guild_id] += 1
+        logger.warning(
+            f"Command sync rate limited ({headers.get('X-RateLimit-Scope', 'unknown')} scope), "
+            f"retry after {retry_after:.1f}s; concurrency now {self.limiter.limit}"
+        )
+
+    # ---- syncing ----------------------------------------------------------
+
+    async def _load(self):
+        if self._fingerprints is None:
+            async with acquire() as conn:
+                rows = await conn.fetch("SELECT guild_id, fingerprint FROM command_sync")
+            self._fingerprints = {row['guild_id']: row['fingerprint'] for row in rows}
+        return self._fingerprints
+
+    def prepare(self, guild):
+        """Register the global commands on the guild tree and return its fingerprint"""
+        self.bot.tree.copy_global_to(guild=guild)
+        return tree_fingerprint(self.bot.tree, guild)
+
+    async def sync_guild(self, guild, force=False):
+        fingerprints = await self._load()
+        fingerprint = self.prepare(guild)
+        if not force and fingerprints.get(guild.id) == fingerprint:
+            return SyncResult(guild, "unchanged", self.bot.tree.get_commands(guild=guild))
+
+        await self.limiter.acquire()
+        self._in_flight[guild.id] = 0
+        started = time.perf_counter()
+        result = SyncResult(guild, "failed", error="cancelled")
+        try:
+            synced = await asyncio.wait_for(self.bot.tree.sync(guild=guild), timeout=self.timeout)
+            result = SyncResult(guild, "synced", synced)
+        except asyncio.TimeoutError:
+            result = SyncResult(guild, "failed", error="timeout")
+        except Exception as e:
+            result = SyncResult(guild, "failed", error=str(e))
+        finally:
+            result.duration = time.perf_counter() - started
+            result.rate_limited = self._in_flight.pop(guild.id, 0)
+            await self.limiter.release(clean=not result.rate_limited)
+
+        self.results[guild.id] = result
+        if result.status != "synced":
+            return result
+
+        async with acquire() as conn:
+            await conn.execute("""
+                INSERT INTO command_sync (guild_id, fingerprint, command_count, synced_at) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (guild_id) DO UPDATE SET fingerprint = EXCLUDED.fingerprint,
+                    command_count = EXCLUDED.command_count, synced_at = EXCLUDED.synced_at
+            """, guild.id, fingerprint, len(result.commands), datetime.datetime.now(datetime.timezone.utc))
+        fingerprints[guild.id] = fingerprint
+        return result
+
+    async def forget(self, guild_id):
+        """Drop a guild's stored fingerprint (the bot left it; Discord removed its commands)"""
+        if self._fingerprints is not None:
+            self._fingerprints.pop(guild_id, None)
+        self.results.pop(guild_id, None)
+        async with acquire() as conn:
+            await conn.execute("DELETE FROM command_sync WHERE guild_id = $1", guild_id)
+
+    async def sync_guilds(self, guilds, force=False):
+        """Sync every guild whose command tree changed since its last sync, concurrently"""
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.sync_guild(guild, force) for guild in guilds))
+        self.last_run = (len([r for r in results if r.status != "unchanged"]), time.perf_counter() - started)
+        return results
+
+    def stats(self):
+        timed = [result for result in self.results.values() if result.status != "unchanged"]
+        slowest = max(timed, key=lambda result: result.duration, default=None)
+        return {
+            "concurrency": self.limiter.limit,
+            "max_concurrency": self.limiter.max_limit,
+            "rate_limited": self.rate_limited,
+            "last_run": self.last_run,
+            "slowest": slowest,
+            "average": sum(result.duration for result in timed) / len(timed) if timed else 0.0,
+        }
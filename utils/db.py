@@ -1,9 +1,19 @@
 import asyncpg
 import os
+import time
+from contextlib import asynccontextmanager
 from urllib.parse import urlparse
 
-async def get_connection():
-    """Get a PostgreSQL connection using asyncpg"""
+from utils.metrics import Histogram
+
+# Process-wide connection pool, created once by init_pool() during bot startup
+_pool = None
+
+# Milliseconds spent waiting for a pooled connection in acquire() / transaction()
+acquire_wait = Histogram()
+
+def _connect_kwargs():
+    """Build asyncpg connection arguments from DATABASE_URL"""
     database_url = os.getenv("DATABASE_URL")
 
     if not database_url:
@@ -11,11 +21,95 @@ async def get_connection():
 
     result = urlparse(database_url)
 
-    return await asyncpg.connect(
+    return dict(
         user=result.username,
         password=result.password,
         database=result.path[1:],
         host=result.hostname,
         port=result.port,
-        ssl='require'
+        # 'disable' for a local server without TLS (e.g. the test database)
+        ssl=os.getenv("DB_SSL", "require")
+    )
+
+async def get_connection():
+    """Get a standalone PostgreSQL connection (diagnostics and scripts only - commands use acquire())"""
+    return await asyncpg.connect(**_connect_kwargs())
+
+async def init_pool(query_logger=None):
+    """Create and warm up the shared connection pool
+
+    Pool sizing is configurable through the environment:
+      DB_POOL_MIN_SIZE  - connections opened and kept warm (default 2)
+      DB_POOL_MAX_SIZE  - hard cap on concurrent connections (default 10)
+      DB_POOL_MAX_IDLE  - seconds before an idle connection is recycled (default 300)
+
+    query_logger, if given, is added to every pooled connection and called
+    with each query's asyncpg LoggedQuery record.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    min_size = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    max_size = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    max_idle = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+    async def init_connection(conn):
+        if query_logger is not None:
+            conn.add_query_logger(query_logger)
+
+    _pool = await asyncpg.create_pool(
+        init=init_connection,
+        min_size=min_size,
+        max_size=max(min_size, max_size),
+        max_inactive_connection_lifetime=max_idle,
+        **_connect_kwargs()
     )
+
+    # Warm-up: make sure every pre-opened connection has completed its handshake
+    warm = [await _pool.acquire() for _ in range(min_size)]
+    try:
+        for conn in warm:
+            await conn.execute("SELECT 1")
+    finally:
+        for conn in warm:
+            await _pool.release(conn)
+
+    return _pool
+
+async def close_pool():
+    """Close the shared pool (called on shutdown)"""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+def get_pool():
+    """Return the shared pool, failing loudly if startup did not create it"""
+    if _pool is None:
+        raise RuntimeError("Database pool not initialised - call init_pool() first")
+    return _pool
+
+def pool_stats():
+    """Connections in use / idle / allowed, or None before init_pool()"""
+    if _pool is None:
+        return None
+    size, idle = _pool.get_size(), _pool.get_idle_size()
+    return {"size": size, "idle": idle, "in_use": size - idle, "max": _pool.get_max_size()}
+
+@asynccontextmanager
+async def acquire():
+    """Borrow a pooled connection for the duration of the block"""
+    started = time.perf_counter()
+    async with get_pool().acquire() as conn:
+        acquire_wait.observe((time.perf_counter() - started) * 1000)
+        yield conn
+
+@asynccontextmanager
+async def transaction():
+    """Borrow a pooled connection and run the block inside a transaction"""
+    started = time.perf_counter()
+    async with get_pool().acquire() as conn:
+        acquire_wait.observe((time.perf_counter() - started) * 1000)
+        async with conn.transaction():
+            yield conn
@@ -0,0 +1,231 @@
+"""Gateway intents and cache settings
+
+What the bot actually reads from the gateway:
+
+  guilds           guild, role and channel state (every cog)
+  members          member directory chunking, joins, role updates and departures
+                   (search_user, role drift, departure cleanup, reconciliation scan)
+  guild_messages   prefix admin commands (!force_sync, !bot_health, !cache_check)
+  message_content  the prefix of those commands
+
+Slash commands arrive as interactions and need no intent. Everything else
+Intents.all() subscribes to - presences above all, then typing, reactions,
+voice and DMs - is traffic the bot decodes and throws away. Member data comes
+from the member directory, so discord.py's member cache and message cache
+stay off.
+
+GATEWAY_PROFILE selects a profile:
+
+  minimal  the intents above, no member or message cache (default)
+  cached   the intents above with discord.py's member cache on top of the directory
+  full     Intents.all() with the default message cache (the old configuration)
+
+The profiles can be compared on a replayed synthetic event stream:
+
+    python -m utils.gateway_profile bench [guilds] [members] [events]
+"""
+
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_INTENTS = ("guilds", "members", "guild_messages", "message_content")
+
+PROFILES = ("minimal", "cached", "full")
+
+class GatewayProfile:
+    def __init__(self, name, intents, member_cache_flags, max_messages):
+        self.name = name
+        self.intents = intents
+        self.member_cache_flags = member_cache_flags
+        self.max_messages = max_messages
+
+    def bot_options(self):
+        """Keyword arguments for the bot constructor"""
+        return {
+            "intents": self.intents,
+            "member_cache_flags": self.member_cache_flags,
+            "max_messages": self.max_messages
+        }
+
+    def describe(self):
+        enabled = [name for name, value in self.intents if value]
+        return f"{self.name} ({len(enabled)} intents, message cache {self.max_messages or 'off'})"
+
+def build_profile(name=None):
+    name = name or os.getenv("GATEWAY_PROFILE", "minimal")
+    if name == "full":
+        return GatewayProfile(name, discord.Intents.all(), discord.MemberCacheFlags.none(), 1000)
+
+    intents = discord.Intents.none()
+    for flag in REQUIRED_INTENTS:
+        setattr(intents, flag, True)
+    if name == "minimal":
+        return GatewayProfile(name, intents, discord.MemberCacheFlags.none(), None)
+    if name == "cached":
+        return GatewayProfile(name, intents, discord.MemberCacheFlags.from_intents(intents), None)
+    raise ValueError(f"Unknown GATEWAY_PROFILE {name!r}; expected one of {', '.join(PROFILES)}")
+
+# ---- benchmark ----------------------------------------------------------------
+
+# Share of a typical busy guild's gateway traffic, and the intent that delivers it
+EVENT_MIX = (
+    ("PRESENCE_UPDATE", "presences", 0.60),
+    ("MESSAGE_CREATE", "guild_messages", 0.20),
+    ("TYPING_START", "guild_typing", 0.12),
+    ("GUILD_MEMBER_UPDATE", "members", 0.08),
+)
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+def _user(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None,
+            "public_flags": 0, "bot": False}
+
+def _member(user_id, roles):
+    return {"user": _user(user_id), "roles": roles, "joined_at": TIMESTAMP, "deaf": False, "mute": False, "nick": None,
+            "avatar": None, "banner": None, "flags": 0, "pending": False, "premium_since": None,
+            "communication_disabled_until": None}
+
+def _role(role_id, name, position):
+    return {"id": role_id, "name": name, "permissions": "0", "position": position, "color": 0,
+            "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None},
+            "hoist": False, "managed": False, "mentionable": False, "icon": None, "unicode_emoji": None, "flags": 0}
+
+def _guild_payload(guild_id, members, rng):
+    """GUILD_CREATE as Discord sends it for a large guild the bot is in"""
+    roles = [str(guild_id + n) for n in range(1, 21)]
+    return {
+        "id": str(guild_id), "name": f"guild{guild_id}", "owner_id": "1", "unavailable": False, "large": True,
+        "joined_at": TIMESTAMP, "member_count": len(members), "icon": None, "splash": None, "discovery_splash": None,
+        "banner": None, "description": None, "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0,
+        "default_message_notifications": 1, "explicit_content_filter": 0, "mfa_level": 0, "nsfw_level": 0,
+        "system_channel_id": None, "system_channel_flags": 0, "rules_channel_id": None, "public_updates_channel_id": None,
+        "safety_alerts_channel_id": None, "vanity_url_code": None, "premium_tier": 0, "premium_subscription_count": 0,
+        "premium_progress_bar_enabled": False, "preferred_locale": "en-US", "max_members": 500000,
+        "max_video_channel_users": 25, "application_id": None, "incidents_data": None,
+        "features": [], "emojis": [], "stickers": [], "threads": [], "presences": [], "voice_states": [],
+        "stage_instances": [], "guild_scheduled_events": [], "soundboard_sounds": [],
+        "roles": [_role(str(guild_id), "@everyone", 0)] + [
+                  _role(role_id, f"union{n}", n + 1) for n, role_id in enumerate(roles)],
+        "channels": [{"id": str(guild_id + 100), "type": 0, "name": "general", "position": 0, "permission_overwrites": [],
+                      "topic": None, "nsfw": False, "parent_id": None, "rate_limit_per_user": 0, "last_message_id": None,
+                      "flags": 0}],
+        "members": [_member(user_id, rng.sample(roles, 2)) for user_id in members],
+    }
+
+def _event(kind, guild_id, user_id, sequence, rng):
+    channel_id = str(guild_id + 100)
+    if kind == "PRESENCE_UPDATE":
+        return {"user": {"id": str(user_id)}, "guild_id": str(guild_id), "status": rng.choice(("online", "idle", "dnd")),
+                "activities": [], "client_status": {"desktop": "online"}}
+    if kind == "MESSAGE_CREATE":
+        return {"id": str(10**15 + sequence), "channel_id": channel_id, "guild_id": str(guild_id), "author": _user(user_id),
+                "member": {"roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False}, "content": "hello " * 8,
+                "timestamp": TIMESTAMP, "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [],
+                "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+    if kind == "TYPING_START":
+        return {"channel_id": channel_id, "guild_id": str(guild_id), "user_id": str(user_id), "timestamp": 1704067200,
+                "member": _member(user_id, [])}
+    return dict(_member(user_id, [str(guild_id + rng.randint(1, 20))]), guild_id=str(guild_id))
+
+def event_stream(guilds, members, events, seed=1):
+    """Synthetic gateway traffic: (event name, required intent, raw JSON payload)"""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _, _ in EVENT_MIX]
+    weights = [weight for _, _, weight in EVENT_MIX]
+    intent_of = {kind: intent for kind, intent, _ in EVENT_MIX}
+    stream = []
+    for sequence in range(events):
+        kind = rng.choices(kinds, weights)[0]
+        guild_id = (1 + rng.randrange(guilds)) * 10**6
+        user_id = 10**12 + rng.randrange(members)
+        stream.append((kind, intent_of[kind], json.dumps(_event(kind, guild_id, user_id, sequence, rng))))
+    return stream
+
+async def _bench_profile(name, guilds, members, stream):
+    from discord.ext import commands
+    from utils.member_directory import MemberDirectory
+
+    gc.collect()
+    tracemalloc.start()
+    profile = build_profile(name)
+    bot = commands.Bot(command_prefix="!", chunk_guilds_at_startup=False, **profile.bot_options())
+    # Entering the client sets up the event loop its listeners are dispatched on
+    async with bot:
+        directory = MemberDirectory(bot)
+        directory.attach()
+        parsers = bot._connection.parsers
+        # What READY would have set; command processing compares authors against it
+        bot._connection.user = discord.ClientUser(state=bot._connection, data=_user(1))
+
+        rng = random.Random(2)
+        member_ids = [10**12 + n for n in range(members)]
+        for n in range(guilds):
+            payload = _guild_payload((1 + n) * 10**6, member_ids, rng)
+            parsers["GUILD_CREATE"](json.loads(json.dumps(payload)))
+            directory.get(int(payload["id"])).replace_all(
+                (int(m["user"]["id"]), m["user"]["username"], m["user"]["username"], [int(r) for r in m["roles"]])
+                for m in payload["members"]
+            )
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        delivered, errors = 0, {}
+        started = time.perf_counter()
+        for index, (kind, intent, raw) in enumerate(stream):
+            # Discord only sends events whose intent the bot subscribed to
+            if not getattr(profile.intents, intent):
+                continue
+            delivered += 1
+            try:
+                parsers[kind](json.loads(raw))
+            except Exception as e:
+                errors[kind] = f"{type(e).__name__}: {e}"
+            if index % 1000 == 0:
+                # Let dispatched listeners (on_message and friends) run
+                await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+    del bot, directory, parsers
+    return {
+        "profile": profile.describe(), "delivered": delivered, "elapsed": elapsed,
+        "state_mb": baseline / 2**20, "final_mb": current / 2**20, "peak_mb": peak / 2**20, "errors": errors
+    }
+
+async def _cli(argv):
+    command = argv[0] if argv else "bench"
+    if command != "bench":
+        print(__doc__)
+        return 2
+
+    guilds = int(argv[1]) if len(argv) > 1 else 5
+    members = int(argv[2]) if len(argv) > 2 else 20_000
+    events = int(argv[3]) if len(argv) > 3 else 200_000
+    stream = event_stream(guilds, members, events)
+    print(f"Replaying {events} events over {guilds} guilds x {members} members")
+
+    for name in PROFILES:
+        result = await _bench_profile(name, guilds, members, stream)
+        print(f"{result['profile']}: {result['delivered']} events delivered in {result['elapsed']:.2f}s "
+              f"({events / max(result['elapsed'], 1e-9):,.0f} offered events/s), "
+              f"memory {result['state_mb']:.1f} MB after guild load, {result['final_mb']:.1f} MB after replay, "
+              f"peak {result['peak_mb']:.1f} MB")
+        for kind, error in result['errors'].items():
+            print(f"  {kind} parse errors, e.g. {error}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
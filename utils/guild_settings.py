@@ -0,0 +1,72 @@
+"""Cached per-guild settings
+
+Rows of guild_settings are read once per guild and kept in memory; writes go
+through set_report_channel() and other processes' writes arrive through the
+cache invalidation listener. The report channel each guild resolves to (the
+configured one or the #union-leader fallback) is cached too, and forgotten
+when the settings change or the guild's channels are created, renamed or
+deleted (channel_changed()).
+"""
+
+import logging
+
+from utils.db import acquire
+
+logger = logging.getLogger(__name__)
+
+# Channel used for cleanup reports when a guild has not configured one
+DEFAULT_REPORT_CHANNEL = "union-leader"
+
+class GuildSettings:
+    def __init__(self):
+        # guild_id -> report_channel_id (None when not configured)
+        self._report_channels = {}
+        # guild_id -> id of the channel reports go to (None when there is none)
+        self._resolved = {}
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._report_channels.clear()
+            self._resolved.clear()
+        else:
+            self._report_channels.pop(guild_id, None)
+            self._resolved.pop(guild_id, None)
+
+    def channel_changed(self, channel):
+        """A channel was created, renamed or deleted; its guild's report channel is resolved again"""
+        self._resolved.pop(channel.guild.id, None)
+
+    async def report_channel_id(self, guild_id):
+        if guild_id not in self._report_channels:
+            async with acquire() as conn:
+                self._report_channels[guild_id] = await conn.fetchval(
+                    "SELECT report_channel_id FROM guild_settings WHERE guild_id = $1", guild_id
+                )
+        return self._report_channels[guild_id]
+
+    async def set_report_channel(self, guild_id, channel_id):
+        async with acquire() as conn:
+            await conn.execute("""
+                INSERT INTO guild_settings (guild_id, report_channel_id) VALUES ($1, $2)
+                ON CONFLICT (guild_id) DO UPDATE SET report_channel_id = EXCLUDED.report_channel_id, updated_at = now()
+            """, guild_id, channel_id)
+        self._report_channels[guild_id] = channel_id
+        self._resolved.pop(guild_id, None)
+
+    async def report_channel(self, guild):
+        """The configured report channel, falling back to #union-leader"""
+        if guild.id in self._resolved:
+            channel_id = self._resolved[guild.id]
+            channel = guild.get_channel(channel_id) if channel_id else None
+            # A cached channel that has gone (missed delete event) is resolved again
+            if channel is not None or channel_id is None:
+                return channel
+
+        channel_id = await self.report_channel_id(guild.id)
+        channel = guild.get_channel(channel_id) if channel_id else None
+        if channel is None:
+            channel = next(
+                (candidate for candidate in guild.text_channels if candidate.name.lower() == DEFAULT_REPORT_CHANNEL), None
+            )
+        self._resolved[guild.id] = channel.id if channel else None
+        return channel
@@ -0,0 +1,50 @@
+"""Ranked fuzzy IGN search backed by the pg_trgm index on user_igns.ign"""
+
+import os
+
+import asyncpg
+
+# Upper bound on how long a single search may run in the database
+SEARCH_TIMEOUT_MS = int(os.getenv("IGN_SEARCH_TIMEOUT_MS", "500"))
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def search_igns(conn, query, limit=5):
+    """Return up to `limit` users whose IGNs best match `query`, plus whether more matched
+
+    Result rows carry discord_id, slot, ign and score. Ranking is exact match first,
+    then prefix match, then trigram similarity; each user appears once with their
+    best-ranked IGN. Substring matches (ILIKE '%q%') and near-misses (similarity
+    above pg_trgm.similarity_threshold) are both returned. If the statement timeout
+    is hit, or pg_trgm is not installed, the search degrades to an exact-match
+    lookup instead of failing.
+    """
+    pattern = _escape_like(query)
+    try:
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL statement_timeout = {SEARCH_TIMEOUT_MS}")
+            rows = await conn.fetch("""
+                SELECT discord_id, slot, ign, similarity(ign, $1) AS score
+                FROM user_igns
+                WHERE ign ILIKE '%' || $2 || '%' OR ign % $1
+                ORDER BY lower(ign) = lower($1) DESC,
+                         ign ILIKE $2 || '%' DESC,
+                         score DESC,
+                         discord_id, slot
+                LIMIT $3
+            """, query, pattern, limit * 2 + 1)
+    except (asyncpg.exceptions.QueryCanceledError, asyncpg.exceptions.UndefinedFunctionError):
+        rows = await conn.fetch("""
+            SELECT discord_id, slot, ign, 1.0::real AS score
+            FROM user_igns WHERE ign = $1
+            ORDER BY discord_id, slot
+            LIMIT $2
+        """, query, limit * 2 + 1)
+
+    best = {}
+    for row in rows:
+        best.setdefault(row['discord_id'], row)
+
+    matches = list(best.values())
+    return matches[:limit], len(matches) > limit or len(rows) > limit * 2
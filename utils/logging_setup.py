@@ -0,0 +1,200 @@
+"""Non-blocking, structured logging
+
+Loggers on the event loop only put records on an in-memory queue
+(QueueHandler); a QueueListener thread does the formatting and the console
+and file I/O. The log file is size-rotated and holds one JSON object per line:
+
+    {"ts": ..., "level": ..., "logger": ..., "message": ...,
+     "command": ..., "guild": ..., "user": ..., "latency_ms": ...}
+
+command / guild / user come from the command being handled (set by the
+command instrumentation through set_log_context) or from `extra=` on the
+call; latency_ms only from `extra=`. Fields that are not known are left out.
+
+The loop time saved under bursty logging can be measured with:
+
+    python -m utils.logging_setup bench [records] [burst] [write latency ms]
+"""
+
+import asyncio
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+
+CONTEXT_FIELDS = ("command", "guild", "user")
+FIELDS = CONTEXT_FIELDS + ("latency_ms",)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_context = contextvars.ContextVar("log_context", default=None)
+
+def set_log_context(command=None, guild=None, user=None):
+    """Attach command / guild / user to every record logged by the current task"""
+    _context.set({"command": command, "guild": guild, "user": user})
+
+class ContextFilter(logging.Filter):
+    """Copy the current task's log context onto the record
+
+    Runs on the logging thread's caller (the QueueHandler side), where the
+    context variable is visible.
+    """
+
+    def filter(self, record):
+        context = _context.get()
+        if context:
+            for field in CONTEXT_FIELDS:
+                if getattr(record, field, None) is None and context[field] is not None:
+                    setattr(record, field, context[field])
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The stock prepare() formats the whole record on the caller's thread.
+        # Only the message arguments need resolving now (they may be mutated
+        # later); formatting happens on the listener thread. Records never leave
+        # the process, so exc_info can travel as is.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging(log_file="bot.log", level=logging.INFO, max_bytes=None, backups=None, console=True):
+    """Route the root logger through a queue to console and rotating JSON file handlers
+
+    Returns the started QueueListener; it is stopped (flushing what is left)
+    at interpreter exit.
+    """
+    max_bytes = max_bytes or int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20)))
+    backups = backups if backups is not None else int(os.getenv("LOG_BACKUPS", "5"))
+
+    handlers = []
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+# ---- benchmark ----------------------------------------------------------------
+
+class _SlowStream:
+    """File stream with a fixed extra latency per write, standing in for a slow disk"""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def _slow_down(handler, io_ms):
+    if io_ms:
+        handler.stream = _SlowStream(handler.stream, io_ms / 1000)
+
+def _direct_logging(path):
+    """The previous setup: formatting and file writes on the calling thread"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    return handler
+
+async def _burst_load(records, burst):
+    """Log `records` lines in bursts of `burst` and measure the loop time they take"""
+    log = logging.getLogger("bench")
+    spent, worst = 0.0, 0.0
+    for start in range(0, records, burst):
+        # Give other tasks (and the listener thread) a turn between bursts
+        await asyncio.sleep(0.001)
+
+        started = time.perf_counter()
+        for n in range(start, min(start + burst, records)):
+            log.info("Synced %d commands to guild %d", 42, n, extra={"guild": n, "command": "bench", "latency_ms": 1.5})
+        elapsed = time.perf_counter() - started
+        spent += elapsed
+        worst = max(worst, elapsed)
+    return spent, worst
+
+async def _bench(records, burst, io_ms=0.0):
+    directory = tempfile.mkdtemp(prefix="logbench-")
+    results = {}
+
+    handler = _direct_logging(os.path.join(directory, "direct.log"))
+    _slow_down(handler, io_ms)
+    results["direct FileHandler"] = await _burst_load(records, burst)
+    logging.getLogger().removeHandler(handler)
+    handler.close()
+
+    listener = setup_logging(os.path.join(directory, "queued.log"), console=False)
+    for handler in listener.handlers:
+        _slow_down(handler, io_ms)
+    results["QueueHandler + JSON file"] = await _burst_load(records, burst)
+    drain_started = time.perf_counter()
+    atexit.unregister(listener.stop)
+    listener.stop()
+    drained = time.perf_counter() - drain_started
+
+    latency = f", {io_ms} ms simulated write latency" if io_ms else ""
+    print(f"{records} records in bursts of {burst}{latency} (files in {directory})")
+    for name, (spent, worst) in results.items():
+        print(f"  {name:<26} loop time {spent * 1000:8.1f} ms total, {worst * 1000:6.2f} ms worst burst "
+              f"({spent / records * 1e6:.1f} µs/record)")
+    print(f"  listener thread needed {drained * 1000:.1f} ms more to drain after the last burst")
+    return 0
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command != "bench":
+        print(__doc__)
+        sys.exit(2)
+    records = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    burst = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    io_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    sys.exit(asyncio.run(_bench(records, burst, io_ms)))
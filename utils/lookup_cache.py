@@ -0,0 +1,222 @@
+"""Write-through cache of IGN ownership and union leadership
+
+Nearly every management command starts by resolving an IGN to its owner or
+checking which union the caller leads. Both tables are small, so the full
+mapping is loaded at startup and the commands that change it update it right
+after their database write. Until load() has completed, lookups fall back to
+the database. Writes made while a load is reading are recorded and replayed on
+the freshly loaded mappings, which may have been read before the write.
+"""
+
+import logging
+
+from utils.db import acquire
+from utils.roster import find_ign, find_igns
+
+logger = logging.getLogger(__name__)
+
+class LookupCache:
+    def __init__(self):
+        self.loaded = False
+        # ign -> set of (discord_id, slot); IGNs are not unique across users
+        self._ign_owners = {}
+        # discord_id -> {slot: ign}
+        self._user_igns = {}
+        # user_id -> {slot: role_id}
+        self._leaders = {}
+        # One list per load() in progress, recording (apply, args) of each write
+        self._journals = []
+
+        # Lookups answered from memory / sent to the database before load()
+        self.hits = 0
+        self.fallbacks = 0
+
+    def stats(self):
+        lookups = self.hits + self.fallbacks
+        return {
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    # ---- loading / invalidation ---------------------------------------
+
+    async def load(self, conn):
+        """(Re)load both mappings from the database"""
+        journal = []
+        self._journals.append(journal)
+        try:
+            ign_rows = await conn.fetch("SELECT discord_id, slot, ign FROM user_igns")
+            leader_rows = await conn.fetch("SELECT user_id, slot, role_id FROM union_leaders")
+        finally:
+            self._journals.remove(journal)
+
+        self._ign_owners, self._user_igns, self._leaders = {}, {}, {}
+        for row in ign_rows:
+            self._put_ign(row['discord_id'], row['slot'], row['ign'])
+        for row in leader_rows:
+            self._leaders.setdefault(row['user_id'], {})[row['slot']] = row['role_id']
+        # Writes the queries above may have missed
+        for apply, args in journal:
+            apply(*args)
+
+        self.loaded = True
+        logger.info(f"Lookup cache loaded: {len(ign_rows)} IGNs, {len(self._leaders)} leaders")
+
+    def invalidate_all(self):
+        """Forget everything; lookups use the database until the next load()"""
+        self.loaded = False
+        self._ign_owners, self._user_igns, self._leaders = {}, {}, {}
+
+    async def refresh_user(self, conn, discord_id):
+        """Re-read one user's IGNs and leadership from the database"""
+        await self.refresh_users(conn, [discord_id])
+
+    async def refresh_users(self, conn, discord_ids):
+        """Re-read IGNs and leadership for several users in two queries"""
+        discord_ids = list(set(discord_ids))
+        if not discord_ids:
+            return
+        ign_rows = await conn.fetch(
+            "SELECT discord_id, slot, ign FROM user_igns WHERE discord_id = ANY($1::bigint[])", discord_ids
+        )
+        leader_rows = await conn.fetch(
+            "SELECT user_id, slot, role_id FROM union_leaders WHERE user_id = ANY($1::bigint[])", discord_ids
+        )
+
+        self._write(self._replace_users, discord_ids, ign_rows, leader_rows)
+
+    # ---- write-through hooks ------------------------------------------
+
+    def _write(self, apply, *args):
+        for journal in self._journals:
+            journal.append((apply, args))
+        apply(*args)
+
+    def set_ign(self, discord_id, slot, ign):
+        self._write(self._set_ign, discord_id, slot, ign)
+
+    def remove_ign(self, discord_id, slot):
+        self._write(self._remove_ign, discord_id, slot)
+
+    def set_leader(self, user_id, slot, role_id):
+        self._write(self._set_leader, user_id, slot, role_id)
+
+    def remove_leader(self, user_id, slot):
+        self._write(self._remove_leader, user_id, slot)
+
+    def remove_role(self, role_id):
+        """Drop every leadership of a deregistered union"""
+        self._write(self._remove_role, role_id)
+
+    def remove_user(self, discord_id):
+        self._write(self._remove_user, discord_id)
+
+    # ---- mutations behind the hooks -------------------------------------
+
+    def _replace_users(self, discord_ids, ign_rows, leader_rows):
+        for discord_id in discord_ids:
+            self._remove_user(discord_id)
+        for row in ign_rows:
+            self._put_ign(row['discord_id'], row['slot'], row['ign'])
+        for row in leader_rows:
+            self._set_leader(row['user_id'], row['slot'], row['role_id'])
+
+    def _put_ign(self, discord_id, slot, ign):
+        self._user_igns.setdefault(discord_id, {})[slot] = ign
+        self._ign_owners.setdefault(ign, set()).add((discord_id, slot))
+
+    def _set_ign(self, discord_id, slot, ign):
+        self._remove_ign(discord_id, slot)
+        self._put_ign(discord_id, slot, ign)
+
+    def _remove_ign(self, discord_id, slot):
+        slots = self._user_igns.get(discord_id)
+        if not slots or slot not in slots:
+            return
+        ign = slots.pop(slot)
+        if not slots:
+            del self._user_igns[discord_id]
+        owners = self._ign_owners.get(ign)
+        if owners:
+            owners.discard((discord_id, slot))
+            if not owners:
+                del self._ign_owners[ign]
+
+    def _set_leader(self, user_id, slot, role_id):
+        self._leaders.setdefault(user_id, {})[slot] = role_id
+
+    def _remove_leader(self, user_id, slot):
+        slots = self._leaders.get(user_id)
+        if slots:
+            slots.pop(slot, None)
+            if not slots:
+                del self._leaders[user_id]
+
+    def _remove_role(self, role_id):
+        for user_id in [user_id for user_id, slots in self._leaders.items() if role_id in slots.values()]:
+            for slot in [slot for slot, led in self._leaders[user_id].items() if led == role_id]:
+                self._remove_leader(user_id, slot)
+
+    def _remove_user(self, discord_id):
+        for slot in list(self._user_igns.get(discord_id, {})):
+            self._remove_ign(discord_id, slot)
+        self._leaders.pop(discord_id, None)
+
+    # ---- lookups ------------------------------------------------------
+
+    async def find_ign(self, ign):
+        """Resolve an IGN to (discord_id, slot), or None"""
+        if not self.loaded:
+            self.fallbacks += 1
+            async with acquire() as conn:
+                return await find_ign(conn, ign)
+        self.hits += 1
+        owners = self._ign_owners.get(ign)
+        return min(owners) if owners else None
+
+    async def find_igns(self, igns):
+        """Resolve many IGNs at once, returning {ign: (discord_id, slot)} for those registered"""
+        if not self.loaded:
+            self.fallbacks += 1
+            async with acquire() as conn:
+                return await find_igns(conn, igns)
+        self.hits += 1
+        return {ign: min(self._ign_owners[ign]) for ign in igns if self._ign_owners.get(ign)}
+
+    async def leadership(self, user_id):
+        """Return {slot: role_id} for every union this user leads"""
+        if not self.loaded:
+            self.fallbacks += 1
+            async with acquire() as conn:
+                rows = await conn.fetch("SELECT slot, role_id FROM union_leaders WHERE user_id = $1", user_id)
+            return {row['slot']: row['role_id'] for row in rows}
+        self.hits += 1
+        return dict(self._leaders.get(user_id, {}))
+
+    async def led_union(self, user_id):
+        """The union this user leads, primary leadership slot first"""
+        slots = await self.leadership(user_id)
+        return slots[min(slots)] if slots else None
+
+    # ---- consistency --------------------------------------------------
+
+    async def verify(self, conn):
+        """Compare the cache against the database, returning a list of differences"""
+        if not self.loaded:
+            return ["cache not loaded"]
+
+        problems = []
+        db_igns = {(row['discord_id'], row['slot']): row['ign'] for row in await conn.fetch("SELECT discord_id, slot, ign FROM user_igns")}
+        cached_igns = {(discord_id, slot): ign for discord_id, slots in self._user_igns.items() for slot, ign in slots.items()}
+        for key in db_igns.keys() | cached_igns.keys():
+            if db_igns.get(key) != cached_igns.get(key):
+                problems.append(f"IGN {key}: db={db_igns.get(key)!r} cache={cached_igns.get(key)!r}")
+
+        db_leaders = {(row['user_id'], row['slot']): row['role_id'] for row in await conn.fetch("SELECT user_id, slot, role_id FROM union_leaders")}
+        cached_leaders = {(user_id, slot): role_id for user_id, slots in self._leaders.items() for slot, role_id in slots.items()}
+        for key in db_leaders.keys() | cached_leaders.keys():
+            if db_leaders.get(key) != cached_leaders.get(key):
+                problems.append(f"Leader {key}: db={db_leaders.get(key)} cache={cached_leaders.get(key)}")
+
+        return problems
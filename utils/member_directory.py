@@ -0,0 +1,265 @@
+"""Compact per-guild member directory
+
+The bot runs with the discord.py member cache disabled, so guild.members is
+usually empty. The directory keeps just (id, name, display name, role ids) per
+member, filled by chunking each guild in the background and kept current from
+member join / update / remove gateway events, with a name index for lookups.
+
+discord.py only dispatches on_member_update for members in its own cache, so
+the directory also hooks the raw GUILD_MEMBER_UPDATE parser. Every update that
+changes a member's roles is re-dispatched as
+on_directory_member_update(guild_id, member_id, before_roles, after_roles).
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+class DirectoryEntry:
+    __slots__ = ("id", "name", "display_name", "roles")
+
+    def __init__(self, member_id, name, display_name, roles=frozenset()):
+        self.id = member_id
+        self.name = name
+        self.display_name = display_name
+        self.roles = roles
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+class GuildDirectory:
+    """Members of one guild with a sorted name index for prefix lookups and a
+    trigram index for substring lookups"""
+
+    def __init__(self):
+        self.entries = {}
+        # Sorted list of (lowercase name, member id); holds both username and display name
+        self._index = []
+        # Trigram -> member ids whose username or display name contains it
+        self._trigrams = defaultdict(set)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, member_id):
+        return member_id in self.entries
+
+    def _keys(self, entry):
+        return {(entry.name.lower(), entry.id), (entry.display_name.lower(), entry.id)}
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _index_trigrams(self, entry):
+        for key, _ in self._keys(entry):
+            for gram in self._grams(key):
+                self._trigrams[gram].add(entry.id)
+
+    def upsert(self, member_id, name, display_name, roles=frozenset()):
+        self.remove(member_id)
+        entry = DirectoryEntry(member_id, name, display_name, frozenset(roles))
+        self.entries[member_id] = entry
+        for key in self._keys(entry):
+            bisect.insort(self._index, key)
+        self._index_trigrams(entry)
+
+    def remove(self, member_id):
+        entry = self.entries.pop(member_id, None)
+        if entry is None:
+            return
+        for key in self._keys(entry):
+            pos = bisect.bisect_left(self._index, key)
+            if pos < len(self._index) and self._index[pos] == key:
+                del self._index[pos]
+            for gram in self._grams(key[0]):
+                ids = self._trigrams.get(gram)
+                if ids is not None:
+                    ids.discard(member_id)
+                    if not ids:
+                        del self._trigrams[gram]
+
+    def replace_all(self, members):
+        """Rebuild from (id, name, display_name, role ids) tuples in one pass"""
+        self.entries = {
+            member_id: DirectoryEntry(member_id, name, display, frozenset(roles))
+            for member_id, name, display, roles in members
+        }
+        index = set()
+        self._trigrams = defaultdict(set)
+        for entry in self.entries.values():
+            index |= self._keys(entry)
+            self._index_trigrams(entry)
+        self._index = sorted(index)
+
+    def role_holders(self, role_ids):
+        """Return {role_id: set of member ids} for the given roles"""
+        wanted = frozenset(role_ids)
+        holders = {role_id: set() for role_id in wanted}
+        for entry in self.entries.values():
+            for role_id in entry.roles & wanted:
+                holders[role_id].add(entry.id)
+        return holders
+
+    def _substring_candidates(self, query):
+        """Member ids that may contain `query`; every id for queries too short for trigrams"""
+        grams = self._grams(query)
+        if not grams:
+            return self.entries.keys()
+        sets = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*sets) if sets[0] else set()
+
+    def search(self, query, limit=5):
+        """Exact name matches first, then prefix matches, then substring matches"""
+        query = query.lower()
+        exact, prefix, substring = [], [], []
+        seen = set()
+
+        pos = bisect.bisect_left(self._index, (query, -1))
+        while pos < len(self._index) and self._index[pos][0].startswith(query):
+            key, member_id = self._index[pos]
+            if member_id not in seen:
+                seen.add(member_id)
+                (exact if key == query else prefix).append(member_id)
+            pos += 1
+
+        if len(exact) + len(prefix) < limit:
+            for member_id in sorted(self._substring_candidates(query)):
+                entry = self.entries[member_id]
+                if member_id not in seen and (query in entry.name.lower() or query in entry.display_name.lower()):
+                    seen.add(member_id)
+                    substring.append(member_id)
+                    if len(exact) + len(prefix) + len(substring) >= limit:
+                        break
+
+        return [self.entries[member_id] for member_id in (exact + prefix + substring)[:limit]]
+
+class MemberDirectory:
+    """Per-guild directories plus the gateway listeners that keep them current"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.guilds = {}
+        self.ready = {}
+        self._tasks = {}
+
+    def get(self, guild_id):
+        return self.guilds.setdefault(guild_id, GuildDirectory())
+
+    def is_ready(self, guild_id):
+        return self.ready.get(guild_id, False)
+
+    async def wait_until_ready(self, guild_ids, timeout, interval=1.0):
+        """Wait until every given guild has been chunked; False if the timeout passed first"""
+        deadline = time.monotonic() + timeout
+        while not all(self.is_ready(guild_id) for guild_id in guild_ids):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+        return True
+
+    def search(self, guild_id, query, limit=5):
+        return self.get(guild_id).search(query, limit)
+
+    def may_contain(self, guild_id, member_id):
+        """True if the member is in the guild, or if that cannot be known yet"""
+        return not self.is_ready(guild_id) or member_id in self.get(guild_id)
+
+    @staticmethod
+    def _role_ids(member):
+        return frozenset(role.id for role in member.roles if not role.is_default())
+
+    def attach(self):
+        """Register gateway listeners on the bot"""
+        self._hook_member_update_parser()
+        self.bot.add_listener(self.on_ready, "on_ready")
+        self.bot.add_listener(self.on_guild_join, "on_guild_join")
+        self.bot.add_listener(self.on_guild_remove, "on_guild_remove")
+        self.bot.add_listener(self.on_member_join, "on_member_join")
+        self.bot.add_listener(self.on_member_update, "on_member_update")
+        self.bot.add_listener(self.on_raw_member_remove, "on_raw_member_remove")
+
+    def schedule_chunk(self, guild):
+        """Chunk a guild in the background unless a chunk is already running"""
+        task = self._tasks.get(guild.id)
+        if task and not task.done():
+            return
+        self._tasks[guild.id] = asyncio.create_task(self._chunk(guild))
+
+    async def _chunk(self, guild):
+        try:
+            # cache=False: members go into the directory, not discord.py's member cache
+            members = await guild.chunk(cache=False)
+            self.get(guild.id).replace_all((m.id, m.name, m.display_name, self._role_ids(m)) for m in members)
+            self.ready[guild.id] = True
+            logger.info(f"Member directory loaded for {guild.name}: {len(members)} members")
+        except Exception as e:
+            logger.error(f"Member directory chunk failed for {guild.name}: {e}")
+
+    async def on_ready(self):
+        # Also fires after reconnects; re-chunking picks up changes missed while disconnected
+        for guild in self.bot.guilds:
+            self.schedule_chunk(guild)
+
+    async def on_guild_join(self, guild):
+        self.schedule_chunk(guild)
+
+    async def on_guild_remove(self, guild):
+        self.guilds.pop(guild.id, None)
+        self.ready.pop(guild.id, None)
+
+    async def on_member_join(self, member):
+        self.get(member.guild.id).upsert(member.id, member.name, member.display_name, self._role_ids(member))
+
+    async def on_member_update(self, before, after):
+        # Only dispatched by discord.py for members it has cached; uncached members
+        # arrive through the raw parser hook below. apply_update() is idempotent, so
+        # seeing a change from both paths dispatches it once
+        self.apply_update(after.guild.id, after.id, after.name, after.display_name, self._role_ids(after))
+
+    def apply_update(self, guild_id, member_id, name, display_name, roles):
+        directory = self.get(guild_id)
+        entry = directory.entries.get(member_id)
+        before_roles = entry.roles if entry else frozenset()
+        if entry is None or (entry.name, entry.display_name, entry.roles) != (name, display_name, roles):
+            directory.upsert(member_id, name, display_name, roles)
+        if entry is not None and before_roles != roles:
+            self.bot.dispatch("directory_member_update", guild_id, member_id, before_roles, frozenset(roles))
+
+    def apply_payload(self, guild_id, data):
+        """Apply a raw member payload (gateway GUILD_MEMBER_UPDATE or a REST member response)"""
+        user = data["user"]
+        name = user["username"]
+        display_name = data.get("nick") or user.get("global_name") or name
+        self.apply_update(guild_id, int(user["id"]), name, display_name, frozenset(int(r) for r in data.get("roles", ())))
+
+    def _hook_member_update_parser(self):
+        """Feed raw GUILD_MEMBER_UPDATE payloads to the directory
+
+        Wraps discord.py's parser for the event; the original parser still runs.
+        Skipped (with a warning) if discord.py's internals do not look as expected.
+        """
+        parsers = getattr(getattr(self.bot, "_connection", None), "parsers", None)
+        if not isinstance(parsers, dict) or "GUILD_MEMBER_UPDATE" not in parsers:
+            logger.warning("GUILD_MEMBER_UPDATE parser not found; directory role tracking relies on the member cache")
+            return
+        original = parsers["GUILD_MEMBER_UPDATE"]
+
+        def parse_guild_member_update(data):
+            try:
+                guild_id = int(data["guild_id"])
+                if self.bot.get_guild(guild_id) is not None:
+                    self.apply_payload(guild_id, data)
+            except Exception as e:
+                logger.error(f"Member directory update failed: {e}")
+            return original(data)
+
+        parsers["GUILD_MEMBER_UPDATE"] = parse_guild_member_update
+
+    async def on_raw_member_remove(self, payload):
+        self.get(payload.guild_id).remove(payload.user.id)
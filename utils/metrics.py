@@ -0,0 +1,275 @@
+"""In-process command latency metrics
+
+Every app command and prefix command is timed from dispatch to return and the
+time is split into:
+
+  db      time inside asyncpg queries (pool query logger)
+  rest    time inside Discord REST requests (aiohttp trace)
+  render  everything else - the command's own Python work building the reply
+
+The command's Timing lives in a context variable, so queries and requests made
+while the command runs are attributed to it without passing anything around.
+A command counts as an error when an exception escapes it or when it catches
+its own and calls mark_failed() before replying with the error.
+Each series is a fixed-bucket histogram: recording is one bisect and an
+increment, and memory does not grow with traffic. The same histogram backs
+the event-loop lag sampler and the database pool wait time.
+"""
+
+import asyncio
+import bisect
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Loop stalls longer than this are reported with the blocking stack
+STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+# Innermost frames logged per stall
+STALL_FRAMES = 8
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+# Bucket upper bounds in milliseconds, ~20% apart from 0.1 ms to 2 minutes;
+# the last bucket catches everything slower
+BUCKETS_MS = []
+_bound = 0.1
+while _bound < 120_000:
+    BUCKETS_MS.append(round(_bound, 3))
+    _bound *= 1.2
+BUCKETS_MS.append(float("inf"))
+
+_current = contextvars.ContextVar("command_timing", default=None)
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+
+    def percentile(self, q):
+        """Estimated q-th percentile (0-100) in ms, interpolated within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS_MS[index - 1] if index else 0.0
+                high = BUCKETS_MS[index] if index < len(BUCKETS_MS) - 1 else low * 1.2
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return BUCKETS_MS[-2]
+
+class Timing:
+    __slots__ = ("started", "db", "rest", "queries", "requests", "failed", "done")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.rest = 0.0
+        self.queries = 0
+        self.requests = 0
+        # Set by mark_failed() when the command reports an error itself
+        self.failed = False
+        self.done = False
+
+class CommandStats:
+    __slots__ = ("total", "db", "rest", "render", "errors")
+
+    def __init__(self):
+        self.total = Histogram()
+        self.db = Histogram()
+        self.rest = Histogram()
+        self.render = Histogram()
+        self.errors = 0
+
+    @property
+    def calls(self):
+        return self.total.count
+
+class Metrics:
+    def __init__(self):
+        # command name -> CommandStats
+        self.commands = {}
+
+    # ---- command lifecycle --------------------------------------------------
+
+    def start(self):
+        """Begin timing the command running in the current task"""
+        timing = Timing()
+        _current.set(timing)
+        return timing
+
+    def finish(self, name, timing, failed=False):
+        """Record a finished command; returns its total time in ms (None if it was not timed)"""
+        if timing is None or timing.done:
+            return None
+        timing.done = True
+        total = (time.perf_counter() - timing.started) * 1000
+        db, rest = timing.db * 1000, timing.rest * 1000
+
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        stats.total.observe(total)
+        stats.db.observe(db)
+        stats.rest.observe(rest)
+        # Concurrent queries / requests can overlap, so the remainder may dip below zero
+        stats.render.observe(max(0.0, total - db - rest))
+        if failed or timing.failed:
+            stats.errors += 1
+        return total
+
+    def mark_failed(self):
+        """Count the running command as failed although it returns normally
+
+        For commands that catch their own errors and reply with "❌ Error ...".
+        """
+        timing = _current.get()
+        if timing is not None and not timing.done:
+            timing.failed = True
+
+    # ---- sources ------------------------------------------------------------
+
+    def record_query(self, record):
+        """asyncpg query logger: attribute the query's time to the running command"""
+        timing = _current.get()
+        if timing is not None and not timing.done:
+            timing.db += record.elapsed
+            timing.queries += 1
+
+    def watch(self, trace_config):
+        """Time Discord REST requests through the bot's aiohttp trace config"""
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_done)
+        trace_config.on_request_exception.append(self._on_request_done)
+
+    async def _on_request_start(self, session, context, params):
+        context.metrics_started = time.perf_counter()
+
+    async def _on_request_done(self, session, context, params):
+        timing = _current.get()
+        started = getattr(context, "metrics_started", None)
+        if timing is not None and not timing.done and started is not None:
+            timing.rest += time.perf_counter() - started
+            timing.requests += 1
+
+    # ---- reporting ----------------------------------------------------------
+
+    def rows(self):
+        """[(command name, CommandStats)], busiest first"""
+        return sorted(self.commands.items(), key=lambda item: item[1].calls, reverse=True)
+
+    def reset(self):
+        self.commands.clear()
+
+class LoopLagSampler:
+    """How late the event loop runs a callback that was due at a known time
+
+    A task sleeps for `interval` over and over; how much later than requested
+    it wakes up is time the loop spent on other, synchronous work.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        # Lag in milliseconds
+        self.lag = Histogram()
+        self.last = 0.0
+        # time.monotonic() of the latest wake-up and the loop's thread, for the watchdog
+        self.beat = time.monotonic()
+        self.thread_id = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        while True:
+            self.beat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - expected)
+            self.lag.observe(self.last * 1000)
+
+class LoopWatchdog:
+    """Thread that logs what the event loop is doing while it is stalled
+
+    The lag sampler only learns about a stall once the loop is free again. The
+    watchdog runs on its own thread, notices the sampler's beat going stale and,
+    while the stall is still in progress, logs the innermost frames of the loop
+    thread's stack - the synchronous code responsible.
+    """
+
+    def __init__(self, sampler, threshold_ms=None, frames=STALL_FRAMES):
+        self.sampler = sampler
+        self.threshold = (threshold_ms if threshold_ms is not None else STALL_THRESHOLD_MS) / 1000
+        self.frames = frames
+        self.stalls = 0
+        self._reported_beat = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="LoopWatchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        check_every = min(self.threshold / 2, 0.1)
+        while not self._stop.wait(check_every):
+            sampler = self.sampler
+            beat = sampler.beat
+            stalled = time.monotonic() - beat - sampler.interval
+            if stalled < self.threshold or beat == self._reported_beat or sampler.thread_id is None:
+                continue
+            # One report per stall
+            self._reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(sampler.thread_id)
+            if frame is None:
+                continue
+            # asyncio's own frames (run_forever, _run_once, Handle._run) are the same every time
+            stack = [entry for entry in traceback.extract_stack(frame) if not entry.filename.startswith(_ASYNCIO_DIR)]
+            stack = stack[-self.frames:]
+            logger.warning(
+                f"Event loop blocked for {stalled * 1000:.0f}ms so far; loop thread is in:\n"
+                + "".join(traceback.format_list(stack)).rstrip()
+            )
+
+def rss_bytes():
+    """Resident memory of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
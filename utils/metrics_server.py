@@ -0,0 +1,167 @@
+"""Prometheus text-format metrics endpoint
+
+Disabled unless METRICS_PORT is set. Serves GET /metrics on METRICS_HOST
+(default 127.0.0.1, so only the local scraper can reach it) with:
+
+  gateway latency per shard, guild count, resident memory
+  command latency histograms (total / db / rest / render) and error counts
+  database pool connections and acquire wait time
+  user profile cache and lookup cache hit / miss counters
+  role queue depth and outcomes, pending member departures
+  command sync rate limits
+  event-loop lag
+
+Command and lag histograms are kept at fine resolution in memory (see
+utils/metrics); they are folded into the coarser buckets below on each scrape,
+each fine bucket counted under the first exported bound at or above its upper
+edge.
+"""
+
+import logging
+import math
+import os
+
+from aiohttp import web
+
+from utils.db import acquire_wait, pool_stats
+from utils.metrics import BUCKETS_MS, rss_bytes
+
+logger = logging.getLogger(__name__)
+
+# Exported histogram bounds in seconds
+EXPORT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = "union_bot"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+class Exposition:
+    """Collects samples and renders them in Prometheus text format"""
+
+    def __init__(self):
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return family[2]
+
+    def gauge(self, name, help_text, value, **labels):
+        self._family(f"{PREFIX}_{name}", "gauge", help_text).append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+
+    def counter(self, name, help_text, value, **labels):
+        self._family(f"{PREFIX}_{name}", "counter", help_text).append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+
+    def histogram(self, name, help_text, histogram, **labels):
+        """Export a millisecond utils.metrics.Histogram in seconds"""
+        lines = self._family(f"{PREFIX}_{name}", "histogram", help_text)
+        cumulative, fine = 0, 0
+        for bound in EXPORT_BUCKETS:
+            while fine < len(BUCKETS_MS) - 1 and BUCKETS_MS[fine] <= bound * 1000:
+                cumulative += histogram.counts[fine]
+                fine += 1
+            lines.append(f"{PREFIX}_{name}_bucket{_labels(dict(labels, le=bound))} {cumulative}")
+        lines.append(f"{PREFIX}_{name}_bucket{_labels(dict(labels, le='+Inf'))} {histogram.count}")
+        lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {histogram.sum / 1000}")
+        lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {histogram.count}")
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+class MetricsServer:
+    def __init__(self, bot, host=None, port=None):
+        self.bot = bot
+        self.host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+        port = port or os.getenv("METRICS_PORT")
+        self.port = int(port) if port else None
+        self._runner = None
+
+    @property
+    def enabled(self):
+        return self.port is not None
+
+    async def start(self):
+        if not self.enabled:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request):
+        try:
+            body = await self.collect()
+        except Exception as e:
+            logger.error(f"Metrics collection failed: {e}")
+            return web.Response(status=500, text=f"metrics collection failed: {e}\n")
+        return web.Response(body=body.encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def collect(self):
+        bot = self.bot
+        out = Exposition()
+
+        # Gateway and process
+        latencies = bot.latencies if hasattr(bot, "latencies") else [(bot.shard_id or 0, bot.latency)]
+        for shard_id, latency in latencies:
+            if math.isfinite(latency):
+                out.gauge("gateway_latency_seconds", "Heartbeat round trip per shard", latency, shard=shard_id)
+        out.gauge("guilds", "Guilds this process serves", len(bot.guilds))
+        out.gauge("process_resident_memory_bytes", "Resident memory of the bot process", rss_bytes())
+        out.histogram("event_loop_lag_seconds", "How late scheduled callbacks run on the event loop", bot.loop_lag.lag)
+        out.counter("event_loop_stalls_total", "Event loop stalls reported with a stack by the watchdog", bot.loop_watchdog.stalls)
+
+        # Commands
+        for name, stats in bot.metrics.rows():
+            for part in ("total", "db", "rest", "render"):
+                out.histogram("command_duration_seconds", "Command latency split into total, db, rest and render time",
+                              getattr(stats, part), command=name, part=part)
+            out.counter("command_errors_total", "Commands that ended in an error", stats.errors, command=name)
+
+        # Database pool
+        pool = pool_stats()
+        if pool:
+            out.gauge("db_pool_connections", "Pooled database connections by state", pool["in_use"], state="in_use")
+            out.gauge("db_pool_connections", "Pooled database connections by state", pool["idle"], state="idle")
+            out.gauge("db_pool_max_connections", "Pool size limit", pool["max"])
+        out.histogram("db_pool_acquire_wait_seconds", "Time spent waiting for a pooled connection", acquire_wait)
+
+        # Caches
+        user_cache = bot.user_cache.stats()
+        for result in ("gateway_hits", "hits", "misses", "errors"):
+            out.counter("user_cache_lookups_total", "Discord user profile lookups by result", user_cache[result], result=result)
+        out.gauge("user_cache_entries", "Cached Discord user profiles", user_cache["size"])
+        lookup_cache = bot.lookup_cache.stats()
+        for result in ("hits", "fallbacks"):
+            out.counter("lookup_cache_lookups_total", "IGN / leadership lookups by result", lookup_cache[result], result=result)
+
+        # Background queues
+        out.gauge("role_queue_pending", "Role changes waiting to be applied", await bot.role_queue.pending())
+        for outcome, value in bot.role_queue.stats().items():
+            out.counter("role_queue_members_total", "Members processed by the role queue by outcome", value, outcome=outcome)
+        union_info = bot.get_cog("UnionInfo")
+        if union_info is not None:
+            out.gauge("departures_pending", "Member departures waiting for the batched cleanup",
+                      union_info.pending_departures)
+        out.counter("command_sync_rate_limited_total", "429 responses on command sync routes",
+                    bot.command_syncer.rate_limited)
+
+        return out.render()
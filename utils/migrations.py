@@ -0,0 +1,112 @@
+"""Versioned schema migrations
+
+Migrations are plain SQL files in db/migrations named NNNN_description.sql.
+Each file is applied once, inside its own transaction, and recorded in the
+schema_migrations table. Versions only have to increase, so gaps are fine
+(0002 was folded into 0003). They run automatically at bot startup and can also
+be driven from the command line:
+
+    python -m utils.migrations            # apply pending migrations
+    python -m utils.migrations status     # list applied / pending versions
+
+tests/test_index_usage.py checks that the hot lookups are served by indexes.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "migrations")
+
+# Arbitrary constant so concurrent bot processes never migrate at the same time
+MIGRATION_LOCK_ID = 727_001
+
+def discover_migrations():
+    """Return [(version, name, path)] for every migration file, sorted by version"""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"^(\d+)_(\w+)\.sql$", filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    found.sort()
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers in db/migrations")
+    return found
+
+async def _ensure_table(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    INTEGER PRIMARY KEY,
+            name       TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+async def applied_versions(conn):
+    await _ensure_table(conn)
+    rows = await conn.fetch("SELECT version FROM schema_migrations")
+    return {row['version'] for row in rows}
+
+async def apply_migrations(conn):
+    """Apply every pending migration in version order, returning the versions applied
+
+    Warnings a migration raises (e.g. rows it had to quarantine) are logged.
+    """
+    applied = []
+    current = None
+
+    def log_server_message(conn, message):
+        # Routine NOTICEs ("already exists, skipping") only at debug level
+        level = logging.WARNING if message.severity in ("WARNING", "ERROR") else logging.DEBUG
+        logger.log(level, f"Migration {current or 'setup'}: {message.message}")
+
+    conn.add_log_listener(log_server_message)
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        done = await applied_versions(conn)
+        for version, name, path in discover_migrations():
+            if version in done:
+                continue
+            current = f"{version:04d}_{name}"
+            with open(path, encoding="utf-8") as f:
+                sql = f.read()
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name
+                )
+            logger.info(f"Applied migration {current}")
+            applied.append(version)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+        conn.remove_log_listener(log_server_message)
+    return applied
+
+async def _cli(argv):
+    from utils.db import get_connection
+
+    command = argv[0] if argv else "migrate"
+    conn = await get_connection()
+    try:
+        if command == "migrate":
+            applied = await apply_migrations(conn)
+            print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+        elif command == "status":
+            done = await applied_versions(conn)
+            for version, name, _ in discover_migrations():
+                print(f"{'applied' if version in done else 'pending'}  {version:04d}_{name}")
+        else:
+            print(__doc__)
+            return 2
+    finally:
+        await conn.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
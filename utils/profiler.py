@@ -0,0 +1,117 @@
+"""On-demand sampling profiler for the event-loop thread
+
+A worker thread reads the loop thread's current stack every few milliseconds
+(sys._current_frames) for a fixed duration. Nothing is installed in the loop
+itself, so overhead is a stack walk per sample and the bot keeps running
+normally. Results are written in collapsed-stack format - one
+"frame;frame;frame count" line per distinct stack - which flamegraph.pl,
+speedscope and similar tools read directly.
+
+Samples are also grouped by the cog (or bot.py / utils module) function they
+ran under, so the summary shows which commands and tasks were busy.
+"""
+
+import collections
+import datetime
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(REPO_ROOT, "profiles"))
+# Seconds between samples
+SAMPLE_INTERVAL = 0.005
+MAX_SECONDS = 120
+
+# The loop is idle while it waits in the selector
+IDLE_FILES = ("selectors.py",)
+
+def _label(entry):
+    filename, function = entry
+    if filename.startswith(REPO_ROOT):
+        return f"{os.path.relpath(filename, REPO_ROOT)}:{function}"
+    return f"{os.path.basename(filename)}:{function}"
+
+def _owner(stack):
+    """Cog / bot.py / utils function a sample ran under, preferring cogs, outermost frame first"""
+    repo = [(os.path.relpath(filename, REPO_ROOT), function) for filename, function in stack if filename.startswith(REPO_ROOT)]
+    for prefix in ("cogs" + os.sep, "bot.py", "utils" + os.sep):
+        for path, function in repo:
+            if path.startswith(prefix):
+                return f"{os.path.splitext(path)[0].replace(os.sep, '.')}.{function}"
+    return "discord.py / other"
+
+class ProfileResult:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = 0
+        self.idle = 0
+        # collapsed stack -> samples
+        self.stacks = collections.Counter()
+        # owning cog / command function -> samples
+        self.owners = collections.Counter()
+        # innermost function -> samples (self time)
+        self.leaves = collections.Counter()
+        self.path = None
+
+    @property
+    def busy(self):
+        return self.samples - self.idle
+
+    def share(self, count):
+        return count / self.samples if self.samples else 0.0
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def run(self, seconds):
+        """Sample for `seconds` and return the aggregated result; blocks the calling thread"""
+        seconds = max(1, min(seconds, MAX_SECONDS))
+        result = ProfileResult(seconds)
+        raw = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            stack = self._sample()
+            if stack:
+                raw[stack] += 1
+            time.sleep(self.interval)
+
+        for stack, count in raw.items():
+            result.samples += count
+            if os.path.basename(stack[-1][0]) in IDLE_FILES:
+                result.idle += count
+                continue
+            result.stacks[";".join(_label(entry) for entry in stack)] += count
+            result.owners[_owner(stack)] += count
+            result.leaves[_label(stack[-1])] += count
+        return result
+
+def write_collapsed(result, directory=None):
+    """Write the busy stacks in collapsed format and return the file path"""
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"profile-{stamp}.collapsed")
+    with open(path, "w", encoding="utf-8") as out:
+        for stack, count in result.stacks.most_common():
+            out.write(f"{stack} {count}\n")
+    result.path = path
+    return path
+
+def profile_thread(thread_id, seconds, directory=None):
+    """Profile another thread and write the report; run from a worker thread"""
+    result = SamplingProfiler(thread_id).run(seconds)
+    write_collapsed(result, directory)
+    return result
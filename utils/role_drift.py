@@ -0,0 +1,118 @@
+"""Drift between union memberships in the database and Discord union roles
+
+For each registered union role the expected holders are the DB members of the
+union who are in the guild; the actual holders come from the member directory.
+Two set differences per role give the drift:
+
+  missing  - DB members without the Discord role
+  extra    - role holders who are not DB members of the union
+
+Members with queued role changes are left out; the queue will settle them.
+
+The incremental check runs on every role change of every member, so the union
+role ids of each guild are cached (UnionRoleCache) and changes that touch no
+union role are ignored without a query.
+"""
+
+from utils.db import acquire
+
+class RoleDrift:
+    def __init__(self, complete=False):
+        # role_id -> set of member ids
+        self.missing = {}
+        self.extra = {}
+        # True once a full scan has run; before that only incremental checks are known
+        self.complete = complete
+
+    def __bool__(self):
+        return any(self.missing.values()) or any(self.extra.values())
+
+    @property
+    def total(self):
+        return sum(map(len, self.missing.values())) + sum(map(len, self.extra.values()))
+
+    def set_member(self, member_id, missing_roles, extra_roles):
+        """Replace one member's drift (used by the incremental check)"""
+        for drift in (self.missing, self.extra):
+            for holders in drift.values():
+                holders.discard(member_id)
+        for role_id in missing_roles:
+            self.missing.setdefault(role_id, set()).add(member_id)
+        for role_id in extra_roles:
+            self.extra.setdefault(role_id, set()).add(member_id)
+
+    def by_member(self):
+        """Return {member_id: (roles to add, roles to remove)}"""
+        changes = {}
+        for role_id, members in self.missing.items():
+            for member_id in members:
+                changes.setdefault(member_id, (set(), set()))[0].add(role_id)
+        for role_id, members in self.extra.items():
+            for member_id in members:
+                changes.setdefault(member_id, (set(), set()))[1].add(role_id)
+        return changes
+
+async def union_role_ids(conn, guild):
+    """Registered union roles that exist in the guild
+
+    Unions whose guild is not recorded yet count only if the guild holds their role.
+    """
+    rows = await conn.fetch(
+        "SELECT role_id FROM union_roles WHERE guild_id = $1 OR guild_id IS NULL", guild.id
+    )
+    return {row['role_id'] for row in rows if guild.get_role(row['role_id'])}
+
+class UnionRoleCache:
+    """Union role ids per guild, as union_role_ids() returns them
+
+    Cleared as a whole on union_roles writes (local commands and the NOTIFY
+    listener); registering or removing a union is rare.
+    """
+
+    def __init__(self):
+        self._by_guild = {}
+
+    def invalidate(self):
+        self._by_guild.clear()
+
+    async def get(self, guild):
+        if guild.id not in self._by_guild:
+            async with acquire() as conn:
+                self._by_guild[guild.id] = frozenset(await union_role_ids(conn, guild))
+        return self._by_guild[guild.id]
+
+async def pending_members(conn, guild_id):
+    rows = await conn.fetch("SELECT DISTINCT member_id FROM role_ops WHERE guild_id = $1", guild_id)
+    return {row['member_id'] for row in rows}
+
+async def full_drift(conn, guild, directory):
+    """Compare every union role of a guild with its DB members"""
+    role_ids = await union_role_ids(conn, guild)
+    rows = await conn.fetch(
+        "SELECT DISTINCT role_id, discord_id FROM union_memberships WHERE role_id = ANY($1::bigint[])", list(role_ids)
+    )
+    skip = await pending_members(conn, guild.id)
+
+    expected = {role_id: set() for role_id in role_ids}
+    for row in rows:
+        if row['discord_id'] in directory:
+            expected[row['role_id']].add(row['discord_id'])
+    actual = directory.role_holders(role_ids)
+
+    drift = RoleDrift(complete=True)
+    for role_id in role_ids:
+        drift.missing[role_id] = expected[role_id] - actual[role_id] - skip
+        drift.extra[role_id] = actual[role_id] - expected[role_id] - skip
+    return drift
+
+async def member_drift(conn, guild, member_id, roles, union_roles):
+    """Drift of one member given their current role ids and the guild's union roles: (missing roles, extra roles)"""
+    if await conn.fetchval("SELECT 1 FROM role_ops WHERE guild_id = $1 AND member_id = $2 LIMIT 1", guild.id, member_id):
+        return set(), set()
+    rows = await conn.fetch(
+        "SELECT role_id FROM union_memberships WHERE discord_id = $1 AND role_id = ANY($2::bigint[])",
+        member_id, list(union_roles)
+    )
+    expected = {row['role_id'] for row in rows}
+    held = set(roles) & union_roles
+    return expected - held, held - expected
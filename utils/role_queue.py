@@ -0,0 +1,219 @@
+"""Persistent, batched Discord role assignment queue
+
+Commands call enqueue() inside the transaction that changes the database, so
+a role change is recorded if and only if the membership change commits, and
+survives restarts. The worker leases due rows - one short UPDATE ... FOR UPDATE
+SKIP LOCKED that moves not_before past the lease, so several bot processes can
+share the queue - and releases the connection. It then folds each member's
+pending changes to the last one per role and applies them with the per-role
+add / remove routes, which leave the member's other roles alone however stale
+the bot's view of them is, and deletes or reschedules that member's rows.
+Rows of a worker that died mid-batch are picked up again once the lease expires.
+The worker wakes on the NOTIFY an insert into role_ops sends when it commits
+(migration 0012, through the cache listener), and polls in case one is missed.
+
+Edits for one guild share a Discord rate-limit bucket, so each guild's members
+are processed one after another; different guilds run concurrently. Failures
+are retried with exponential backoff; permanent failures (missing member,
+missing permissions) are dropped and logged.
+"""
+
+import asyncio
+import logging
+import os
+
+import discord
+
+from utils.db import acquire
+
+logger = logging.getLogger(__name__)
+
+class RoleQueue:
+    def __init__(self, bot, batch_size=None, poll_interval=None, max_attempts=None):
+        self.bot = bot
+        self.batch_size = batch_size or int(os.getenv("ROLE_QUEUE_BATCH", "200"))
+        self.poll_interval = poll_interval or float(os.getenv("ROLE_QUEUE_POLL_SECONDS", "30"))
+        self.max_attempts = max_attempts or int(os.getenv("ROLE_QUEUE_MAX_ATTEMPTS", "8"))
+        # Seconds claimed rows stay invisible to other workers; longer than a batch takes
+        self.lease = float(os.getenv("ROLE_QUEUE_LEASE_SECONDS", "600"))
+        # Collects enqueues arriving together before the worker claims them
+        self.debounce = 0.5
+        self._wake = asyncio.Event()
+        self._task = None
+
+        self.applied = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def stats(self):
+        return {"applied": self.applied, "retried": self.retried, "dropped": self.dropped}
+
+    # ---- producer side --------------------------------------------------
+
+    async def enqueue(self, conn, guild_id, member_id, add=(), remove=(), reason=None):
+        """Record role changes for one member; call inside the caller's transaction"""
+        changes = [(role_id, True) for role_id in add] + [(role_id, False) for role_id in remove]
+        if not changes:
+            return
+        await conn.execute("""
+            INSERT INTO role_ops (guild_id, member_id, role_id, add, reason)
+            SELECT $1, $2, c.role_id, c.add, $5
+            FROM unnest($3::bigint[], $4::boolean[]) AS c(role_id, add)
+        """, guild_id, member_id, [c[0] for c in changes], [c[1] for c in changes], reason)
+
+    async def enqueue_many(self, conn, guild_id, changes, reason=None):
+        """Record role changes for many members in one statement
+
+        changes is [(member_id, roles to add, roles to remove)].
+        """
+        rows = [(member_id, role_id, True) for member_id, add, _ in changes for role_id in add]
+        rows += [(member_id, role_id, False) for member_id, _, remove in changes for role_id in remove]
+        if not rows:
+            return
+        await conn.execute("""
+            INSERT INTO role_ops (guild_id, member_id, role_id, add, reason)
+            SELECT $1, c.member_id, c.role_id, c.add, $5
+            FROM unnest($2::bigint[], $3::bigint[], $4::boolean[]) AS c(member_id, role_id, add)
+        """, guild_id, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], reason)
+
+    def wake(self):
+        """New rows were committed (role_ops NOTIFY); without the listener the poll picks them up"""
+        self._wake.set()
+
+    async def pending(self, guild_id=None):
+        async with acquire() as conn:
+            if guild_id is None:
+                return await conn.fetchval("SELECT count(*) FROM role_ops")
+            return await conn.fetchval("SELECT count(*) FROM role_ops WHERE guild_id = $1", guild_id)
+
+    # ---- worker -----------------------------------------------------------
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        logger.info("Role queue worker started")
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                # Drain everything that is due; a full batch means there may be more
+                while await self.process_due() >= self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Role queue worker error: {e}")
+
+    async def process_due(self):
+        """Claim and apply one batch of due role changes; returns the number of rows claimed"""
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        if not guild_ids:
+            return 0
+
+        rows = await self._claim(guild_ids)
+        if not rows:
+            return 0
+
+        # guild_id -> member_id -> rows in enqueue order
+        by_guild = {}
+        for row in sorted(rows, key=lambda row: row['id']):
+            by_guild.setdefault(row['guild_id'], {}).setdefault(row['member_id'], []).append(row)
+
+        await asyncio.gather(*(self._apply_guild(guild_id, members) for guild_id, members in by_guild.items()))
+        return len(rows)
+
+    async def _claim(self, guild_ids):
+        """Lease a batch of due rows; no lock or connection is held while they are applied"""
+        async with acquire() as conn:
+            return await conn.fetch("""
+                UPDATE role_ops SET claimed_at = now(), not_before = now() + make_interval(secs => $3)
+                WHERE id IN (
+                    SELECT id FROM role_ops
+                    WHERE not_before <= now() AND guild_id = ANY($1::bigint[])
+                    ORDER BY id
+                    LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, guild_id, member_id, role_id, add, reason, attempts
+            """, guild_ids, self.batch_size, self.lease)
+
+    async def _finish(self, ids):
+        async with acquire() as conn:
+            await conn.execute("DELETE FROM role_ops WHERE id = ANY($1::bigint[])", ids)
+
+    async def _reschedule(self, ids, delay, error=None, count_attempt=True):
+        async with acquire() as conn:
+            await conn.execute("""
+                UPDATE role_ops SET attempts = attempts + $4, last_error = coalesce($2, last_error),
+                    claimed_at = NULL, not_before = now() + make_interval(secs => $3)
+                WHERE id = ANY($1::bigint[])
+            """, ids, error, float(delay), 1 if count_attempt else 0)
+
+    async def _apply_guild(self, guild_id, members):
+        """Apply every member's merged changes in one guild, one member at a time
+
+        Each member's rows are deleted or rescheduled as soon as their edit is done.
+        """
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            # Left the guild since the rows were claimed
+            await self._finish([op['id'] for ops in members.values() for op in ops])
+            self.dropped += len(members)
+            return
+
+        for member_id, ops in members.items():
+            ids = [op['id'] for op in ops]
+            attempts = max(op['attempts'] for op in ops)
+            try:
+                await self._apply_member(guild, member_id, ops)
+                await self._finish(ids)
+                self.applied += 1
+            except (discord.NotFound, discord.Forbidden) as e:
+                # Member left, role deleted or missing permissions: retrying will not help
+                logger.warning(f"Dropping role changes for {member_id} in guild {guild_id}: {e}")
+                await self._finish(ids)
+                self.dropped += 1
+            except Exception as e:
+                if attempts + 1 >= self.max_attempts:
+                    logger.error(f"Giving up on role changes for {member_id} in guild {guild_id} after {attempts + 1} attempts: {e}")
+                    await self._finish(ids)
+                    self.dropped += 1
+                else:
+                    await self._reschedule(ids, min(2 ** attempts, 600), str(e))
+                    self.retried += 1
+
+    async def _apply_member(self, guild, member_id, ops):
+        """Add or remove each changed role with its own request
+
+        A whole-list member edit would have to start from the member directory's
+        roles and strip any role added since the directory last saw the member.
+        The per-role routes are idempotent, so a role the member already has (or
+        lacks) costs a request but changes nothing.
+        """
+        # Last change per role wins
+        wanted = {}
+        for op in ops:
+            wanted[op['role_id']] = op['add']
+
+        reason = "; ".join(dict.fromkeys(op['reason'] for op in ops if op['reason']))[:512] or None
+        for role_id, add in wanted.items():
+            if add:
+                await self.bot.http.add_role(guild.id, member_id, role_id, reason=reason)
+            else:
+                await self.bot.http.remove_role(guild.id, member_id, role_id, reason=reason)
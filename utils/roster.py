@@ -0,0 +1,227 @@
+"""IGN registration and shared lookups over the normalised IGN / membership tables
+
+fetch_union_rosters() loads any number of unions in one query. Its latency
+against seeded unions (rolled back afterwards), next to one query pair per
+union, can be measured with:
+
+    python -m utils.roster bench [union counts] [members per union]
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+# IGN slots used by user_igns, union_memberships and union_leaders
+PRIMARY = 1
+SECONDARY = 2
+SLOT_NAMES = {PRIMARY: "Primary", SECONDARY: "Secondary"}
+
+def other_slot(slot):
+    return SECONDARY if slot == PRIMARY else PRIMARY
+
+async def register_ign(conn, discord_id, username, slot, ign):
+    """Create the user row if needed and set the IGN for one slot"""
+    async with conn.transaction():
+        await conn.execute("""
+            INSERT INTO users (discord_id, username) VALUES ($1, $2)
+            ON CONFLICT (discord_id) DO NOTHING
+        """, discord_id, username)
+        await conn.execute("""
+            INSERT INTO user_igns (discord_id, slot, ign) VALUES ($1, $2, $3)
+            ON CONFLICT (discord_id, slot) DO UPDATE SET ign = EXCLUDED.ign
+        """, discord_id, slot, ign)
+
+async def deregister_ign(conn, discord_id, slot):
+    """Remove the IGN of one slot; returns whether one was registered"""
+    result = await conn.execute("DELETE FROM user_igns WHERE discord_id = $1 AND slot = $2", discord_id, slot)
+    return result == "DELETE 1"
+
+async def find_ign(conn, ign):
+    """Resolve an IGN to (discord_id, slot), or None if nobody registered it"""
+    row = await conn.fetchrow(
+        "SELECT discord_id, slot FROM user_igns WHERE ign = $1 ORDER BY discord_id, slot LIMIT 1",
+        ign
+    )
+    return (row['discord_id'], row['slot']) if row else None
+
+async def find_igns(conn, igns):
+    """Resolve many IGNs in one query; returns {ign: (discord_id, slot)} for those registered"""
+    rows = await conn.fetch("""
+        SELECT DISTINCT ON (ign) ign, discord_id, slot
+        FROM user_igns WHERE ign = ANY($1::text[])
+        ORDER BY ign, discord_id, slot
+    """, list(igns))
+    return {row['ign']: (row['discord_id'], row['slot']) for row in rows}
+
+async def fetch_slots(conn, discord_ids):
+    """Return {discord_id: {slot: (ign, role_id)}} for every registered IGN or membership
+
+    Slots with neither an IGN nor a membership are omitted.
+    """
+    rows = await conn.fetch("""
+        SELECT COALESCE(i.discord_id, m.discord_id) AS discord_id,
+               COALESCE(i.slot, m.slot) AS slot,
+               i.ign, m.role_id
+        FROM (SELECT * FROM user_igns WHERE discord_id = ANY($1::bigint[])) i
+        FULL JOIN (SELECT * FROM union_memberships WHERE discord_id = ANY($1::bigint[])) m
+            ON i.discord_id = m.discord_id AND i.slot = m.slot
+    """, list(discord_ids))
+
+    slots = {}
+    for row in rows:
+        slots.setdefault(row['discord_id'], {})[row['slot']] = (row['ign'], row['role_id'])
+    return slots
+
+async def fetch_union_rosters(conn, role_ids):
+    """Load leader and members for many unions in one round trip
+
+    Returns {role_id: {"leader_id", "leader_igns", "members"}} in role_id order, where
+    members is [(discord_id, ign)] ordered by discord_id. A user with both IGN slots
+    in the same union is listed once, by the primary slot. leader_igns holds every
+    registered IGN of the leader, primary first.
+    """
+    rows = await conn.fetch("""
+        WITH unions AS (
+            SELECT role_id FROM union_roles WHERE role_id = ANY($1::bigint[])
+        ),
+        leaders AS (
+            SELECT DISTINCT ON (l.role_id) l.role_id, l.user_id
+            FROM union_leaders l JOIN unions USING (role_id)
+            ORDER BY l.role_id, l.user_id, l.slot
+        ),
+        leader_igns AS (
+            SELECT discord_id, array_agg(ign ORDER BY slot) AS igns
+            FROM user_igns
+            WHERE discord_id IN (SELECT user_id FROM leaders)
+            GROUP BY discord_id
+        ),
+        members AS (
+            SELECT DISTINCT ON (m.role_id, m.discord_id) m.role_id, m.discord_id, i.ign
+            FROM union_memberships m
+            JOIN unions USING (role_id)
+            LEFT JOIN user_igns i ON i.discord_id = m.discord_id AND i.slot = m.slot
+            ORDER BY m.role_id, m.discord_id, m.slot
+        )
+        SELECT u.role_id, ld.user_id AS leader_id, li.igns AS leader_igns, mb.discord_id, mb.ign
+        FROM unions u
+        LEFT JOIN leaders ld USING (role_id)
+        LEFT JOIN leader_igns li ON li.discord_id = ld.user_id
+        LEFT JOIN members mb USING (role_id)
+        ORDER BY u.role_id, mb.discord_id
+    """, list(role_ids))
+
+    rosters = {}
+    for row in rows:
+        roster = rosters.setdefault(row['role_id'], {
+            "leader_id": row['leader_id'],
+            "leader_igns": list(row['leader_igns'] or []),
+            "members": [],
+        })
+        if row['discord_id'] is not None:
+            roster["members"].append((row['discord_id'], row['ign']))
+    return rosters
+
+# ---- benchmark ----------------------------------------------------------------
+
+# Synthetic role / user ids stay far below real snowflakes
+BENCH_ROLE_BASE = 1_000
+BENCH_USER_BASE = 1_000_000
+
+async def _per_union_rosters(conn, role_ids):
+    """The layout fetch_union_rosters() replaced: a leader and a member query per union"""
+    rosters = {}
+    for role_id in role_ids:
+        leader_id = await conn.fetchval(
+            "SELECT user_id FROM union_leaders WHERE role_id = $1 ORDER BY user_id, slot LIMIT 1", role_id
+        )
+        members = await conn.fetch("""
+            SELECT DISTINCT ON (m.discord_id) m.discord_id, i.ign
+            FROM union_memberships m
+            LEFT JOIN user_igns i ON i.discord_id = m.discord_id AND i.slot = m.slot
+            WHERE m.role_id = $1
+            ORDER BY m.discord_id, m.slot
+        """, role_id)
+        rosters[role_id] = {"leader_id": leader_id, "members": [(row['discord_id'], row['ign']) for row in members]}
+    return rosters
+
+async def _seed(conn, unions, members):
+    users = unions * members
+    await conn.execute("""
+        INSERT INTO union_roles (role_id) SELECT $1 + g FROM generate_series(1, $2::bigint) g
+    """, BENCH_ROLE_BASE, unions)
+    await conn.execute("""
+        INSERT INTO users (discord_id, username) SELECT $1 + g, 'bench_' || g FROM generate_series(1, $2::bigint) g
+    """, BENCH_USER_BASE, users)
+    await conn.execute("""
+        INSERT INTO user_igns (discord_id, slot, ign) SELECT $1 + g, 1, 'BenchIGN' || g FROM generate_series(1, $2::bigint) g
+    """, BENCH_USER_BASE, users)
+    # Member g belongs to union 1 + (g - 1) / members; the first member of each union leads it
+    await conn.execute("""
+        INSERT INTO union_memberships (discord_id, slot, role_id)
+        SELECT $1 + g, 1, $2 + 1 + (g - 1) / $3 FROM generate_series(1, $4::bigint) g
+    """, BENCH_USER_BASE, BENCH_ROLE_BASE, members, users)
+    await conn.execute("""
+        INSERT INTO union_leaders (user_id, slot, role_id)
+        SELECT $1 + 1 + (g - 1) * $3, 1, $2 + g FROM generate_series(1, $4::bigint) g
+    """, BENCH_USER_BASE, BENCH_ROLE_BASE, members, unions)
+    for table in ("union_roles", "users", "user_igns", "union_memberships", "union_leaders"):
+        await conn.execute(f"ANALYZE {table}")
+
+async def _time(conn, loader, role_ids, runs):
+    """Median wall time in ms and queries issued per call"""
+    queries = 0
+
+    def count(record):
+        nonlocal queries
+        queries += 1
+
+    conn.add_query_logger(count)
+    try:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await loader(conn, role_ids)
+            timings.append((time.perf_counter() - started) * 1000)
+        # Query loggers are called from the event loop; let the last ones run
+        await asyncio.sleep(0)
+    finally:
+        conn.remove_query_logger(count)
+    return statistics.median(timings), queries // runs
+
+async def _bench(conn, counts, members, runs=5):
+    tx = conn.transaction()
+    await tx.start()
+    try:
+        await _seed(conn, max(counts), members)
+        print(f"Seeded {max(counts)} unions x {members} members (rolled back afterwards), median of {runs} runs")
+        for unions in counts:
+            role_ids = [BENCH_ROLE_BASE + n for n in range(1, unions + 1)]
+            single_ms, single_queries = await _time(conn, fetch_union_rosters, role_ids, runs)
+            per_union_ms, per_union_queries = await _time(conn, _per_union_rosters, role_ids, runs)
+            print(f"  {unions:>4} unions: fetch_union_rosters {single_ms:8.1f} ms ({single_queries} {'query' if single_queries == 1 else 'queries'})   "
+                  f"per-union queries {per_union_ms:8.1f} ms ({per_union_queries} queries)")
+    finally:
+        await tx.rollback()
+    return 0
+
+async def _cli(argv):
+    from utils.db import get_connection
+
+    command = argv[0] if argv else "bench"
+    if command != "bench":
+        print(__doc__)
+        return 2
+
+    counts = [int(n) for n in argv[1].split(",")] if len(argv) > 1 else [10, 50, 100, 250, 500]
+    members = int(argv[2]) if len(argv) > 2 else 30
+    conn = await get_connection()
+    try:
+        return await _bench(conn, counts, members)
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
@@ -0,0 +1,156 @@
+"""Single-statement union membership and leadership changes
+
+Each operation is one data-modifying CTE: the precondition check and the write
+run in the same statement (so the same transaction and one round trip), and
+the rows the commands need for their reply - the state before the change -
+come back in the result. Rows read for the check are locked with FOR UPDATE,
+so two leaders moving the same IGN at once are serialised by Postgres rather
+than racing between a SELECT and an UPDATE.
+"""
+
+async def join_union(conn, discord_id, slot, role_id, require_registered=False):
+    """Put one IGN slot of a user into a union, transferring it if needed
+
+    Returns a record with:
+      registered - False if require_registered is set and role_id is not a union
+      previous   - union of this slot before the change (None if none)
+      other      - union of the user's other IGN slot
+      changed    - False if the slot was already in role_id or the union is not registered
+    """
+    return await conn.fetchrow("""
+        WITH target AS (
+            SELECT $3::bigint AS role_id
+            WHERE NOT $4::boolean OR EXISTS (SELECT 1 FROM union_roles WHERE role_id = $3)
+        ),
+        prev AS (
+            SELECT slot, role_id FROM union_memberships WHERE discord_id = $1 FOR UPDATE
+        ),
+        upsert AS (
+            INSERT INTO union_memberships (discord_id, slot, role_id)
+            SELECT $1, $2, role_id FROM target
+            ON CONFLICT (discord_id, slot) DO UPDATE SET role_id = EXCLUDED.role_id
+                WHERE union_memberships.role_id <> EXCLUDED.role_id
+            RETURNING role_id
+        )
+        SELECT EXISTS (SELECT 1 FROM target) AS registered,
+               (SELECT role_id FROM prev WHERE slot = $2) AS previous,
+               (SELECT role_id FROM prev WHERE slot <> $2) AS other,
+               EXISTS (SELECT 1 FROM upsert) AS changed
+    """, discord_id, slot, role_id, require_registered)
+
+async def leave_union(conn, discord_id, slot, role_id, require_registered=False):
+    """Remove one IGN slot of a user from a union, only if it is in that union
+
+    Returns a record with registered / previous / other as for join_union(), and
+    removed - whether a membership was deleted.
+    """
+    return await conn.fetchrow("""
+        WITH target AS (
+            SELECT $3::bigint AS role_id
+            WHERE NOT $4::boolean OR EXISTS (SELECT 1 FROM union_roles WHERE role_id = $3)
+        ),
+        prev AS (
+            SELECT slot, role_id FROM union_memberships WHERE discord_id = $1 FOR UPDATE
+        ),
+        removed AS (
+            DELETE FROM union_memberships m
+            USING target t
+            WHERE m.discord_id = $1 AND m.slot = $2 AND m.role_id = t.role_id
+            RETURNING m.role_id
+        )
+        SELECT EXISTS (SELECT 1 FROM target) AS registered,
+               (SELECT role_id FROM prev WHERE slot = $2) AS previous,
+               (SELECT role_id FROM prev WHERE slot <> $2) AS other,
+               EXISTS (SELECT 1 FROM removed) AS removed
+    """, discord_id, slot, role_id, require_registered)
+
+async def appoint_leader(conn, user_id, slot, role_id, username):
+    """Make one IGN slot of a user the leader of a union and a member of it
+
+    Nothing is written unless the union is registered and the slot leads no
+    union yet. Returns a record with:
+      registered      - whether role_id is a registered union
+      current_role    - union this slot already led (None if none)
+      previous_union  - union this slot was a member of before
+      other           - union of the user's other IGN slot
+      appointed       - whether the leadership was created
+    """
+    return await conn.fetchrow("""
+        WITH registered AS (
+            SELECT 1 FROM union_roles WHERE role_id = $3
+        ),
+        current AS (
+            SELECT role_id FROM union_leaders WHERE user_id = $1 AND slot = $2 FOR UPDATE
+        ),
+        prev_member AS (
+            SELECT role_id FROM union_memberships WHERE discord_id = $1 AND slot = $2 FOR UPDATE
+        ),
+        leader AS (
+            INSERT INTO union_leaders (user_id, slot, role_id)
+            SELECT $1, $2, $3 WHERE EXISTS (SELECT 1 FROM registered)
+            ON CONFLICT (user_id, slot) DO NOTHING
+            RETURNING role_id
+        ),
+        member AS (
+            INSERT INTO union_memberships (discord_id, slot, role_id)
+            SELECT $1, $2, role_id FROM leader
+            ON CONFLICT (discord_id, slot) DO UPDATE SET role_id = EXCLUDED.role_id
+        ),
+        renamed AS (
+            UPDATE users SET username = $4
+            WHERE discord_id = $1 AND EXISTS (SELECT 1 FROM leader)
+        )
+        SELECT EXISTS (SELECT 1 FROM registered) AS registered,
+               (SELECT role_id FROM current) AS current_role,
+               (SELECT role_id FROM prev_member) AS previous_union,
+               (SELECT role_id FROM union_memberships WHERE discord_id = $1 AND slot <> $2) AS other,
+               EXISTS (SELECT 1 FROM leader) AS appointed
+    """, user_id, slot, role_id, username)
+
+async def dismiss_leader(conn, user_id, slot, role_id):
+    """Remove one IGN slot's leadership of a union; returns whether it led that union"""
+    removed = await conn.fetchval(
+        "DELETE FROM union_leaders WHERE user_id = $1 AND slot = $2 AND role_id = $3 RETURNING role_id",
+        user_id, slot, role_id
+    )
+    return removed is not None
+
+async def deregister_union(conn, role_id):
+    """Delete a union with all its leaders and memberships
+
+    Returns a record with:
+      registered       - whether role_id was a registered union
+      leaders_removed  - number of leadership rows deleted
+      members_removed  - number of distinct users who lost a membership
+    """
+    return await conn.fetchrow("""
+        WITH leaders AS (
+            DELETE FROM union_leaders WHERE role_id = $1 RETURNING user_id
+        ),
+        members AS (
+            DELETE FROM union_memberships WHERE role_id = $1 RETURNING discord_id
+        ),
+        removed AS (
+            DELETE FROM union_roles WHERE role_id = $1 RETURNING role_id
+        )
+        SELECT EXISTS (SELECT 1 FROM removed) AS registered,
+               (SELECT count(*) FROM leaders) AS leaders_removed,
+               (SELECT count(DISTINCT discord_id) FROM members) AS members_removed
+    """, role_id)
+
+async def backfill_union_guilds(conn, guilds):
+    """Record the guild of unions registered before union_roles.guild_id existed
+
+    Each union without a guild gets the guild holding its role, when that guild
+    is among `guilds`. Returns the number of unions updated.
+    """
+    legacy = [row['role_id'] for row in await conn.fetch("SELECT role_id FROM union_roles WHERE guild_id IS NULL")]
+    found = [(role_id, guild.id) for guild in guilds for role_id in legacy if guild.get_role(role_id)]
+    if not found:
+        return 0
+    result = await conn.execute("""
+        UPDATE union_roles r SET guild_id = f.guild_id
+        FROM unnest($1::bigint[], $2::bigint[]) AS f(role_id, guild_id)
+        WHERE r.role_id = f.role_id AND r.guild_id IS NULL
+    """, [role_id for role_id, _ in found], [guild_id for _, guild_id in found])
+    return int(result.split()[-1])
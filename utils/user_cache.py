@@ -0,0 +1,132 @@
+"""Discord user profile cache
+
+Replaces per-row bot.fetch_user() REST calls. Lookups go to the gateway
+user cache first, then a TTL + LRU cache of previously fetched users.
+Concurrent lookups for the same id share one request, and batch misses are
+fetched with bounded concurrency.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+class UserNotFound(LookupError):
+    """Raised when a user id does not resolve (deleted account or bad id)"""
+
+# Cached marker for ids Discord reported as unknown
+_MISSING = object()
+
+class UserProfileCache:
+    def __init__(self, bot, ttl=None, max_size=None, concurrency=None):
+        self.bot = bot
+        self.ttl = ttl if ttl is not None else float(os.getenv("USER_CACHE_TTL", "3600"))
+        self.negative_ttl = min(self.ttl, 300)
+        self.max_size = max_size if max_size is not None else int(os.getenv("USER_CACHE_SIZE", "5000"))
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._fetch_limit = asyncio.Semaphore(
+            concurrency if concurrency is not None else int(os.getenv("USER_FETCH_CONCURRENCY", "4"))
+        )
+
+        self.gateway_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.gateway_hits + self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "gateway_hits": self.gateway_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": (self.gateway_hits + self.hits) / lookups if lookups else 0.0,
+        }
+
+    def invalidate(self, user_id=None):
+        """Drop one cached user, or everything when called without an id"""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+
+    def _store(self, user_id, value, ttl):
+        self._entries[user_id] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _lookup_local(self, user_id):
+        """Return a cached value (user or _MISSING) or None if a REST fetch is needed"""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            self.gateway_hits += 1
+            return user
+
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return value
+            del self._entries[user_id]
+        return None
+
+    async def _fetch(self, user_id):
+        async with self._fetch_limit:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                self._store(user_id, _MISSING, self.negative_ttl)
+                return _MISSING
+            except Exception:
+                self.errors += 1
+                raise
+        self._store(user_id, user, self.ttl)
+        return user
+
+    async def fetch(self, user_id):
+        """Drop-in replacement for bot.fetch_user(); raises UserNotFound for unknown ids"""
+        user_id = int(user_id)
+        value = self._lookup_local(user_id)
+
+        if value is None:
+            task = self._inflight.get(user_id)
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(self._fetch(user_id))
+                self._inflight[user_id] = task
+                task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+            value = await asyncio.shield(task)
+
+        if value is _MISSING:
+            raise UserNotFound(user_id)
+        return value
+
+    async def get(self, user_id):
+        """Like fetch() but returns None instead of raising"""
+        try:
+            return await self.fetch(user_id)
+        except Exception:
+            return None
+
+    async def get_many(self, user_ids):
+        """Resolve many ids at once, returning {id: user} for those that exist
+
+        Cached ids are answered locally; the rest are fetched concurrently, capped
+        by the fetch semaphore.
+        """
+        unique = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        users = await asyncio.gather(*(self.get(user_id) for user_id in unique))
+        return {user_id: user for user_id, user in zip(unique, users) if user is not None}